@@ -1,15 +1,22 @@
 import os
 import sys
 import time
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from werkzeug.utils import secure_filename
+from flask import Flask, abort, render_template, request, jsonify, send_from_directory
+from werkzeug.security import safe_join
 
 # プロジェクトルートを sys.path に追加（Vercel環境対応）
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BASE_DIR)
 
-from modules import gps_locator, cropper, labeler, news_scraper
-from modules import gps_shop_finder, ocr_reader
+from modules import gps_locator, cropper, labeler
+from modules import derived_cache, gps_shop_finder, image_pipeline, news_scraper, ocr_reader
+from modules.news_cache import news_cache
+from modules.news_store import news_store
+from modules.shop_cache import shop_cache
+from modules.shop_index import get_shop_index
+from modules.stage_runner import run_stages
+from modules.storage_manager import storage_manager
+from modules.upload_store import create_upload_store
 
 # Flask アプリの初期化（templates と static のパスを明示的に指定）
 app = Flask(
@@ -32,16 +39,92 @@ except OSError as e:
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
+# アップロードは内容のハッシュをファイル名にして保存（同じ写真は1つだけ・結果も再利用）
+# 元画像・出力画像は storage_manager が容量（STORAGE_BUDGET_MB）を管理し、消えた出力画像は作り直す
+upload_store = create_upload_store(app.config['UPLOAD_FOLDER'], storage=storage_manager)
+
+# /analyze の締め切り（Vercel の maxDuration 60秒より短く、応答を返す余裕を残す）
+ANALYZE_DEADLINE_SEC = float(os.environ.get('ANALYZE_DEADLINE_SEC', '50'))
+
+# /uploads・/results の名前から内容が決まる画像のキャッシュ期間（秒）
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# /api/nearby-ramen の検索範囲（メートル）: 店がなければ次の範囲に拡張
+NEARBY_TIERS = (5000, 10000, 20000)
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def _recipe_crop(recipe, source, output_path):
+    """/analyze の切り抜き（どんぶり検知はキャッシュ済みなら再検知しない）"""
+    return cropper.crop_bowl(source, output_path)
+
+
+def _recipe_link(recipe, source, output_path):
+    """/api/simple-crop: アップロードそのもの（ハードリンク）"""
+    upload_store.link(source, output_path)
+    return True
+
+
+def _recipe_label(recipe, source, output_path):
+    """/process・/auto-process・/reprocess: 切り抜き済み画像（input）か元画像からラベル付き画像"""
+    cropped_path = recipe.get('input')
+    options = recipe.get('options')
+    if cropped_path and storage_manager.ensure(cropped_path):
+        image_pipeline.label_file(cropped_path, output_path, recipe['shop_name'], options)
+    else:
+        image_pipeline.crop_and_label(source, output_path, recipe['shop_name'], options=options)
+    return True
+
+
+storage_manager.register_recipe('crop', _recipe_crop)
+storage_manager.register_recipe('link', _recipe_link)
+storage_manager.register_recipe('label', _recipe_label)
+try:
+    # 再起動前から残っているファイルも容量に数える
+    storage_manager.scan([app.config['UPLOAD_FOLDER'], app.config['OUTPUT_FOLDER']])
+except Exception as e:
+    print(f"Warning: Storage scan failed: {e}")
+
+
+def _upload_ext(filename):
+    # 保存名は内容のハッシュなので元のファイル名からは拡張子だけを使う（allowed_file で確認済み）
+    return filename.rsplit('.', 1)[1].lower()
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 
+def _gps_shop_stage(ctx):
+    """
+    並列ステージ: GPS座標の抽出 → 周辺ラーメン店の候補収集（Overpass）
+    店名の選択は OCR の結果と合わせて find_shop_by_gps で行う（バッチ処理と同じ）
+    """
+    gps = gps_locator.get_gps_coordinates(ctx)
+    if not gps:
+        return None, None
+    return gps, gps_shop_finder.collect_candidates(gps[0], gps[1])
+
+
+def _crop_stage(ctx, cropped_path):
+    """並列ステージ: どんぶり検知 → 検知結果を使って切り抜き"""
+    bowl_data = None
+    try:
+        bowl_data = cropper.detect_bowl(ctx)
+        if bowl_data:
+            print(f"🔍 どんぶり検知成功: method={bowl_data.get('method')} "
+                  f"cx={bowl_data['cx']:.3f} cy={bowl_data['cy']:.3f} r={bowl_data['r']:.3f}")
+    except Exception as e:
+        print(f"⚠️ どんぶり検知エラー: {e}")
+
+    # 検知結果を渡して再検知を省略
+    return bowl_data, cropper.crop_bowl(ctx, cropped_path, bowl=bowl_data)
+
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     """
@@ -49,7 +132,9 @@ def analyze():
     1. GPS座標から周辺ラーメン店を検索
     2. OCRで看板文字を認識
     3. 最適な店名を自動選択
+    OCR・GPS店舗検索・どんぶり切り抜きは並列実行（ANALYZE_DEADLINE_SEC で打ち切り）
     """
+    request_start = time.monotonic()
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     file = request.files['file']
@@ -57,16 +142,22 @@ def analyze():
         return jsonify({'error': 'No selected file'}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        unique_filename = f"{int(time.time())}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        # EXIFメタデータを保持するため、バイナリで直接書き込み
-        file_data = file.read()
-        with open(filepath, 'wb') as f:
-            f.write(file_data)
-        
-        print(f"✅ File saved: {filepath} ({len(file_data)} bytes)")
+        # チャンクごとに書きながら SHA-256 を計算（EXIFメタデータはそのまま保持）
+        upload = upload_store.ingest(file.stream, _upload_ext(file.filename))
+        unique_filename = upload.filename
+        filepath = upload.path
+        print(f"✅ File saved: {filepath} ({upload.size} bytes{'' if upload.created else ', duplicate'})")
+
+        cached = upload_store.get_result(upload, 'analyze')
+        if cached is not None:
+            print(f"♻️ 同じ写真の解析結果を再利用: {upload.sha256[:12]}")
+            return jsonify(dict(cached, cached=True))
+
+        # 全ステージで共有する画像コンテキスト（デコード・EXIF解析は1回だけ）
+        ctx = upload.context()
+
+        cropped_filename = f"cropped_{unique_filename}"
+        cropped_path = os.path.join(app.config['OUTPUT_FOLDER'], cropped_filename)
 
         shop_name = None
         detection_method = "manual"
@@ -77,30 +168,35 @@ def analyze():
         shop_distance = None
         candidates = []  # 候補リスト
 
-        
         # ========================================
-        # Step 1: OCRで看板文字を取得
+        # Step 1: OCR・GPS店舗検索・どんぶり検知＋切り抜きを並列実行
         # ========================================
-        ocr_text = None
-        try:
-            ocr_text = ocr_reader.extract_text_from_image(filepath)
-            print(f"OCR: {ocr_text[:80] if ocr_text else 'なし'}...")
-        except Exception as e:
-            print(f"OCR error: {e}")
-        
+        stages = run_stages({
+            'ocr': lambda: ocr_reader.extract_text_from_image(ctx),
+            'shop': lambda: _gps_shop_stage(ctx),
+            'crop': lambda: _crop_stage(ctx, cropped_path),
+        }, deadline=request_start + ANALYZE_DEADLINE_SEC)
+
         # ========================================
-        # Step 2: GPS座標を取得
+        # Step 2: OCRテキスト
         # ========================================
-        try:
-            gps = gps_locator.get_gps_coordinates(filepath)
+        ocr_text = stages['ocr'].value if stages['ocr'].ok else None
+        print(f"OCR: {ocr_text[:80] if ocr_text else 'なし'}...")
+
+        # ========================================
+        # Step 3: GPS座標 → 周辺ラーメン店
+        # ========================================
+        shop_stage = stages['shop']
+        if shop_stage.ok:
+            gps, nearby = shop_stage.value
             if gps:
                 gps_lat, gps_lon = gps
                 gps_detected = True
                 print(f"✅ GPS: {gps_lat:.6f}, {gps_lon:.6f}")
-                
-                # GPS＋OCRハイブリッド検索
-                result = gps_shop_finder.find_shop_by_gps(gps_lat, gps_lon, ocr_text)
-                
+
+                # GPS＋OCRハイブリッド検索（候補は並列ステージで収集済み）
+                result = gps_shop_finder.find_shop_by_gps(gps_lat, gps_lon, ocr_text, candidates=nearby)
+
                 # 結果を取得（店舗が見つかったかどうかに関わらず）
                 if result:
                     shop_name = result.get('shop_name')  # Noneの可能性あり
@@ -108,17 +204,16 @@ def analyze():
                     debug_info = result.get('debug_info', f"GPS: {gps_lat:.6f}, {gps_lon:.6f}")
                     shop_distance = result.get('distance')
                     candidates = result.get('candidates', [])
-
             else:
                 print("❌ GPS未検出")
                 debug_info = "GPS未検出（EXIFなし）"
-                
-        except Exception as e:
-            print(f"GPS error: {e}")
-            debug_info = f"GPS取得エラー: {str(e)[:30]}"
-        
+        elif shop_stage.timed_out:
+            debug_info = "GPS店舗検索タイムアウト"
+        else:
+            debug_info = f"GPS取得エラー: {str(shop_stage.error)[:30]}"
+
         # ========================================
-        # Step 3: GPSなしの場合はOCRフォールバック
+        # Step 4: GPSなしの場合はOCRフォールバック
         # ========================================
         if not shop_name and not gps_detected:
             try:
@@ -131,7 +226,7 @@ def analyze():
                 print(f"OCR fallback error: {e}")
         
         # ========================================
-        # Step 4: OCR直接抽出（最後の手段）
+        # Step 5: OCR直接抽出（最後の手段）
         # ========================================
         if not shop_name and ocr_text:
             try:
@@ -160,33 +255,19 @@ def analyze():
             })
 
         # ========================================
-        # Step 5: どんぶり自動検知
+        # Step 6: どんぶり検知＋クロップ結果
         # ========================================
-        bowl_data = None
-        try:
-            bowl_data = cropper.detect_bowl(filepath)
-            if bowl_data:
-                print(f"🔍 どんぶり検知成功: method={bowl_data.get('method')} "
-                      f"cx={bowl_data['cx']:.3f} cy={bowl_data['cy']:.3f} r={bowl_data['r']:.3f}")
-        except Exception as e:
-            print(f"⚠️ どんぶり検知エラー: {e}")
-
-        # ========================================
-        # Step 6: クロップ処理を実行
-        # ========================================
-        cropped_filename = f"cropped_{unique_filename}"
-        cropped_path = os.path.join(app.config['OUTPUT_FOLDER'], cropped_filename)
-
-        crop_success = cropper.crop_bowl(filepath, cropped_path)
+        bowl_data, crop_success = stages['crop'].value if stages['crop'].ok else (None, False)
 
         if crop_success:
             image_url = f'/results/{cropped_filename}'
+            storage_manager.add(cropped_path, source=filepath, recipe={'kind': 'crop'})
             print(f"✅ Crop success: {cropped_path}")
         else:
             image_url = f'/uploads/{unique_filename}'
             print(f"⚠️ Crop failed, using original image")
 
-        return jsonify({
+        response = {
             'filename': unique_filename,
             'cropped_filename': cropped_filename if crop_success else None,
             'shop_name': shop_name,
@@ -201,13 +282,16 @@ def analyze():
                 'distance': shop_distance,
                 'ocr_text': ocr_text[:200] if ocr_text else None,
                 'candidates': candidates_simple,
-                'info': debug_info
-            }
-        })
-
-
-
-
+                'info': debug_info,
+                'timings': {name: r.summary() for name, r in stages.items()}
+            },
+            'cached': False
+        }
+        # タイムアウト・エラーのない結果だけ覚える（再アップロード時に即返す）
+        if all(r.ok for r in stages.values()):
+            upload_store.put_result(upload, 'analyze', response,
+                                    files=[cropped_path if crop_success else filepath])
+        return jsonify(response)
 
     return jsonify({'error': 'Invalid file type'}), 400
 
@@ -225,30 +309,38 @@ def process():
     # クロップ済み画像のパスを確認
     cropped_filename = f"cropped_{filename}"
     cropped_path = os.path.join(app.config['OUTPUT_FOLDER'], cropped_filename)
-    
-    # 最終出力ファイル名
-    output_filename = f"labeled_{filename}"
-    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-    
-    # クロップ済み画像が存在するか確認
-    if os.path.exists(cropped_path):
-        # クロップ済み画像をコピーしてラベル追加
-        import shutil
-        shutil.copy(cropped_path, output_path)
-        print(f"✅ Using cropped image: {cropped_path}")
-    else:
-        # クロップ済み画像がない場合は元画像からクロップ
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not cropper.crop_bowl(input_path, output_path):
-            # クロップ失敗時は元画像をコピー
-            import shutil
-            shutil.copy(input_path, output_path)
-            print(f"⚠️ Crop failed, using original image")
-        else:
-            print(f"✅ Cropped on demand: {output_path}")
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
 
-    # ラベル追加
-    if not labeler.add_label(output_path, shop_name):
+    # 元画像が容量管理で消えていたら作り直せない（切り抜きも一緒に消えている）
+    if not storage_manager.ensure(input_path):
+        return jsonify({'error': 'Original file not found'}), 404
+
+    # クロップ済み画像が存在するか確認（容量管理で消えていれば作り直す）
+    # どちらもメモリ上でラベルを入れて1回だけ保存
+    try:
+        use_cropped = storage_manager.ensure(cropped_path)
+        options = image_pipeline.encode_options()
+
+        # 最終出力ファイル名: (元画像, 店名, 設定, 入力) ごとに決まる（同じ名前なら内容も同じ）
+        output_filename = derived_cache.output_filename(
+            'labeled', derived_cache.file_sha256(input_path), shop_name, options,
+            input='cropped' if use_cropped else 'source')
+        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+
+        if os.path.exists(output_path) and storage_manager.ensure(output_path):
+            print(f"✅ Already labeled: {output_path}")
+        elif use_cropped:
+            print(f"✅ Using cropped image: {cropped_path}")
+            image_pipeline.label_file(cropped_path, output_path, shop_name, options)
+            storage_manager.add(output_path, source=input_path, recipe={
+                'kind': 'label', 'shop_name': shop_name, 'input': cropped_path, 'options': options})
+        else:
+            # クロップ済み画像がない場合は元画像からクロップ（失敗時は元画像にラベル）
+            image_pipeline.crop_and_label(input_path, output_path, shop_name, options=options)
+            storage_manager.add(output_path, source=input_path, recipe={
+                'kind': 'label', 'shop_name': shop_name, 'options': options})
+    except Exception as e:
+        print(f"Process error: {e}")
         return jsonify({'error': '文字入れに失敗しました'}), 500
 
     print(f"✅ Label added: {shop_name}")
@@ -273,16 +365,18 @@ def auto_process():
         return jsonify({'error': 'No selected file'}), 400
     
     if file and allowed_file(file.filename):
-        # ファイル保存（EXIFメタデータ保持）
-        filename = secure_filename(file.filename)
-        unique_filename = f"{int(time.time())}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        file_data = file.read()
-        with open(filepath, 'wb') as f:
-            f.write(file_data)
-        
-        print(f"✅ Auto-process file saved: {filepath} ({len(file_data)} bytes)")
+        # ファイル保存（EXIFメタデータ保持・内容のハッシュがファイル名）
+        upload = upload_store.ingest(file.stream, _upload_ext(file.filename))
+        unique_filename = upload.filename
+        filepath = upload.path
+        print(f"✅ Auto-process file saved: {filepath} ({upload.size} bytes"
+              f"{'' if upload.created else ', duplicate'})")
+
+        cached = upload_store.get_result(upload, 'auto-process')
+        if cached is not None:
+            print(f"♻️ 同じ写真の処理結果を再利用: {upload.sha256[:12]}")
+            return jsonify(dict(cached, cached=True))
+        ctx = upload.context()
 
         # Step 1: 店名自動検出
         shop_name = None
@@ -291,7 +385,7 @@ def auto_process():
         # OCRテキスト取得
         ocr_text = None
         try:
-            ocr_text = ocr_reader.extract_text_from_image(filepath)
+            ocr_text = ocr_reader.extract_text_from_image(ctx)
         except:
             pass
         
@@ -302,10 +396,11 @@ def auto_process():
         candidates = []
         shop_distance = None
         debug_info = ""
+        gps_error = False
         
         # GPS検索
         try:
-            gps = gps_locator.get_gps_coordinates(filepath)
+            gps = gps_locator.get_gps_coordinates(ctx)
             if gps:
                 gps_lat, gps_lon = gps
                 gps_detected = True
@@ -324,11 +419,12 @@ def auto_process():
         except Exception as e:
             print(f"Auto-process GPS error: {e}")
             debug_info = f"GPS取得エラー: {str(e)[:30]}"
+            gps_error = True
         
         # OCRフォールバック
         if not shop_name:
             try:
-                shop_name = ocr_reader.find_shop_name_from_image(filepath)
+                shop_name = ocr_reader.find_shop_name_from_image(ctx)
             except Exception as e:
                 print(f"Auto-process OCR error: {e}")
         
@@ -343,19 +439,16 @@ def auto_process():
                 'distance': c.get('distance', 0)
             })
 
-        # Step 2: クロップ
-        output_filename = f"processed_{unique_filename}"
+        # Step 2〜3: クロップ → ラベル付け（メモリ上で処理して1回だけ保存）
+        # ファイル名は /reprocess と同じ規則（同じ店名に修正したときはそのまま使われる）
+        options = image_pipeline.encode_options()
+        output_filename = derived_cache.output_filename('processed', upload.sha256, shop_name, options)
         output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        
-        crop_success = cropper.crop_bowl(filepath, output_path)
-        if not crop_success:
-            import shutil
-            shutil.copy(filepath, output_path)
+        image_pipeline.crop_and_label(ctx, output_path, shop_name, options=options)
+        storage_manager.add(output_path, source=filepath,
+                            recipe={'kind': 'label', 'shop_name': shop_name, 'options': options})
 
-        # Step 3: ラベル付け
-        labeler.add_label(output_path, shop_name)
-
-        return jsonify({
+        response = {
             'success': True,
             'shop_name': shop_name,
             'result_url': f'/results/{output_filename}',
@@ -367,16 +460,53 @@ def auto_process():
                 'ocr_text': ocr_text[:200] if ocr_text else None,
                 'candidates': candidates_simple,
                 'info': debug_info
-            }
-        })
+            },
+            'cached': False
+        }
+        if not gps_error:
+            upload_store.put_result(upload, 'auto-process', response, files=[output_path])
+        return jsonify(response)
 
 
     return jsonify({'error': 'Invalid file type'}), 400
 
 
+def _send_cached(folder, filename):
+    """
+    /uploads・/results の共通処理: 内容のハッシュを ETag にして 304 / Range に対応
+
+    名前から内容が決まるファイル（元画像・ラベル付き画像）は immutable で1年キャッシュし、
+    If-None-Match が一致すればファイルにも DB にも触らずに 304 を返す。
+    cropped_ など上書きされうるファイルは no-cache（毎回 ETag で再検証）
+    """
+    path = safe_join(folder, filename)
+    if path is None:
+        abort(404)
+
+    etag = derived_cache.name_etag(filename)
+    immutable = etag is not None
+    if not (immutable and request.if_none_match.contains(etag)):
+        # 最終アクセスを更新（容量管理で消えた出力画像は作り直す）
+        if storage_manager.ensure(path) and not immutable:
+            etag = storage_manager.etag(path)
+
+    if etag and request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+    else:
+        response = send_from_directory(folder, filename, etag=etag or True)
+        # werkzeug は Range 付きのリクエストにしか Accept-Ranges を付けない
+        response.headers.setdefault('Accept-Ranges', 'bytes')
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return _send_cached(app.config['UPLOAD_FOLDER'], filename)
 
 
 @app.route('/reprocess', methods=['POST'])
@@ -393,29 +523,31 @@ def reprocess():
         # 元画像のパス
         input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         
-        if not os.path.exists(input_path):
+        if not storage_manager.ensure(input_path):
             return jsonify({'error': 'Original file not found'}), 404
         
-        # 出力パス
-        output_filename = f"processed_{filename}"
+        # 出力パス: (元画像, 店名, 描画・エンコード設定) ごとに決まる名前
+        sha256 = derived_cache.file_sha256(input_path)
+        options = image_pipeline.encode_options()
+        output_filename = derived_cache.output_filename('processed', sha256, new_shop_name, options)
         output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
         
-        # クロップ
-        crop_success = cropper.crop_bowl(input_path, output_path)
-        if not crop_success:
-            # クロップ失敗時は元画像をコピー
-            import shutil
-            shutil.copy(input_path, output_path)
-        
-        # 新しい店名でラベル付け
-        labeler.add_label(output_path, new_shop_name)
+        # 以前と同じ店名ならファイルを返すだけ（容量管理で消えていれば作り直す）
+        cached = os.path.exists(output_path) and storage_manager.ensure(output_path)
+        if not cached:
+            # 切り抜き（キャッシュ済みならデコード・検知なし）→ 新しい店名でラベル付け → 1回だけ保存
+            image_pipeline.crop_and_label(input_path, output_path, new_shop_name,
+                                          options=options, sha256=sha256)
+            storage_manager.add(output_path, source=input_path,
+                                recipe={'kind': 'label', 'shop_name': new_shop_name, 'options': options})
         
-        print(f"✅ Reprocessed with new name: {new_shop_name}")
+        print(f"✅ Reprocessed with new name: {new_shop_name}{' (cached)' if cached else ''}")
         
         return jsonify({
             'success': True,
             'shop_name': new_shop_name,
-            'result_url': f'/results/{output_filename}'
+            'result_url': f'/results/{output_filename}',
+            'cached': cached
         })
         
     except Exception as e:
@@ -426,7 +558,7 @@ def reprocess():
 
 @app.route('/results/<filename>')
 def result_file(filename):
-    return send_from_directory(app.config['OUTPUT_FOLDER'], filename)
+    return _send_cached(app.config['OUTPUT_FOLDER'], filename)
 
 
 @app.route('/api/nearby-ramen')
@@ -438,17 +570,14 @@ def nearby_ramen():
         return jsonify({'error': 'lat and lon required'}), 400
 
     try:
-        # まず5km範囲で検索
-        candidates = gps_shop_finder.search_nearby_ramen(lat, lon, 5000)
-
-        # 店が見つからなければ10km→20kmに自動拡張
-        if len(candidates) == 0:
-            print("[API] 5km内に店舗なし → 10kmに拡張")
-            candidates = gps_shop_finder.search_nearby_ramen(lat, lon, 10000)
-
-        if len(candidates) == 0:
-            print("[API] 10km内に店舗なし → 20kmに拡張")
-            candidates = gps_shop_finder.search_nearby_ramen(lat, lon, 20000)
+        # 20km範囲を1回だけ取得し、5km→10km→20kmの自動拡張はローカルで適用
+        found = gps_shop_finder.search_nearby_ramen(lat, lon, NEARBY_TIERS[-1])
+        candidates = []
+        for radius in NEARBY_TIERS:
+            candidates = [c for c in found if c.get('distance', 0) <= radius]
+            if candidates:
+                break
+            print(f"[API] {radius // 1000}km内に店舗なし → 拡張")
 
         shops = []
         for c in candidates:
@@ -469,18 +598,58 @@ def nearby_ramen():
 
 @app.route('/api/news')
 def get_news():
+    """
+    新店ニュース
+    ?cursor=<数値> を付けると、そのカーソルより後に追加された店だけを返す
+    （次回は レスポンスの cursor を渡してポーリング。カーソルはストアの seq なので取りこぼさない）
+    ?since=<UNIX時刻> は互換用（first_seen で比較）
+    """
+    cursor = request.args.get('cursor', type=int)
+    if 'cursor' in request.args and (cursor is None or cursor < 0):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    since = request.args.get('since', type=float)
+    if 'since' in request.args and since is None:
+        return jsonify({'error': 'Invalid since'}), 400
     try:
-        news_data, log_msg = news_scraper.get_new_reviews()
+        news_data, log_msg, cache_meta = news_cache.get()
+        next_cursor = cache_meta.pop('cursor')
+        server_time = time.time()
+        if cursor is not None:
+            news_data, next_cursor = news_scraper.get_shops_after(cursor)
+        elif since is not None:
+            news_data = news_scraper.get_shops_since(since)
         return jsonify({
             "status": "success",
             "shops": news_data,
-            "log": log_msg
+            "log": log_msg,
+            "cache": cache_meta,
+            "cursor": next_cursor,
+            "server_time": server_time
         })
     except Exception as e:
         print(f"Scraper Error: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/stats')
+def get_stats():
+    """キャッシュの統計（ヒット率・件数など）"""
+    index = get_shop_index()
+    return jsonify({
+        'shop_cache': shop_cache.stats(),
+        'shop_index': index.stats() if index is not None else None,
+        'bowl_cache': cropper.bowl_cache.stats(),
+        'news_cache': news_cache.stats(),
+        'news_store': news_store.stats(),
+        'ocr_engine': ocr_reader.ocr_engine_stats(),
+        'ocr_cache': ocr_reader.ocr_cache.stats(),
+        'label_renderer': labeler.label_renderer.stats(),
+        'uploads': upload_store.stats(),
+        'storage': storage_manager.stats(),
+        'derived': derived_cache.stats(),
+    })
+
+
 @app.route('/api/simple-crop', methods=['POST'])
 def simple_crop():
     """
@@ -495,22 +664,18 @@ def simple_crop():
         return jsonify({'error': 'No selected file'}), 400
 
     try:
-        # ファイル名を生成（/process で使えるように cropped_ プレフィックスなし）
-        unique_filename = f"{int(time.time())}_cropped.jpg"
-
-        # UPLOAD_FOLDER にも保存（/process が元画像として参照するため）
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+        # UPLOAD_FOLDER に保存（/process が元画像として参照するため）
+        # ファイル名は内容のハッシュ（/process で使えるように cropped_ プレフィックスなし）
+        upload = upload_store.ingest(file.stream, 'jpg')
+        unique_filename = upload.filename
         output_path = os.path.join(app.config['OUTPUT_FOLDER'], f"cropped_{unique_filename}")
 
-        # バイナリで保存
-        file_data = file.read()
-        with open(upload_path, 'wb') as f:
-            f.write(file_data)
-        with open(output_path, 'wb') as f:
-            f.write(file_data)
+        # 同じ内容を OUTPUT_FOLDER にも（2回書かずにハードリンク）
+        upload_store.link(upload.path, output_path)
+        storage_manager.add(output_path, source=upload.path, recipe={'kind': 'link'})
 
-        print(f"✅ フロントエンド切り抜き画像を保存: {upload_path} ({len(file_data)} bytes)")
-        print(f"✅ クロップ済みコピー: {output_path}")
+        print(f"✅ フロントエンド切り抜き画像を保存: {upload.path} ({upload.size} bytes)")
+        print(f"✅ クロップ済みリンク: {output_path}")
 
         return jsonify({
             'success': True,
@@ -0,0 +1,319 @@
+"""
+バッチ処理モジュール - フォルダ内の写真をまとめて 検知 → 切り抜き → ラベル付け
+/auto-process と同じ処理を、CPUコア数のプロセスプールで並列実行する
+
+使い方:
+    python -m modules.batch_processor <入力フォルダ> <出力フォルダ> [--workers N] [--shop-name 店名]
+
+出力フォルダ:
+    <元ファイル名>_<SHA-256先頭12桁>.jpg  ラベル付き画像
+    manifest.jsonl                         1枚1行の処理結果（処理が終わるたびに追記）
+    batch_stats.json                       スループット統計
+manifest.jsonl に status=ok で記録済みの画像（内容のハッシュで判定）はスキップするので、
+途中で落ちても同じコマンドを再実行すれば続きから処理される
+（--shop-name の有無・店名が前回と違う画像はスキップせずに付け直す）
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Set
+
+from modules.input_handler import get_input_photos
+
+MANIFEST_NAME = 'manifest.jsonl'
+STATS_NAME = 'batch_stats.json'
+UNKNOWN_SHOP_NAME = "店舗名：判定不能"
+# 同時に投入しておく件数（ワーカー数の倍数）: 数千枚でも結果待ちのキューが膨らまない
+IN_FLIGHT_PER_WORKER = 4
+
+
+def file_sha256(path, chunk_size=1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def output_name(path, sha256) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}_{sha256[:12]}.jpg"
+
+
+def load_manifest(manifest_path) -> Dict[str, Dict]:
+    """処理済み（status=ok）の記録をハッシュごとに返す。途中で切れた最終行は無視する"""
+    done = {}
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('status') == 'ok':
+                done[record['sha256']] = record
+    return done
+
+
+def same_labeling(previous, shop_name) -> bool:
+    """前回の記録が今回と同じ店名の決め方か（--shop-name 指定ならその店名、なしなら検出）"""
+    if shop_name:
+        return previous.get('method') == 'fixed' and previous.get('shop_name') == shop_name
+    return previous.get('method') != 'fixed'
+
+
+# ========================================
+# ワーカープロセス
+# ========================================
+
+def _init_worker(verbose):
+    # 各モジュールのログはワーカーでは捨てる（進捗は親プロセスが表示）
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        import cv2
+        # プロセス並列なので OpenCV 内部のスレッドは1本に（コア数の取り合いを防ぐ）
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+
+def detect_shop_name(ctx, timings) -> Dict:
+    """/auto-process と同じ順番で店名を決める: OCR → GPS周辺検索 → OCRフォールバック"""
+    from modules import gps_locator, gps_shop_finder, ocr_reader
+
+    result = {'shop_name': None, 'method': None, 'gps': None, 'distance': None}
+
+    start = time.perf_counter()
+    ocr_text = None
+    try:
+        ocr_text = ocr_reader.extract_text_from_image(ctx)
+    except Exception:
+        pass
+    timings['ocr_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    start = time.perf_counter()
+    try:
+        gps = gps_locator.get_gps_coordinates(ctx)
+        if gps:
+            result['gps'] = list(gps)
+            found = gps_shop_finder.find_shop_by_gps(gps[0], gps[1], ocr_text)
+            if found and isinstance(found, dict):
+                result['shop_name'] = found.get('shop_name')
+                result['distance'] = found.get('distance')
+            elif found and isinstance(found, str):
+                result['shop_name'] = found
+            if result['shop_name']:
+                result['method'] = 'gps'
+    except Exception as e:
+        print(f"Batch GPS error: {e}")
+    timings['gps_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    if not result['shop_name']:
+        try:
+            name = ocr_reader.find_shop_name_from_image(ctx)
+        except Exception:
+            name = None
+        if name:
+            result['shop_name'] = name
+            result['method'] = 'ocr'
+
+    if not result['shop_name']:
+        result['shop_name'] = UNKNOWN_SHOP_NAME
+        result['method'] = 'unknown'
+    return result
+
+
+def process_photo(path, sha256, output_dir, shop_name=None) -> Dict:
+    """
+    1枚を処理して manifest の1行分を返す（例外は status=error の記録にする）
+
+    出力は一時ファイルに書いてから置き換えるので、途中で落ちても壊れた画像は残らない
+    """
+    from modules import cropper, image_pipeline
+    from modules.image_context import ImageContext
+
+    start = time.perf_counter()
+    record = {
+        'sha256': sha256,
+        'source': os.path.abspath(path),
+        'output': None,
+        'status': 'error',
+    }
+    timings = {}
+    try:
+        with open(path, 'rb') as f:
+            ctx = ImageContext(f.read(), path=path)
+        # デコードできないファイルはここで失敗させる（各ステージのフォールバックに流さない）
+        ctx.image
+
+        if shop_name:
+            record.update(shop_name=shop_name, method='fixed')
+        else:
+            record.update(detect_shop_name(ctx, timings))
+
+        final_path = os.path.join(output_dir, output_name(path, sha256))
+
+        stage = time.perf_counter()
+        bowl = cropper.detect_bowl(ctx)
+        record['bowl'] = bowl
+        timings['detect_ms'] = round((time.perf_counter() - stage) * 1000, 1)
+
+        # 切り抜き → ラベル → 1回のエンコード（一時ファイル経由で置き換え）
+        stage = time.perf_counter()
+        # 1枚1回しか使わないので切り抜きはキャッシュしない
+        output = image_pipeline.crop_and_label(ctx, final_path, record['shop_name'], bowl=bowl,
+                                               use_cache=False)
+        timings['render_ms'] = round((time.perf_counter() - stage) * 1000, 1)
+
+        record['crop_success'] = output['crop_success']
+        record['output'] = final_path
+        record['status'] = 'ok'
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+
+    record['timings'] = timings
+    record['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    record['finished_at'] = time.time()
+    return record
+
+
+# ========================================
+# 親プロセス
+# ========================================
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(records, skipped, duplicates, wall_sec, workers) -> Dict:
+    ok = [r for r in records if r['status'] == 'ok']
+    latencies = [r['elapsed_ms'] for r in records]
+    stages = {}
+    for r in ok:
+        for name, ms in r.get('timings', {}).items():
+            stages.setdefault(name, []).append(ms)
+    return {
+        'workers': workers,
+        'processed': len(ok),
+        'failed': len(records) - len(ok),
+        'skipped': skipped,
+        'duplicates': duplicates,
+        'wall_sec': round(wall_sec, 2),
+        'photos_per_sec': round(len(records) / wall_sec, 3) if wall_sec > 0 else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 1) if latencies else None,
+            'p50': _percentile(latencies, 0.5),
+            'p95': _percentile(latencies, 0.95),
+        },
+        'stage_mean_ms': {name: round(sum(v) / len(v), 1) for name, v in stages.items()},
+        'methods': {m: sum(r.get('method') == m for r in ok) for m in {r.get('method') for r in ok}},
+    }
+
+
+def run_batch(input_dir, output_dir, workers=None, shop_name=None, verbose=False) -> Dict:
+    """
+    input_dir の写真を全て処理する
+
+    Returns:
+        スループット統計（batch_stats.json と同じ内容）
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    done = load_manifest(manifest_path)
+
+    photos = sorted(set(str(p) for p in get_input_photos(input_dir)))
+    print(f"📂 {input_dir}: {len(photos)}枚 / 処理済み {len(done)}件 / ワーカー {workers}")
+
+    # 内容のハッシュで処理済み・フォルダ内の重複を除外
+    todo = []
+    seen: Set[str] = set()
+    skipped = duplicates = relabeled = 0
+    for path in photos:
+        sha256 = file_sha256(path)
+        if sha256 in seen:
+            duplicates += 1
+            continue
+        seen.add(sha256)
+        previous = done.get(sha256)
+        if previous and previous.get('output') and os.path.exists(previous['output']):
+            if same_labeling(previous, shop_name):
+                skipped += 1
+                continue
+            # 店名の指定が前回と違う: 古いラベルを残さず付け直す
+            relabeled += 1
+        todo.append((path, sha256))
+    print(f"▶️ 処理対象 {len(todo)}枚 (スキップ {skipped} / 店名変更で再処理 {relabeled} / 重複 {duplicates})")
+    if relabeled:
+        print(f"⚠️ 前回と店名の指定が違うため {relabeled}枚 のラベルを付け直します")
+
+    records = []
+    start = time.perf_counter()
+    with open(manifest_path, 'a', encoding='utf-8') as manifest, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(verbose,)) as executor:
+        pending = set()
+        remaining = iter(todo)
+        max_in_flight = workers * IN_FLIGHT_PER_WORKER
+
+        def submit_more():
+            for path, sha256 in remaining:
+                pending.add(executor.submit(process_photo, path, sha256, output_dir, shop_name))
+                if len(pending) >= max_in_flight:
+                    break
+
+        submit_more()
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                records.append(record)
+                # 1件ごとに書き出し（落ちても処理済みの分は次回スキップされる）
+                manifest.write(json.dumps(record, ensure_ascii=False) + '\n')
+                manifest.flush()
+                os.fsync(manifest.fileno())
+
+                mark = '✅' if record['status'] == 'ok' else '❌'
+                detail = record.get('shop_name') if record['status'] == 'ok' else record.get('error')
+                print(f"{mark} [{len(records)}/{len(todo)}] {os.path.basename(record['source'])} "
+                      f"{record['elapsed_ms']:.0f}ms {detail}")
+            submit_more()
+
+    stats = summarize(records, skipped, duplicates, time.perf_counter() - start, workers)
+    with open(os.path.join(output_dir, STATS_NAME), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+
+    print("\n=== Summary ===")
+    print(f"処理 {stats['processed']} / 失敗 {stats['failed']} / スキップ {skipped} / 重複 {duplicates}")
+    print(f"{stats['wall_sec']}秒  {stats['photos_per_sec']}枚/秒  "
+          f"1枚あたり mean={stats['latency_ms']['mean']}ms p95={stats['latency_ms']['p95']}ms")
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='写真フォルダの一括処理（検知 → 切り抜き → ラベル付け）')
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--workers', type=int, default=None, help='プロセス数（既定: CPUコア数）')
+    parser.add_argument('--shop-name', help='全ての写真に付ける店名（指定時は店名検出をしない）')
+    parser.add_argument('--verbose', action='store_true', help='ワーカーのログも表示')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        print(f"入力フォルダがありません: {args.input_dir}")
+        return 1
+    stats = run_batch(args.input_dir, args.output_dir, args.workers, args.shop_name, args.verbose)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+コンテンツハッシュキャッシュモジュール
+画像のSHA-256をキーにした結果（どんぶり検知など）のLRUキャッシュ
+メモリ上に保持し、disk_dir を指定すると /tmp にJSONで永続化する
+/tmp のファイルも max_disk_entries 件まで（最終アクセスの古い順に削除）
+"""
+from collections import OrderedDict
+import json
+import os
+import threading
+
+# ディスク上の既定の最大件数（キャッシュごと）
+CONTENT_CACHE_DISK_MAX_ENTRIES = int(os.environ.get('CONTENT_CACHE_DISK_MAX_ENTRIES', '4096'))
+
+
+def make_key(content_hash, **params):
+    """コンテンツハッシュ + 処理パラメータからキャッシュキーを作成"""
+    if not params:
+        return content_hash
+    parts = [f"{k}={params[k]}" for k in sorted(params)]
+    return content_hash + "|" + "|".join(parts)
+
+
+class ContentCache:
+    """
+    スレッドセーフなLRUキャッシュ
+
+    Args:
+        name: 統計表示用の名前
+        max_entries: メモリ上の最大件数（超えたら古い順に削除）
+        disk_dir: JSON永続化ディレクトリ（None ならメモリのみ）
+        max_disk_entries: ディスク上の最大件数（超えたら最終アクセスの古い順に削除）
+    """
+
+    def __init__(self, name, max_entries=256, disk_dir=None, max_disk_entries=CONTENT_CACHE_DISK_MAX_ENTRIES):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        # ディスク上のファイル（古い順）
+        self._disk_files = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if disk_dir:
+            try:
+                os.makedirs(disk_dir, exist_ok=True)
+                self._scan_disk()
+            except OSError as e:
+                print(f"⚠️ キャッシュディレクトリ作成失敗 ({name}): {e}")
+                self.disk_dir = None
+
+    def _scan_disk(self):
+        """再起動前から残っているファイルを最終アクセス（mtime）順に数え、上限を超えた分を消す"""
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+        for _, path in sorted(files):
+            self._disk_files[path] = None
+        self._remove_files(self._trim_disk())
+
+    def _disk_path(self, key):
+        # キーにはパラメータ区切りの記号が入るのでファイル名用に変換
+        safe = key.replace('|', '__').replace('=', '-').replace('/', '_')
+        return os.path.join(self.disk_dir, f"{safe}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        value = self._load_from_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+        self._save_to_disk(key, value)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self._disk_files.pop(path, None)
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️ キャッシュ読み込みエラー ({self.name}): {e}")
+            return None
+        # 最終アクセスを記録（再起動後の削除順にも使う）
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._disk_files[path] = None
+            self._disk_files.move_to_end(path)
+        return value
+
+    def _save_to_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️ キャッシュ書き込みエラー ({self.name}): {e}")
+            return
+        with self._lock:
+            self._disk_files[path] = None
+            self._disk_files.move_to_end(path)
+            victims = self._trim_disk()
+        self._remove_files(victims)
+
+    def _trim_disk(self):
+        """上限を超えた分のファイルを記録から外して返す（削除はロックの外で）"""
+        victims = []
+        while len(self._disk_files) > self.max_disk_entries:
+            path, _ = self._disk_files.popitem(last=False)
+            victims.append(path)
+        self.disk_evictions += len(victims)
+        return victims
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"⚠️ キャッシュ削除失敗: {path}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 3) if total else None,
+                'disk': bool(self.disk_dir),
+                'disk_entries': len(self._disk_files),
+                'max_disk_entries': self.max_disk_entries,
+                'disk_evictions': self.disk_evictions,
+            }
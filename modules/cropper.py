@@ -5,6 +5,11 @@ HoughCircles + 輪郭検出でどんぶりの位置を自動特定
 from PIL import Image, ExifTags
 from io import BytesIO
 import os
+import threading
+import time
+
+from modules.image_context import ensure_context, rotate_by_orientation
+from modules.content_cache import ContentCache, make_key
 
 # OpenCV（Vercel環境でも動くheadless版）
 try:
@@ -17,6 +22,46 @@ except ImportError:
     print("⚠️ OpenCVなし → フォールバック検知を使用")
 
 
+# どんぶり検知結果キャッシュ（画像のSHA-256がキー）
+# /analyze で検知済みの画像は /reprocess・/process・/auto-process で再検知しない
+BOWL_CACHE_DIR = os.path.join('/tmp', 'ramen_cache', 'bowl')
+bowl_cache = ContentCache('bowl_detection', max_entries=512, disk_dir=BOWL_CACHE_DIR)
+
+
+class _Flight:
+    """検知中の画像（同じキーの検知は1回だけ走らせ、後から来た呼び出しは結果を待つ）"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+# キャッシュキー → _Flight（/analyze の OCR(roi) と切り抜きステージが同時に検知しても1回）
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# どんぶり検知モード（環境変数 BOWL_DETECTOR で切替）
+#   full    : フル解像度の画像で HoughCircles（従来方式）
+#   pyramid : 約512pxの縮小画像で候補検出 → フル解像度の円周付近だけで精密化
+#   sweep   : pyramid と同じ縮小画像で、6パターンの HoughCircles の代わりに
+#             勾配・エッジを1回だけ計算して1つの投票空間で全閾値を同時に評価
+BOWL_DETECTOR = os.environ.get('BOWL_DETECTOR', 'full')
+DETECTOR_MODES = ('full', 'pyramid', 'sweep')
+
+# pyramid モードの縮小サイズ（長辺px）
+PYRAMID_SIZE = 512
+
+# HoughCircles パラメータ (dp, param1, param2)（幅広い検出戦略）
+HOUGH_PARAM_SETS = [
+    (1.2, 80, 40),  # 標準
+    (1.5, 60, 30),  # 緩め
+    (1.0, 100, 50), # 厳しめ
+    (1.3, 70, 35),  # 中間
+    (1.8, 50, 25),  # 最緩
+    (1.0, 60, 25),  # 高感度
+]
+
+
 def apply_exif_rotation(img):
     """EXIF Orientationで画像を物理回転"""
     try:
@@ -31,20 +76,7 @@ def apply_exif_rotation(img):
         if orientation is None:
             return img
         print(f"📐 EXIF Orientation: {orientation}")
-        if orientation == 2:
-            img = img.transpose(Image.FLIP_LEFT_RIGHT)
-        elif orientation == 3:
-            img = img.rotate(180, expand=True)
-        elif orientation == 4:
-            img = img.transpose(Image.FLIP_TOP_BOTTOM)
-        elif orientation == 5:
-            img = img.transpose(Image.FLIP_LEFT_RIGHT).rotate(270, expand=True)
-        elif orientation == 6:
-            img = img.rotate(270, expand=True)
-        elif orientation == 7:
-            img = img.transpose(Image.FLIP_LEFT_RIGHT).rotate(90, expand=True)
-        elif orientation == 8:
-            img = img.rotate(90, expand=True)
+        img = rotate_by_orientation(img, orientation)
         if orientation != 1:
             print("✅ EXIF回転適用完了")
         return img
@@ -53,7 +85,7 @@ def apply_exif_rotation(img):
         return img
 
 
-def detect_bowl(image_path):
+def detect_bowl(source, mode=None):
     """
     どんぶり（円形オブジェクト）を自動検知する
 
@@ -62,6 +94,10 @@ def detect_bowl(image_path):
       2. OpenCV 輪郭検出（フォールバック）
       3. 中央ヒューリスティック（最終手段）
 
+    Args:
+        source: 画像パス または ImageContext（デコード済み画像を共有）
+        mode: 'full' / 'pyramid' / 'sweep'（None なら BOWL_DETECTOR）
+
     Returns:
         dict: { cx, cy, r } 全て画像サイズに対する比率（0.0〜1.0）
         cx = 中心X / 画像幅
@@ -69,17 +105,58 @@ def detect_bowl(image_path):
         r  = 半径 / min(幅, 高さ)
         None: 検知失敗
     """
+    try:
+        ctx = ensure_context(source)
+    except Exception as e:
+        print(f"❌ 画像読み込み失敗: {e}")
+        return None
+
+    mode = mode or BOWL_DETECTOR
+    if mode not in DETECTOR_MODES:
+        print(f"⚠️ 不明な検知モード '{mode}' → full")
+        mode = 'full'
+
+    cache_key = make_key(ctx.sha256, detector=mode, cv2=HAS_CV2)
+    cached = bowl_cache.get(cache_key)
+    if cached:
+        print(f"♻️ どんぶり検知キャッシュ使用: method={cached.get('method')}")
+        return dict(cached)
+
+    with _inflight_lock:
+        flight = _inflight.get(cache_key)
+        owner = flight is None
+        if owner:
+            flight = _inflight[cache_key] = _Flight()
+    if not owner:
+        # 同じ画像を別スレッドが検知中: その結果を使う
+        flight.event.wait()
+        print("♻️ どんぶり検知: 同時実行中の結果を使用")
+        return dict(flight.result) if flight.result else None
+
+    try:
+        start = time.perf_counter()
+        result = _detect_bowl_uncached(ctx, mode)
+        print(f"⏱ どんぶり検知: {(time.perf_counter() - start) * 1000:.1f}ms (mode={mode})")
+        if result:
+            bowl_cache.put(cache_key, result)
+            flight.result = result
+            return dict(result)
+        return None
+    finally:
+        with _inflight_lock:
+            _inflight.pop(cache_key, None)
+        flight.event.set()
+
+
+def _detect_bowl_uncached(ctx, mode='full'):
+    """キャッシュなしのどんぶり検知本体"""
     print("\n" + "=" * 70)
-    print("🔍 どんぶり自動検知を開始")
+    print(f"🔍 どんぶり自動検知を開始 (mode={mode})")
     print("=" * 70)
 
-    # まずPILで開いてEXIF回転を適用
+    # EXIF回転済みRGB画像（ImageContext で一度だけデコード）
     try:
-        pil_img = Image.open(image_path)
-        pil_img = apply_exif_rotation(pil_img)
-        if pil_img.mode != 'RGB':
-            pil_img = pil_img.convert('RGB')
-        w, h = pil_img.size
+        w, h = ctx.size
         print(f"📸 画像サイズ: {w}x{h}")
     except Exception as e:
         print(f"❌ 画像読み込み失敗: {e}")
@@ -89,35 +166,41 @@ def detect_bowl(image_path):
         print("⚠️ OpenCVなし → 中央ヒューリスティック")
         return _heuristic_center(w, h)
 
-    # PIL → OpenCV(numpy配列)に変換
-    img_array = np.array(pil_img)
-    img_cv = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-
-    # グレースケール化
-    gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-
-    # CLAHE（コントラスト強調）で低コントラスト画像でも検出精度向上
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-    gray = clahe.apply(gray)
-
-    # ノイズ除去
-    blurred = cv2.GaussianBlur(gray, (9, 9), 2)
-
     min_dim = min(w, h)
 
-    # ========================================
-    # 戦略1: HoughCircles
-    # ========================================
-    result = _try_hough_circles(blurred, w, h, min_dim)
-    if result:
-        return result
-
-    # ========================================
-    # 戦略2: 輪郭検出
-    # ========================================
-    result = _try_contour_detection(blurred, w, h, min_dim)
-    if result:
-        return result
+    if mode in ('pyramid', 'sweep'):
+        # ========================================
+        # 戦略1: HoughCircles（縮小画像 → フル解像度で精密化）
+        # ========================================
+        result = _try_hough_pyramid(ctx, w, h, min_dim, single_pass=(mode == 'sweep'))
+        if result:
+            return result
+
+        # ========================================
+        # 戦略2: 輪郭検出（縮小画像、比率なので解像度に依存しない）
+        # ========================================
+        small, _ = ctx.pyramid(PYRAMID_SIZE)
+        sh, sw = small.shape
+        result = _try_contour_detection(small, sw, sh, min(sw, sh))
+        if result:
+            return result
+    else:
+        # グレースケール → CLAHE（コントラスト強調）→ ノイズ除去
+        blurred = ctx.blurred
+
+        # ========================================
+        # 戦略1: HoughCircles
+        # ========================================
+        result = _try_hough_circles(blurred, w, h, min_dim)
+        if result:
+            return result
+
+        # ========================================
+        # 戦略2: 輪郭検出
+        # ========================================
+        result = _try_contour_detection(blurred, w, h, min_dim)
+        if result:
+            return result
 
     # ========================================
     # 戦略3: 中央ヒューリスティック
@@ -126,25 +209,18 @@ def detect_bowl(image_path):
     return _heuristic_center(w, h)
 
 
-def _try_hough_circles(blurred, w, h, min_dim):
-    """HoughCirclesで円を検出（goal.jpg基準: 大きめの円を優先）"""
-    print("🔍 戦略1: HoughCircles...")
+def _hough_sweep(blurred, min_dim):
+    """
+    HOUGH_PARAM_SETS を順に試し、最初に検出できたパラメータでの最大の円を返す
 
+    Returns:
+        (x, y, r) blurred 座標系、検出なしは None
+    """
     # どんぶりのサイズ範囲（画像の短辺の20%〜55%が半径）
     min_r = int(min_dim * 0.20)
     max_r = int(min_dim * 0.55)
 
-    # パラメータを複数パターン試行（幅広い検出戦略）
-    param_sets = [
-        (1.2, 80, 40),  # 標準
-        (1.5, 60, 30),  # 緩め
-        (1.0, 100, 50), # 厳しめ
-        (1.3, 70, 35),  # 中間
-        (1.8, 50, 25),  # 最緩
-        (1.0, 60, 25),  # 高感度
-    ]
-
-    for dp, p1, p2 in param_sets:
+    for dp, p1, p2 in HOUGH_PARAM_SETS:
         circles = cv2.HoughCircles(
             blurred,
             cv2.HOUGH_GRADIENT,
@@ -157,24 +233,297 @@ def _try_hough_circles(blurred, w, h, min_dim):
         )
 
         if circles is not None:
-            circles = np.round(circles[0]).astype(int)
-            # 最大の円を選択
-            best = max(circles, key=lambda c: c[2])
-            cx_ratio = float(best[0]) / w
-            cy_ratio = float(best[1]) / h
-            r_ratio = float(best[2]) / min_dim
-
-            print(f"✅ HoughCircles検出成功!")
-            print(f"   円: center=({best[0]},{best[1]}) radius={best[2]}")
-            print(f"   比率: cx={cx_ratio:.3f} cy={cy_ratio:.3f} r={r_ratio:.3f}")
-            print("=" * 70 + "\n")
+            # 最大の円を選択（整数に丸めた半径で比較）
+            best = max(circles[0], key=lambda c: int(np.round(c[2])))
+            return float(best[0]), float(best[1]), float(best[2])
 
-            return {'cx': cx_ratio, 'cy': cy_ratio, 'r': r_ratio, 'method': 'hough'}
-
-    print("   → HoughCircles: 検出なし")
     return None
 
 
+def _hough_vote(blurred, min_dim):
+    """
+    HOUGH_PARAM_SETS 6パターン分の HoughCircles を1回の投票で評価する
+
+    - 勾配（Sobel）とエッジ（最も緩い param1 の Canny）を1回だけ計算
+    - 各エッジ点が勾配方向に沿って中心候補へ投票する。投票は「その点の勾配強度で
+      通過できる param1 の段階」ごとの層に振り分けるので、param1 ごとの投票数は
+      上位の層を累積するだけで得られる（アキュムレータは1つ、投票も1回）
+    - dp はアキュムレータのセルサイズなので ceil(dp) 四方の合計で近似し、
+      各パターンの param2 に対する投票数の比を「強度」とする
+    - 強度が1以上の中心のうち、強度 → 半径 → y → x の順で決定的に最良の円を選ぶ
+
+    Returns:
+        (x, y, r) blurred 座標系、検出なしは None（所要時間をログに出す）
+    """
+    start = time.perf_counter()
+    h, w = blurred.shape
+    min_r = int(min_dim * 0.20)
+    max_r = int(min_dim * 0.55)
+    min_dist = min_dim // 3
+
+    # 勾配・エッジは1回だけ（OpenCVのHOUGH_GRADIENTと同じく Canny(param1/2, param1)）
+    p1_levels = sorted({p1 for _, p1, _ in HOUGH_PARAM_SETS})
+    dx = cv2.Sobel(blurred, cv2.CV_32F, 1, 0, ksize=3)
+    dy = cv2.Sobel(blurred, cv2.CV_32F, 0, 1, ksize=3)
+    edges = cv2.Canny(blurred, p1_levels[0] / 2, p1_levels[0])
+    ys, xs = np.nonzero(edges)
+
+    def report_failure(reason):
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"   → HoughSweep: 検出なし ({reason}, {elapsed:.1f}ms, エッジ{len(xs)}点)")
+        return None
+
+    if len(xs) == 0:
+        return report_failure("エッジなし")
+
+    gx = dx[ys, xs]
+    gy = dy[ys, xs]
+    norm = np.hypot(gx, gy)
+    ok = norm > 0
+    xs, ys, gx, gy, norm = xs[ok], ys[ok], gx[ok], gy[ok], norm[ok]
+    ux, uy = gx / norm, gy / norm
+
+    # 勾配強度（Cannyと同じL1ノルム）で通過できる param1 の段階: Canny(p1/2, p1) の近似
+    mag = np.abs(gx) + np.abs(gy)
+    level = np.searchsorted(np.array(p1_levels, dtype=np.float32) / 2, mag, side='right') - 1
+    level = np.clip(level, 0, None)
+    n_levels = len(p1_levels)
+    n_cells = h * w
+
+    # 1つのアキュムレータ（層 × 画素）に全エッジ点が1回ずつ投票
+    # 一時配列が大きくなりすぎないよう、投票数 約200万ごとに半径を区切って集計
+    acc = np.zeros(n_levels * n_cells, dtype=np.int64)
+    radii = np.arange(min_r, max_r + 1)
+    base = level.astype(np.int64) * n_cells
+    step = max(1, 2000000 // (2 * len(xs)))
+    for chunk in range(0, len(radii), step):
+        rr = radii[chunk:chunk + step][:, None]
+        cx = np.rint(np.concatenate([xs + rr * ux, xs - rr * ux])).astype(np.int64)
+        cy = np.rint(np.concatenate([ys + rr * uy, ys - rr * uy])).astype(np.int64)
+        inside = (cx >= 0) & (cx < w) & (cy >= 0) & (cy < h)
+        idx = (base + cy * w + cx)[inside]
+        acc += np.bincount(idx, minlength=acc.size)
+
+    # param1 ごとの投票数 = その段階以上の層の累積
+    layers = acc.reshape(n_levels, h, w)
+    votes_by_p1 = {}
+    running = np.zeros((h, w), dtype=np.float32)
+    for i in range(n_levels - 1, -1, -1):
+        running = running + layers[i]
+        votes_by_p1[p1_levels[i]] = running
+
+    # 各パターンの強度 = (ceil(dp)四方の投票合計) / param2、パターン間の最大値を採用
+    strength = np.zeros((h, w), dtype=np.float32)
+    for dp, p1, p2 in HOUGH_PARAM_SETS:
+        k = int(np.ceil(dp))
+        votes = votes_by_p1[p1]
+        if k > 1:
+            votes = cv2.boxFilter(votes, -1, (k, k), normalize=False)
+        np.maximum(strength, votes / float(p2), out=strength)
+
+    # 局所最大かつ強度1以上の中心候補
+    local_max = strength >= cv2.dilate(strength, np.ones((3, 3), np.uint8))
+    cand_y, cand_x = np.nonzero(local_max & (strength >= 1.0))
+    if len(cand_x) == 0:
+        return report_failure(f"最大強度 {strength.max():.2f} < 1")
+
+    # 強度の高い順（同点は y, x 順）に minDist で間引く
+    order = np.lexsort((cand_x, cand_y, -strength[cand_y, cand_x]))
+    centers = []
+    for i in order:
+        x, y = int(cand_x[i]), int(cand_y[i])
+        if all((x - px) ** 2 + (y - py) ** 2 >= min_dist ** 2 for px, py, _ in centers):
+            centers.append((x, y, float(strength[y, x])))
+        if len(centers) >= 8:
+            break
+
+    # 各中心の半径: 中心を向いた勾配を持つエッジ点までの距離のヒストグラムの最頻値
+    best = None
+    for x, y, s in centers:
+        vx, vy = xs - x, ys - y
+        dist = np.hypot(vx, vy)
+        in_range = (dist >= min_r) & (dist <= max_r)
+        radial = np.abs(vx * ux + vy * uy) >= 0.9 * dist
+        d = np.rint(dist[in_range & radial]).astype(np.int64) - min_r
+        if len(d) == 0:
+            continue
+        hist = np.convolve(np.bincount(d, minlength=max_r - min_r + 1), np.ones(3), mode='same')
+        r = int(hist.argmax()) + min_r
+        # 円周の2割以上がエッジで支持されていること
+        if hist.max() < 0.2 * 2 * np.pi * r:
+            continue
+        key = (s, r, -y, -x)
+        if best is None or key > best[0]:
+            best = (key, (float(x), float(y), float(r)))
+
+    if best is None:
+        return report_failure(f"半径の支持不足（中心候補{len(centers)}件）")
+
+    elapsed = (time.perf_counter() - start) * 1000
+    x, y, r = best[1]
+    print(f"   HoughSweep: center=({x:.0f},{y:.0f}) radius={r:.0f} "
+          f"強度={best[0][0]:.2f} ({elapsed:.1f}ms)")
+    return best[1]
+
+
+def _circle_result(x, y, r, w, h, min_dim, method):
+    """円（ピクセル）を比率の検知結果に変換"""
+    cx_ratio = float(x) / w
+    cy_ratio = float(y) / h
+    r_ratio = float(r) / min_dim
+
+    print(f"   円: center=({x},{y}) radius={r}")
+    print(f"   比率: cx={cx_ratio:.3f} cy={cy_ratio:.3f} r={r_ratio:.3f}")
+    print("=" * 70 + "\n")
+
+    return {'cx': cx_ratio, 'cy': cy_ratio, 'r': r_ratio, 'method': method}
+
+
+def _try_hough_circles(blurred, w, h, min_dim):
+    """HoughCirclesで円を検出（goal.jpg基準: 大きめの円を優先）"""
+    print("🔍 戦略1: HoughCircles...")
+
+    circle = _hough_sweep(blurred, min_dim)
+    if circle is None:
+        print("   → HoughCircles: 検出なし")
+        return None
+
+    x, y, r = (int(round(v)) for v in circle)
+    print(f"✅ HoughCircles検出成功!")
+    return _circle_result(x, y, r, w, h, min_dim, 'hough')
+
+
+def _try_hough_pyramid(ctx, w, h, min_dim, single_pass=False):
+    """
+    粗→細のHoughCircles
+    1. 長辺 PYRAMID_SIZE の縮小画像で候補円を検出（アキュムレータが小さく高速）
+       single_pass=True なら _hough_vote（1回の投票で全パラメータを評価）
+    2. フル解像度のグレースケールで円周付近だけを走査して中心・半径を精密化
+    """
+    label = 'sweep' if single_pass else 'pyramid'
+    print(f"🔍 戦略1: HoughCircles ({label} {PYRAMID_SIZE}px)...")
+
+    small, scale = ctx.pyramid(PYRAMID_SIZE)
+    sh, sw = small.shape
+    if single_pass:
+        circle = _hough_vote(small, min(sw, sh))
+    else:
+        circle = _hough_sweep(small, min(sw, sh))
+    if circle is None:
+        print("   → HoughCircles: 検出なし")
+        return None
+
+    # 縮小画像の座標 → フル解像度
+    x, y, r = (v / scale for v in circle)
+    print(f"   粗検出: center=({x:.0f},{y:.0f}) radius={r:.0f} (scale={scale:.3f})")
+
+    refined = _refine_circle(ctx.gray, x, y, r, scale, min_dim * 0.55)
+    if refined:
+        x, y, r = refined
+        print(f"   精密化: center=({x:.0f},{y:.0f}) radius={r:.0f}")
+
+    # 半径はフル解像度の探索範囲に収める
+    r = min(max(r, min_dim * 0.20), min_dim * 0.55)
+    print(f"✅ HoughCircles検出成功!")
+    return _circle_result(int(round(x)), int(round(y)), int(round(r)), w, h, min_dim, 'hough')
+
+
+def _refine_circle(gray, cx, cy, r, scale, max_r, n_rays=180):
+    """
+    粗検出の円をフル解像度で精密化
+
+    円周付近の帯（r-margin 〜 1.35r）だけを放射方向にサンプリングする（画像全体は走査しない）
+    1. 半径ごとに「強いエッジを持つ方向の数」を数え、粗検出と同程度に支持される
+       同心円のうち最も大きいもの（どんぶりの縁）を選ぶ（goal.jpg基準: 大きめの円を優先）
+    2. 各方向でその半径付近の勾配最大点を円周とみなし、最小二乗で円を当てはめる
+
+    Returns:
+        (cx, cy, r) フル解像度、精密化できなければ None
+    """
+    h, w = gray.shape
+    # 縮小による量子化誤差（dp込みで数ピクセル）をカバーする探索幅
+    margin = max(4.0, 3.0 / scale, r * 0.08)
+
+    angles = np.linspace(0, 2 * np.pi, n_rays, endpoint=False)
+    r_hi = min(max_r, r * 1.35) + margin
+    radii = np.arange(max(1.0, r - margin), max(r_hi, r + margin), 1.0)
+    if len(radii) < 3:
+        return None
+
+    cos_a = np.cos(angles)[:, None]
+    sin_a = np.sin(angles)[:, None]
+    map_x = (cx + radii[None, :] * cos_a).astype(np.float32)
+    map_y = (cy + radii[None, :] * sin_a).astype(np.float32)
+
+    # 画像内に収まる方向だけを使う（帯の外側が画像外でも内側は使える）
+    inside_pts = (map_x >= 0) & (map_x <= w - 1) & (map_y >= 0) & (map_y <= h - 1)
+    profiles = cv2.remap(gray, map_x, map_y, cv2.INTER_LINEAR).astype(np.float32)
+    profiles = cv2.GaussianBlur(profiles, (5, 1), 0)
+    grad = np.abs(np.diff(profiles, axis=1))
+    grad[~(inside_pts[:, 1:] & inside_pts[:, :-1])] = 0
+    edge_radii = radii[:-1] + 0.5
+
+    # 半径ごとの支持数 = ±2px以内に強いエッジ（その方向の最大勾配の半分以上）を持つ方向の数
+    ray_max = grad.max(axis=1, keepdims=True)
+    strong = ((grad >= np.maximum(4.0, ray_max * 0.5)) & (ray_max >= 4.0)).astype(np.uint8)
+    strong = cv2.dilate(strong, np.ones((1, 5), np.uint8))
+    support = strong.sum(axis=0)
+
+    near = np.abs(edge_radii - r) <= margin
+    base = support[near].max() if near.any() else 0
+    need = max(n_rays * 0.4, base * 0.7)
+    if support.max() < need:
+        return None
+    target = edge_radii[support >= need].max()
+
+    # 選んだ半径付近で各方向の勾配最大点を取る
+    band = np.abs(edge_radii - target) <= max(3.0, margin * 0.5)
+    band_grad = np.where(band[None, :], grad, -1)
+    idx = band_grad.argmax(axis=1)
+    strength = grad[np.arange(n_rays), idx]
+    valid = strength >= max(4.0, np.median(strength[strength > 0]) * 0.5) if (strength > 0).any() else strength > 0
+    if valid.sum() < n_rays // 4:
+        return None
+
+    edge_r = edge_radii[idx]
+    xs = cx + edge_r * cos_a[:, 0]
+    ys = cy + edge_r * sin_a[:, 0]
+
+    fit = _fit_circle(xs[valid], ys[valid])
+    if fit is None:
+        return None
+
+    # 外れ値（他の物体のエッジ）を除いて再フィット
+    fx, fy, fr = fit
+    resid = np.abs(np.hypot(xs - fx, ys - fy) - fr)
+    keep = valid & (resid <= max(2.0, 2.5 * np.median(resid[valid])))
+    if keep.sum() >= n_rays // 4:
+        fit = _fit_circle(xs[keep], ys[keep]) or fit
+
+    fx, fy, fr = fit
+    # 選んだ半径・粗検出の中心から大きく外れた場合は精密化失敗とみなす
+    if abs(fr - target) > margin or np.hypot(fx - cx, fy - cy) > margin:
+        return None
+    return fx, fy, fr
+
+
+def _fit_circle(xs, ys):
+    """代数的最小二乗法（Kasa法）で円を当てはめる"""
+    if len(xs) < 3:
+        return None
+    A = np.column_stack([xs, ys, np.ones_like(xs)])
+    b = -(xs * xs + ys * ys)
+    try:
+        (d, e, f), *_ = np.linalg.lstsq(A, b, rcond=None)
+    except np.linalg.LinAlgError:
+        return None
+    fx, fy = -d / 2, -e / 2
+    rr = fx * fx + fy * fy - f
+    if rr <= 0:
+        return None
+    return float(fx), float(fy), float(np.sqrt(rr))
+
+
 def _try_contour_detection(blurred, w, h, min_dim):
     """輪郭検出で最大の円形オブジェクトを見つける"""
     print("🔍 戦略2: 輪郭検出...")
@@ -290,21 +639,57 @@ def save_simple(image_data, output_path):
         return False
 
 
-def crop_bowl(image_path, output_path):
+def crop_bowl(source, output_path, bowl=None):
     """
     どんぶり検知→一撃切り抜き
     OpenCVでどんぶりを検知し、その位置で正方形切り抜きを実行
+
+    Args:
+        source: 画像パス または ImageContext
+        bowl: 検知済みの { cx, cy, r, method }（指定時は再検知しない）
     """
+    cropped = crop_bowl_image(source, bowl=bowl)
+    if cropped is None:
+        return False
     try:
-        # まず画像を開いてEXIF回転
-        img = Image.open(image_path)
-        img = apply_exif_rotation(img)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        # 出力ディレクトリ確認
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+
+        # 保存（一時ファイルから置き換え: output_path がアップロードへのハードリンクでも元画像を上書きしない）
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            cropped.save(tmp_path, format='JPEG', quality=95)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        print(f"✅ 切り抜き保存完了: {output_path}")
+        return True
+
+    except Exception as e:
+        print(f"❌ 切り抜き保存エラー: {e}")
+        return False
+
+
+def crop_bowl_image(source, bowl=None):
+    """
+    crop_bowl のメモリ上版: 切り抜いた PIL 画像を返す（失敗時は None）
+
+    Args:
+        source: 画像パス または ImageContext
+        bowl: 検知済みの { cx, cy, r, method }（指定時は再検知しない）
+    """
+    try:
+        # EXIF回転済み画像（ImageContext で共有）
+        ctx = ensure_context(source)
+        img = ctx.image
         w, h = img.size
 
-        # どんぶり検知
-        bowl = detect_bowl(image_path)
+        # どんぶり検知（検知済みの結果があればそれを使う）
+        if bowl is None:
+            bowl = detect_bowl(ctx)
 
         if bowl:
             cx = bowl['cx'] * w
@@ -358,18 +743,10 @@ def crop_bowl(image_path, output_path):
             print(f"📌 フォールバック中央切り抜き: ({left},{top}) -> ({right},{bottom})")
             cropped = img.crop((left, top, right, bottom))
 
-        # 出力ディレクトリ確認
-        output_dir = os.path.dirname(output_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-
-        # 保存
-        cropped.save(output_path, format='JPEG', quality=95)
-        print(f"✅ 切り抜き保存完了: {output_path}")
-        return True
+        return cropped
 
     except Exception as e:
         print(f"❌ 切り抜きエラー: {e}")
         import traceback
         traceback.print_exc()
-        return False
+        return None
@@ -0,0 +1,180 @@
+"""
+派生画像キャッシュモジュール - 元画像から ラベル付き画像 までの各段階をキャッシュする
+
+  1. どんぶりの位置   cropper.bowl_cache（SHA-256 + 検知モード、/tmp に JSON）
+  2. ラベルなし切り抜き  crop_cache（メモリ上の PIL 画像、DERIVED_CROP_CACHE_MB まで）
+  3. ラベル付き画像   出力ファイル名を (SHA-256, 店名, 描画・エンコード設定) から決める
+                       → 同じ店名に戻したときはファイルがあるか見るだけ
+
+店名の修正は 2 のヒットで「ラベル合成 + エンコード」だけ、以前と同じ店名なら 3 のヒットでファイル参照だけになる
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import threading
+
+from modules import cropper, labeler
+from modules.content_cache import make_key
+from modules.image_context import ImageContext, ensure_context
+
+DERIVED_CROP_CACHE_MB = float(os.environ.get('DERIVED_CROP_CACHE_MB', '96'))
+
+# UploadStore が付けるファイル名（<SHA-256>.<拡張子>）
+_CONTENT_NAME_RE = re.compile(r'^([0-9a-f]{64})\.[A-Za-z0-9]+$')
+# output_filename が付けるファイル名（<prefix>_<SHA-256先頭16桁>_<キーのハッシュ16桁>.jpg）
+_OUTPUT_NAME_RE = re.compile(r'^[a-z]+_([0-9a-f]{16}_[0-9a-f]{16})\.jpg$')
+
+
+def file_sha256(path) -> str:
+    """
+    ファイルの SHA-256（アップロードのファイル名が内容のハッシュならファイルを読まない）
+    """
+    match = _CONTENT_NAME_RE.match(os.path.basename(path))
+    if match:
+        return match.group(1)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def name_etag(filename):
+    """
+    名前から内容が決まるファイル（元画像・ラベル付き画像）ならその名前のハッシュ部分（ETag用）
+    それ以外（cropped_ など上書きされうるもの）は None
+    """
+    match = _CONTENT_NAME_RE.match(filename) or _OUTPUT_NAME_RE.match(filename)
+    return match.group(1) if match else None
+
+
+def crop_key(sha256, bowl=None) -> str:
+    """ラベルなし切り抜きのキー（bowl 指定時はその位置、なければ検知モード）"""
+    if bowl:
+        return make_key(sha256, cx=round(bowl['cx'], 6), cy=round(bowl['cy'], 6), r=round(bowl['r'], 6))
+    return make_key(sha256, detector=cropper.BOWL_DETECTOR, cv2=cropper.HAS_CV2)
+
+
+def output_key(sha256, shop_name, options, **extra) -> str:
+    """
+    ラベル付き画像のキー: 元画像・切り抜き設定・店名・描画設定・エンコード設定
+
+    Args:
+        extra: そのほか結果を左右するもの（/process の input='cropped' など）
+    """
+    params = dict(options)
+    params.update(labeler.label_renderer.params())
+    params.update(extra)
+    return make_key(crop_key(sha256), shop=shop_name, **params)
+
+
+def output_filename(prefix, sha256, shop_name, options, **extra) -> str:
+    """
+    ラベル付き画像のファイル名（同じキーなら同じ名前 = 名前が同じなら内容も同じ）
+    例: processed_<SHA-256先頭16桁>_<キーのハッシュ16桁>.jpg
+    """
+    key = output_key(sha256, shop_name, options, **extra)
+    key_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return f"{prefix}_{sha256[:16]}_{key_hash[:16]}.jpg"
+
+
+class CropCache:
+    """
+    ラベルなし切り抜き（PIL 画像）のメモリ LRU（画素のバイト数で上限）
+
+    返す画像は共有なので、描き込む側でコピーすること（image_pipeline.label_and_encode の owned=False）
+    """
+
+    def __init__(self, max_bytes=int(DERIVED_CROP_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            img = self._entries.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key, img):
+        size = _image_bytes(img)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= _image_bytes(old)
+            self._entries[key] = img
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _image_bytes(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 3) if total else None,
+            }
+
+
+def _image_bytes(img):
+    w, h = img.size
+    return w * h * len(img.getbands())
+
+
+crop_cache = CropCache()
+
+
+def cropped_image(source, bowl=None, sha256=None):
+    """
+    ラベルなし切り抜き（キャッシュにあればデコードも検知もしない）
+
+    Args:
+        source: 画像パス / bytes / ImageContext
+        sha256: 分かっていれば元画像のハッシュ（パスの場合にファイルを読まずにキャッシュを引ける）
+
+    Returns:
+        (切り抜き PIL 画像 or None, ImageContext or None)  キャッシュヒット時の ImageContext は None
+    """
+    if sha256 is None:
+        if isinstance(source, ImageContext):
+            sha256 = source.sha256
+        elif isinstance(source, (str, os.PathLike)):
+            sha256 = file_sha256(os.fspath(source))
+    key = crop_key(sha256, bowl) if sha256 else None
+    if key:
+        cached = crop_cache.get(key)
+        if cached is not None:
+            print(f"♻️ 切り抜きキャッシュ: {sha256[:12]}")
+            return cached, None
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            ctx = ImageContext(f.read(), path=os.fspath(source), sha256=sha256)
+    else:
+        ctx = ensure_context(source)
+    cropped = cropper.crop_bowl_image(ctx, bowl=bowl)
+    if cropped is not None:
+        crop_cache.put(key or crop_key(ctx.sha256, bowl), cropped)
+    return cropped, ctx
+
+
+def stats():
+    return {'crops': crop_cache.stats()}
@@ -0,0 +1,237 @@
+"""
+EXIF GPS 高速パーサ
+画像全体をデコードせず、EXIF（TIFF構造）の部分だけを読んで GPS 座標を取り出す
+
+  - JPEG : APP1 "Exif\\0\\0" セグメント（SOS より前のマーカーだけを走査）
+  - PNG  : eXIf チャンク（IDAT などはスキップ）
+  - HEIC : Exif アイテムを "Exif\\0\\0" + TIFF ヘッダのパターンで探す（簡易判定）
+
+読めない形式・壊れた EXIF は ExifParseError を投げるので、呼び出し側で Pillow の方法に切り替える
+"""
+import struct
+from typing import Optional, Tuple
+
+# ファイルから読む場合に最初に読むバイト数（JPEG の APP1 は最大64KB、通常はファイルの先頭にある）
+HEAD_BYTES = 256 * 1024
+
+_JPEG_SOI = b'\xff\xd8'
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_EXIF_HEADER = b'Exif\x00\x00'
+_TIFF_HEADERS = (b'MM\x00\x2a', b'II\x2a\x00')
+
+_GPS_IFD_TAG = 0x8825
+_GPS_LATITUDE_REF = 1
+_GPS_LATITUDE = 2
+_GPS_LONGITUDE_REF = 3
+_GPS_LONGITUDE = 4
+
+# TIFF の型 → 1要素のバイト数
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+_RATIONAL = 5
+_SRATIONAL = 10
+_ASCII = 2
+
+
+class ExifParseError(Exception):
+    """この形式・データは高速パーサでは判定できない"""
+
+
+class TruncatedExif(ExifParseError):
+    """EXIF がバッファの外まで続いている（ファイル全体を読めば判定できる）"""
+
+
+def find_tiff(data: bytes) -> Optional[memoryview]:
+    """
+    画像のバイト列から EXIF の TIFF 部分を探す
+
+    Returns:
+        TIFF 部分（EXIF がないと確定した場合は None）
+    """
+    if data.startswith(_JPEG_SOI):
+        return _find_tiff_jpeg(data)
+    if data.startswith(_PNG_SIGNATURE):
+        return _find_tiff_png(data)
+    if len(data) >= 12 and data[4:8] == b'ftyp':
+        return _find_tiff_heif(data)
+    raise ExifParseError("unsupported format")
+
+
+def _find_tiff_jpeg(data):
+    pos = 2
+    size = len(data)
+    while True:
+        if pos + 4 > size:
+            raise TruncatedExif("JPEG header truncated")
+        if data[pos] != 0xFF:
+            raise ExifParseError(f"JPEG marker expected at {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # 詰め物の 0xFF
+            pos += 1
+            continue
+        if marker in (0xDA, 0xD9):
+            # SOS / EOI: これ以降に EXIF はない
+            return None
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 2
+            continue
+        (length,) = struct.unpack_from('>H', data, pos + 2)
+        end = pos + 2 + length
+        if marker == 0xE1 and data[pos + 4:pos + 10] == _EXIF_HEADER:
+            if end > size:
+                raise TruncatedExif("APP1 truncated")
+            return memoryview(data)[pos + 10:end]
+        pos = end
+
+
+def _find_tiff_png(data):
+    pos = len(_PNG_SIGNATURE)
+    size = len(data)
+    while True:
+        if pos + 8 > size:
+            raise TruncatedExif("PNG chunk truncated")
+        length, chunk_type = struct.unpack_from('>I4s', data, pos)
+        start = pos + 8
+        end = start + length
+        if chunk_type == b'eXIf':
+            if end > size:
+                raise TruncatedExif("eXIf truncated")
+            tiff = memoryview(data)[start:end]
+            # "Exif\0\0" 付きで書き込むソフトもある
+            if bytes(tiff[:6]) == _EXIF_HEADER:
+                tiff = tiff[6:]
+            return tiff
+        if chunk_type == b'IEND':
+            return None
+        pos = end + 4  # CRC
+
+
+def _find_tiff_heif(data):
+    # iloc を辿らずに、Exif アイテムの中身（"Exif\0\0" + TIFF ヘッダ）を直接探す
+    for tiff_header in _TIFF_HEADERS:
+        idx = data.find(_EXIF_HEADER + tiff_header)
+        if idx >= 0:
+            return memoryview(data)[idx + 6:]
+    raise ExifParseError("HEIF Exif item not found")
+
+
+def read_gps(data: bytes) -> Optional[Tuple[float, float]]:
+    """
+    画像のバイト列から GPS 座標 (緯度, 経度) を読む
+
+    Returns:
+        (lat, lon) / GPS がないと確定した場合は None
+    Raises:
+        ExifParseError: 判定できない（Pillow などにフォールバックする）
+    """
+    tiff = find_tiff(data)
+    if tiff is None:
+        return None
+    return read_gps_from_tiff(tiff)
+
+
+def read_gps_from_file(path: str, head_bytes: int = HEAD_BYTES) -> Optional[Tuple[float, float]]:
+    """ファイルの先頭だけを読んで GPS 座標を読む（EXIF が先頭に収まらない場合だけ全体を読む）"""
+    with open(path, 'rb') as f:
+        head = f.read(head_bytes)
+        try:
+            return read_gps(head)
+        except TruncatedExif:
+            if len(head) < head_bytes:
+                raise
+            return read_gps(head + f.read())
+        except ExifParseError:
+            # HEIC は Exif アイテムがファイルの後ろにあることがある
+            if len(head) < head_bytes or not head[4:8] == b'ftyp':
+                raise
+            return read_gps(head + f.read())
+
+
+def read_gps_from_tiff(tiff) -> Optional[Tuple[float, float]]:
+    if len(tiff) < 8:
+        raise ExifParseError("TIFF header truncated")
+    header = bytes(tiff[:4])
+    if header == _TIFF_HEADERS[0]:
+        endian = '>'
+    elif header == _TIFF_HEADERS[1]:
+        endian = '<'
+    else:
+        raise ExifParseError("bad TIFF header")
+    (ifd0,) = struct.unpack_from(endian + 'I', tiff, 4)
+
+    gps_offset = None
+    for tag, typ, count, value_pos in _iter_ifd(tiff, ifd0, endian):
+        if tag == _GPS_IFD_TAG:
+            gps_offset = _read_values(tiff, typ, count, value_pos, endian)[0]
+            break
+    if not gps_offset:
+        return None
+
+    gps = {}
+    for tag, typ, count, value_pos in _iter_ifd(tiff, gps_offset, endian):
+        if tag in (_GPS_LATITUDE_REF, _GPS_LONGITUDE_REF) and typ == _ASCII:
+            raw = bytes(_slice(tiff, value_pos, count))
+            gps[tag] = raw.split(b'\x00', 1)[0].decode('ascii', 'replace')
+        elif tag in (_GPS_LATITUDE, _GPS_LONGITUDE):
+            if typ not in (_RATIONAL, _SRATIONAL) or count < 3:
+                raise ExifParseError(f"unexpected GPS value type {typ}x{count}")
+            gps[tag] = _read_values(tiff, typ, count, value_pos, endian)
+
+    if _GPS_LATITUDE not in gps or _GPS_LONGITUDE not in gps:
+        return None
+    lat = dms_to_decimal(gps[_GPS_LATITUDE], gps.get(_GPS_LATITUDE_REF, 'N'))
+    lon = dms_to_decimal(gps[_GPS_LONGITUDE], gps.get(_GPS_LONGITUDE_REF, 'E'))
+    # gps_locator.get_gps_from_gps_ifd と同じく 0 は「座標なし」とみなす
+    if lat and lon:
+        return lat, lon
+    return None
+
+
+def dms_to_decimal(values, ref) -> float:
+    """(度, 分, 秒) の (分子, 分母) を10進数の度に（分母0は分子をそのまま使う）"""
+    degrees, minutes, seconds = (
+        float(num) / float(den) if den != 0 else float(num) for num, den in values[:3])
+    decimal = degrees + (minutes / 60.0) + (seconds / 3600.0)
+    if ref in ('S', 'W'):
+        decimal = -decimal
+    return decimal
+
+
+def _iter_ifd(tiff, offset, endian):
+    """IFD のエントリ (tag, type, count, 値の位置) を返す"""
+    if offset + 2 > len(tiff):
+        raise ExifParseError("IFD offset out of range")
+    (entries,) = struct.unpack_from(endian + 'H', tiff, offset)
+    if offset + 2 + entries * 12 > len(tiff):
+        raise ExifParseError("IFD truncated")
+    for i in range(entries):
+        entry = offset + 2 + i * 12
+        tag, typ, count = struct.unpack_from(endian + 'HHI', tiff, entry)
+        size = _TYPE_SIZES.get(typ, 0) * count
+        if size <= 4:
+            value_pos = entry + 8
+        else:
+            (value_pos,) = struct.unpack_from(endian + 'I', tiff, entry + 8)
+        yield tag, typ, count, value_pos
+
+
+def _slice(tiff, pos, length):
+    if pos + length > len(tiff):
+        raise ExifParseError("value out of range")
+    return tiff[pos:pos + length]
+
+
+def _read_values(tiff, typ, count, pos, endian):
+    if typ == _RATIONAL:
+        raw = struct.unpack_from(f'{endian}{count * 2}I', _slice(tiff, pos, count * 8))
+        return list(zip(raw[0::2], raw[1::2]))
+    if typ == _SRATIONAL:
+        raw = struct.unpack_from(f'{endian}{count * 2}i', _slice(tiff, pos, count * 8))
+        return list(zip(raw[0::2], raw[1::2]))
+    if typ == 4:  # LONG
+        return list(struct.unpack_from(f'{endian}{count}I', _slice(tiff, pos, count * 4)))
+    if typ == 13:  # IFD
+        return list(struct.unpack_from(f'{endian}{count}I', _slice(tiff, pos, count * 4)))
+    if typ == 3:  # SHORT
+        return list(struct.unpack_from(f'{endian}{count}H', _slice(tiff, pos, count * 2)))
+    raise ExifParseError(f"unsupported TIFF type {typ}")
@@ -0,0 +1,125 @@
+"""
+地理計算ユーティリティ
+geohash タイル（店舗キャッシュのキー）と緯度経度の範囲計算
+"""
+import math
+
+import numpy as np
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# 緯度1度あたりの距離（メートル）
+METERS_PER_DEG_LAT = 111320.0
+# 地球の半径（メートル、gps_shop_finder.haversine_distance と同じ値）
+EARTH_RADIUS_M = 6371000
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 5) -> str:
+    """緯度経度を geohash 文字列に変換"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bit, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_BASE32[ch])
+            bit, ch = 0, 0
+    return ''.join(chars)
+
+
+def geohash_bbox(geohash: str):
+    """geohash タイルの範囲 (south, west, north, east)"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for c in geohash:
+        cd = _BASE32.index(c)
+        for mask in (16, 8, 4, 2, 1):
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                if cd & mask:
+                    lon_lo = mid
+                else:
+                    lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if cd & mask:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lon_lo, lat_hi, lon_hi
+
+
+def geohash_cell_size(precision: int):
+    """指定精度のタイル1枚の大きさ（緯度方向の度, 経度方向の度）"""
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def circle_bbox(lat: float, lon: float, radius_m: float):
+    """中心＋半径（メートル）を囲む範囲 (south, west, north, east)"""
+    dlat = radius_m / METERS_PER_DEG_LAT
+    dlon = radius_m / (METERS_PER_DEG_LAT * max(0.01, math.cos(math.radians(lat))))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def tiles_covering_circle(lat: float, lon: float, radius_m: float, precision: int = 5):
+    """円を覆う geohash タイルの一覧"""
+    south, west, north, east = circle_bbox(lat, lon, radius_m)
+    lat_step, lon_step = geohash_cell_size(precision)
+
+    tiles = []
+    i_lo = int(math.floor((south + 90.0) / lat_step))
+    i_hi = int(math.floor((north + 90.0) / lat_step))
+    j_lo = int(math.floor((west + 180.0) / lon_step))
+    j_hi = int(math.floor((east + 180.0) / lon_step))
+    for i in range(i_lo, i_hi + 1):
+        cell_lat = -90.0 + (i + 0.5) * lat_step
+        if not -90.0 < cell_lat < 90.0:
+            continue
+        for j in range(j_lo, j_hi + 1):
+            cell_lon = -180.0 + ((j + 0.5) * lon_step) % 360.0
+            tiles.append(geohash_encode(cell_lat, cell_lon, precision))
+    return tiles
+
+
+def union_bbox(bboxes):
+    """複数の範囲をまとめた範囲"""
+    bboxes = list(bboxes)
+    return (
+        min(b[0] for b in bboxes),
+        min(b[1] for b in bboxes),
+        max(b[2] for b in bboxes),
+        max(b[3] for b in bboxes),
+    )
+
+
+def haversine_array(lat: float, lon: float, lats, lons):
+    """1点から複数点への距離（メートル）を numpy でまとめて計算"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlmb = np.radians(lons) - math.radians(lon)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
@@ -1,13 +1,29 @@
 """
 GPS座標抽出モジュール - 完全版
 PillowでEXIFからGPS座標を確実に抽出（Pillow 10.0+対応）
+
+まず exif_gps の高速パーサで EXIF セグメントだけを読み、判定できない場合だけ
+Pillow → macOS コマンド（sips / mdls、macOS でのみ実行）の順に試す
 """
 from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS, IFD
+import os
+import shutil
 import subprocess
+import sys
 import json
 import re
 
+from modules import exif_gps
+from modules.image_context import ImageContext, ensure_context
+
+# sips / mdls は macOS にしかない（Linux / Vercel では毎回の起動失敗を省く）
+MACOS_GPS_TOOLS = (
+    os.environ.get('GPS_MACOS_TOOLS', '1') == '1'
+    and sys.platform == 'darwin'
+    and shutil.which('sips') is not None
+)
+
 
 def get_decimal_from_dms(dms, ref):
     """
@@ -46,7 +62,17 @@ def get_gps_from_exif_ifd(img):
             return None
         
         # IFD.GPSInfo から取得
-        gps_ifd = exif.get_ifd(IFD.GPSInfo)
+        return get_gps_from_gps_ifd(exif.get_ifd(IFD.GPSInfo))
+    except Exception as e:
+        print(f"IFD GPS extraction error: {e}")
+        return None
+
+
+def get_gps_from_gps_ifd(gps_ifd):
+    """
+    解析済みのGPS IFD（ImageContext.gps_ifd など）から座標を取得
+    """
+    try:
         if not gps_ifd:
             print("No GPS IFD found")
             return None
@@ -241,32 +267,83 @@ def get_gps_info(exif):
     return None
 
 
-def get_gps_coordinates(image_path):
+def get_gps_from_pillow(source):
     """
-    画像からGPS座標を確実に取得（メイン関数）
-    複数の方法を順番に試行
+    Pillow で GPS を取得（IFD方式 → 従来の_getexif()方式）
+
+    Returns:
+        (座標 or None, 画像パス or None)
     """
-    print(f"=== GPS Extraction: {image_path} ===")
-    
+    image_path = source if isinstance(source, str) else None
     try:
-        img = Image.open(image_path)
+        ctx = ensure_context(source)
+        image_path = ctx.path
+        print(f"=== GPS Extraction: {image_path or ctx.sha256[:12]} ===")
         
-        # 方法1: Pillow 10.0+ IFD方式
+        # 方法1: Pillow 10.0+ IFD方式（ImageContextで解析済みのGPS IFD）
         print("Trying IFD method...")
-        result = get_gps_from_exif_ifd(img)
+        result = get_gps_from_gps_ifd(ctx.gps_ifd)
         if result:
             print(f"✅ IFD method success: {result}")
-            return result
+            return result, image_path
         
         # 方法2: 従来の_getexif()方式
         print("Trying legacy method...")
-        result = get_gps_from_legacy_exif(img)
+        result = get_gps_from_legacy_exif(ctx.raw_image)
         if result:
             print(f"✅ Legacy method success: {result}")
-            return result
+            return result, image_path
         
     except Exception as e:
         print(f"Pillow methods failed: {e}")
+    return None, image_path
+
+
+def get_gps_coordinates(source, fast=True, macos_tools=None):
+    """
+    画像からGPS座標を確実に取得（メイン関数）
+    複数の方法を順番に試行
+
+    Args:
+        source: 画像パス / bytes / ImageContext（解析済みEXIFを共有）
+        fast: EXIF セグメントだけを読む高速パーサを最初に試す（False なら従来の Pillow から）
+        macos_tools: sips / mdls を試すか（None なら macOS のときだけ）
+    """
+    if macos_tools is None:
+        macos_tools = MACOS_GPS_TOOLS
+    image_path = source.path if isinstance(source, ImageContext) else (
+        source if isinstance(source, str) else None)
+
+    use_pillow = True
+    if fast:
+        # 方法0: EXIF セグメントだけを読む（デコードも Pillow も使わない）
+        try:
+            if isinstance(source, ImageContext):
+                result = exif_gps.read_gps(source.data)
+            elif isinstance(source, (bytes, bytearray)):
+                result = exif_gps.read_gps(bytes(source))
+            else:
+                result = exif_gps.read_gps_from_file(os.fspath(source))
+            if result:
+                print(f"✅ GPS (EXIF segment): {result}")
+                return result
+            # GPS がないことは確定（Pillow も同じ EXIF を読むだけなので省く）
+            use_pillow = False
+        except exif_gps.ExifParseError as e:
+            print(f"EXIF segment parser fallback: {e}")
+        except OSError as e:
+            print(f"GPS file read error: {e}")
+            return None
+
+    if use_pillow:
+        result, image_path = get_gps_from_pillow(source)
+        if result:
+            return result
+    
+    if not image_path or not macos_tools:
+        # メモリ上の画像はmacOSコマンドに渡せない / macOS 以外には sips・mdls がない
+        print("❌ All GPS extraction methods failed")
+        return None
     
     # 方法3: macOS sipsコマンド
     print("Trying SIPS method...")
@@ -5,8 +5,25 @@ GPS座標から店名を特定するモジュール - ラーメン店限定版
 import requests
 from typing import Optional, List, Dict
 import math
+import os
 import re
 
+import numpy as np
+
+from modules.geo_utils import circle_bbox, haversine_array
+from modules.shop_cache import SHOP_CACHE_ENABLED, element_coords, shop_cache
+from modules.shop_index import get_shop_index
+from modules.text_normalizer import KeywordMatcher
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+
+# 店舗検索の段階（メートル）: 候補が MIN_CANDIDATES 件未満なら次の段階まで広げる
+SEARCH_TIERS = (500, 2000, 5000)
+MIN_CANDIDATES = 3
+
+# single: 最大半径で1回だけ取得して段階はローカルで適用 / escalate: 段階ごとに検索（旧方式）
+GPS_SEARCH_MODE = os.environ.get('GPS_SEARCH_MODE', 'single')
+
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """2点間の距離を計算（メートル）"""
@@ -21,101 +38,142 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     return R * c
 
 
+# 厳格なラーメンキーワード（ラーメン専門店のみ）
+STRICT_RAMEN_KEYWORDS = [
+    'ラーメン', 'らーめん', 'らぁめん', '拉麺',
+    '中華そば', 'つけ麺', '担々麺', 'タンタン麺',
+    '麺屋', '麺や', '麺処', '麺家', '麺道',
+]
+
+# 除外する店舗（チェーン・ファストフード・コンビニ）
+EXCLUDED_SHOP_KEYWORDS = [
+    'マクドナルド', 'McDonald', 'ドミノ', 'ピザ', 'Pizza',
+    'ケンタッキー', 'KFC', 'すき家', '吉野家', '松屋',
+    'ガスト', 'サイゼリヤ', 'デニーズ', 'ジョナサン',
+    'スターバックス', 'ドトール', 'タリーズ',
+    'コンビニ', 'セブン', 'ファミマ', 'ローソン'
+]
+
+# GPSなしの場合に OCR 行から店名とみなすキーワード
+OCR_RAMEN_KEYWORDS = ['ラーメン', 'らーめん', 'らぁめん', '麺屋', '麺処', '中華そば']
+
+_STRICT_RAMEN_MATCHER = KeywordMatcher(STRICT_RAMEN_KEYWORDS, ignore_case=True)
+_EXCLUDED_SHOP_MATCHER = KeywordMatcher(EXCLUDED_SHOP_KEYWORDS)
+_OCR_RAMEN_MATCHER = KeywordMatcher(OCR_RAMEN_KEYWORDS)
+
+
 def is_ramen_shop(name: str, cuisine: str = '') -> bool:
     """
     ラーメン店かどうか厳格に判定
     店名に「ラーメン」が含まれる OR cuisine=ramen のみ許可
     """
-    # 厳格なラーメンキーワード（ラーメン専門店のみ）
-    strict_keywords = [
-        'ラーメン', 'らーめん', 'らぁめん', '拉麺',
-        '中華そば', 'つけ麺', '担々麺', 'タンタン麺',
-        '麺屋', '麺や', '麺処', '麺家', '麺道',
-    ]
-
-    name_check = name.lower()
-    cuisine_check = cuisine.lower()
-
     # cuisine に ramen が含まれていれば OK
-    if 'ramen' in cuisine_check:
+    if 'ramen' in cuisine.lower():
         return True
 
     # 店名にラーメン関連キーワードが含まれていれば OK
-    for kw in strict_keywords:
-        if kw in name or kw.lower() in name_check:
-            return True
-
-    return False
+    return _STRICT_RAMEN_MATCHER.contains_any(name)
 
 
 def is_excluded_shop(name: str) -> bool:
     """除外するべき店舗か判定"""
-    excluded = [
-        'マクドナルド', 'McDonald', 'ドミノ', 'ピザ', 'Pizza',
-        'ケンタッキー', 'KFC', 'すき家', '吉野家', '松屋',
-        'ガスト', 'サイゼリヤ', 'デニーズ', 'ジョナサン',
-        'スターバックス', 'ドトール', 'タリーズ',
-        'コンビニ', 'セブン', 'ファミマ', 'ローソン'
-    ]
-    
-    for ex in excluded:
-        if ex in name:
-            return True
-    
-    return False
+    return _EXCLUDED_SHOP_MATCHER.contains_any(name)
+
+
+class OverpassError(Exception):
+    """Overpass が 200 で返したが結果が不完全（タイムアウト・メモリ超過などの remark 付き）"""
+
+
+def overpass_elements(data: Dict) -> List[Dict]:
+    """
+    Overpass の JSON 応答から要素を取り出す
+    remark（実行時エラー）付き・elements なしの応答は空や一部だけのことがあるので例外にする
+    """
+    if data.get('remark'):
+        raise OverpassError(f"Overpass remark: {data['remark'][:200]}")
+    if 'elements' not in data:
+        raise OverpassError("Overpass response has no elements")
+    return data['elements']
+
+
+def fetch_ramen_elements(south: float, west: float, north: float, east: float) -> List[Dict]:
+    """
+    Overpass APIで範囲内のラーメン店（cuisine=ramen）の要素を取得
+    失敗時（remark 付きの 200 応答を含む）は例外を送出（キャッシュ側で古いデータを使い、何も書き込まない）
+    """
+    # ラーメン専用の厳格なクエリ
+    bbox = f"{south:.6f},{west:.6f},{north:.6f},{east:.6f}"
+    query = f"""
+    [out:json][timeout:15];
+    (
+      node["cuisine"~"ramen"]({bbox});
+      way["cuisine"~"ramen"]({bbox});
+    );
+    out body center;
+    """
+
+    print(f"[Overpass] Fetching RAMEN ONLY in bbox {bbox}")
+    response = requests.post(OVERPASS_URL, data={'data': query}, timeout=20)
+    response.raise_for_status()
+    return overpass_elements(response.json())
 
 
 def search_nearby_ramen(lat: float, lon: float, radius: int = 300) -> List[Dict]:
     """
     Overpass APIで周辺のラーメン店のみを厳格に検索
     cuisine=ramen または ramen_restaurant のみ
+    オフラインインデックス（shop_index）の範囲内ならネットワークなしで検索し、
+    範囲外は geohashタイルキャッシュ（shop_cache）にないタイルだけ Overpass から取得する
     """
     candidates = []
 
     try:
-        # ラーメン専用の厳格なクエリ
-        query = f"""
-        [out:json][timeout:15];
-        (
-          node["cuisine"~"ramen"](around:{radius},{lat},{lon});
-          way["cuisine"~"ramen"](around:{radius},{lat},{lon});
-        );
-        out body center;
-        """
-
-        url = "https://overpass-api.de/api/interpreter"
         print(f"[Overpass] Searching RAMEN ONLY within {radius}m")
 
-        response = requests.post(url, data={'data': query}, timeout=20)
-        data = response.json()
+        index = get_shop_index()
+        source = 'overpass'
+        if index is not None and index.covers(lat, lon, radius):
+            elements = index.elements_within(lat, lon, radius)
+            source = 'index'
+            print("[ShopIndex] Using offline index")
+        elif SHOP_CACHE_ENABLED:
+            elements = shop_cache.get_elements(lat, lon, radius, fetch_ramen_elements)
+        else:
+            elements = fetch_ramen_elements(*circle_bbox(lat, lon, radius))
 
-        elements = data.get('elements', [])
         print(f"[Overpass] Found {len(elements)} ramen elements")
 
+        # 店名・座標のある要素を表にまとめ、距離はまとめて計算
+        rows = []
         for elem in elements:
             tags = elem.get('tags', {})
             name = tags.get('name', tags.get('name:ja', ''))
-            cuisine = tags.get('cuisine', '')
-
             if not name:
                 continue
 
+            # 座標を取得（way の場合は center を使用）
+            elem_lat, elem_lon = element_coords(elem)
+            if elem_lat is None or elem_lon is None:
+                continue
+            rows.append((elem, name, tags.get('cuisine', ''), elem_lat, elem_lon))
+
+        if not rows:
+            return candidates
+
+        distances = haversine_array(lat, lon,
+                                    np.array([r[3] for r in rows], dtype=np.float64),
+                                    np.array([r[4] for r in rows], dtype=np.float64))
+
+        for (elem, name, cuisine, elem_lat, elem_lon), distance in zip(rows, distances.tolist()):
+            # タイルは円より広いので半径外は除外
+            if distance > radius:
+                continue
+
             # 除外リストに該当するものはスキップ
             if is_excluded_shop(name):
                 print(f"  Excluded: {name}")
                 continue
 
-            # 座標を取得（way の場合は center を使用）
-            if elem.get('type') == 'way':
-                center = elem.get('center', {})
-                elem_lat = center.get('lat', lat)
-                elem_lon = center.get('lon', lon)
-            else:
-                elem_lat = elem.get('lat', lat)
-                elem_lon = elem.get('lon', lon)
-
-            distance = haversine_distance(lat, lon, elem_lat, elem_lon)
-
             # 厳格なラーメン判定（cuisine に ramen が含まれるもののみ）
             cuisine_lower = cuisine.lower()
             if 'ramen' not in cuisine_lower:
@@ -131,7 +189,8 @@ def search_nearby_ramen(lat: float, lon: float, radius: int = 300) -> List[Dict]
                 'lon': elem_lon,
                 'is_ramen': True,  # この関数はラーメン店のみ返す
                 'cuisine': cuisine,
-                'source': 'overpass'
+                'source': source,
+                'osm_id': f"{elem.get('type')}/{elem.get('id')}"
             })
 
             print(f"  🍜 {name} ({distance:.0f}m) cuisine={cuisine}")
@@ -142,7 +201,84 @@ def search_nearby_ramen(lat: float, lon: float, radius: int = 300) -> List[Dict]
     return candidates
 
 
-def find_shop_by_gps(lat: float, lon: float, ocr_text: str = None) -> Dict:
+def dedupe_candidates(candidates: List[Dict]) -> List[Dict]:
+    """同じ OSM 要素（osm_id）の重複を除く（最初の出現を残す）"""
+    seen = set()
+    unique = []
+    for c in candidates:
+        key = c.get('osm_id') or (c['name'], c.get('lat'), c.get('lon'))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(c)
+    return unique
+
+
+def rank_candidates(candidates: List[Dict], near_m: float = 50):
+    """
+    候補を優先順位で並べる（1回の lexsort）
+    1. near_m 以内のラーメン店 2. near_m 以内のその他
+    3. near_m 以上のラーメン店 4. near_m 以上のその他（それぞれ距離順）
+
+    Returns:
+        (並べ替えた候補, [各グループの件数 ×4])
+    """
+    if not candidates:
+        return [], [0, 0, 0, 0]
+    distance = np.array([c.get('distance', 9999) for c in candidates], dtype=np.float64)
+    is_ramen = np.array([bool(c.get('is_ramen')) for c in candidates])
+    within = distance <= near_m
+    # lexsort は最後のキーが最優先（安定ソート）
+    order = np.lexsort((distance, ~is_ramen, ~within))
+    group = (~within).astype(np.int64) * 2 + (~is_ramen).astype(np.int64)
+    counts = np.bincount(group, minlength=4).tolist()
+    return [candidates[i] for i in order], counts
+
+
+def apply_radius_tiers(candidates: List[Dict], tiers=SEARCH_TIERS,
+                       min_count: int = MIN_CANDIDATES) -> List[Dict]:
+    """
+    最大半径の検索結果に段階検索をローカルで適用
+    1段目の候補を全て採用し、min_count 件未満なら次の段階の店を店名の重複なしで追加
+    """
+    by_distance = sorted(dedupe_candidates(candidates), key=lambda x: x.get('distance', 9999))
+    selected = [c for c in by_distance if c.get('distance', 9999) <= tiers[0]]
+    names = {c['name'] for c in selected}
+
+    for radius in tiers[1:]:
+        if len(selected) >= min_count:
+            break
+        print(f"[Tier] {len(selected)} candidates → {radius}mに拡大")
+        for c in by_distance:
+            if c.get('distance', 9999) <= radius and c['name'] not in names:
+                selected.append(c)
+                names.add(c['name'])
+    return selected
+
+
+def collect_candidates(lat: float, lon: float, tiers=SEARCH_TIERS,
+                       min_count: int = MIN_CANDIDATES) -> List[Dict]:
+    """段階検索で候補を集める（single モードは Overpass / タイルキャッシュへの問い合わせ1回）"""
+    if GPS_SEARCH_MODE != 'escalate':
+        print(f"\n--- Restaurant Search ({tiers[-1]}m, tiers={list(tiers)}) ---")
+        return apply_radius_tiers(search_nearby_ramen(lat, lon, tiers[-1]), tiers, min_count)
+
+    print(f"\n--- Restaurant Search ({tiers[0]}m) ---")
+    all_candidates = search_nearby_ramen(lat, lon, tiers[0])
+    for radius in tiers[1:]:
+        if len(all_candidates) >= min_count:
+            break
+        print(f"\n--- Restaurant Search ({radius}m) ---")
+        names = {x['name'] for x in all_candidates}
+        for c in search_nearby_ramen(lat, lon, radius):
+            if c['name'] not in names:
+                all_candidates.append(c)
+                names.add(c['name'])
+    return dedupe_candidates(all_candidates)
+
+
+def find_shop_by_gps(lat: float, lon: float, ocr_text: str = None,
+                     candidates: Optional[List[Dict]] = None) -> Dict:
     """
     GPS座標からラーメン店名を特定（メイン関数）
     
@@ -150,6 +286,9 @@ def find_shop_by_gps(lat: float, lon: float, ocr_text: str = None) -> Dict:
     1. まずラーメン店を優先検索
     2. 見つからなければ全飲食店を候補表示
     3. ユーザーが候補から選択可能
+
+    Args:
+        candidates: collect_candidates で集めた候補（OCR と並列に検索した場合。None ならここで検索）
     """
     print("=" * 50)
     print(f"[GPS Search] {lat:.6f}, {lon:.6f}")
@@ -168,54 +307,21 @@ def find_shop_by_gps(lat: float, lon: float, ocr_text: str = None) -> Dict:
         'debug_info': f"GPS: {lat:.6f}, {lon:.6f}"
     }
     
-    all_candidates = []
-
-    # Step 1: 500m以内を検索
-    print("\n--- Restaurant Search (500m) ---")
-    candidates_500 = search_nearby_ramen(lat, lon, 500)
-    all_candidates.extend(candidates_500)
-
-    # Step 2: 見つからなければ2kmに拡大
-    if len(all_candidates) < 3:
-        print("\n--- Restaurant Search (2km) ---")
-        candidates_2k = search_nearby_ramen(lat, lon, 2000)
-        for c in candidates_2k:
-            if c['name'] not in [x['name'] for x in all_candidates]:
-                all_candidates.append(c)
+    all_candidates = collect_candidates(lat, lon) if candidates is None else list(candidates)
 
-    # Step 3: まだ少なければ5kmに拡大
-    if len(all_candidates) < 3:
-        print("\n--- Restaurant Search (5km) ---")
-        candidates_5k = search_nearby_ramen(lat, lon, 5000)
-        for c in candidates_5k:
-            if c['name'] not in [x['name'] for x in all_candidates]:
-                all_candidates.append(c)
-    
     print(f"\n[Total] {len(all_candidates)} candidates")
     
-    # 50m以内の店舗を最優先
-    within_50m = [c for c in all_candidates if c.get('distance', 9999) <= 50]
-    beyond_50m = [c for c in all_candidates if c.get('distance', 9999) > 50]
-    
-    # それぞれラーメン店とその他に分類
-    within_50m_ramen = [c for c in within_50m if c.get('is_ramen')]
-    within_50m_other = [c for c in within_50m if not c.get('is_ramen')]
-    beyond_50m_ramen = [c for c in beyond_50m if c.get('is_ramen')]
-    beyond_50m_other = [c for c in beyond_50m if not c.get('is_ramen')]
-    
-    # 距離順にソート
-    within_50m_ramen.sort(key=lambda x: x.get('distance', 9999))
-    within_50m_other.sort(key=lambda x: x.get('distance', 9999))
-    beyond_50m_ramen.sort(key=lambda x: x.get('distance', 9999))
-    beyond_50m_other.sort(key=lambda x: x.get('distance', 9999))
-    
     # 優先順位:
     # 1. 50m以内のラーメン店
     # 2. 50m以内のその他飲食店
     # 3. 50m以上のラーメン店
     # 4. 50m以上のその他飲食店
-    all_sorted = within_50m_ramen + within_50m_other + beyond_50m_ramen + beyond_50m_other
-    
+    all_sorted, counts = rank_candidates(all_candidates, 50)
+    bounds = np.cumsum([0] + counts).tolist()
+    within_50m_ramen, within_50m_other, beyond_50m_ramen, beyond_50m_other = (
+        all_sorted[bounds[i]:bounds[i + 1]] for i in range(4))
+    within_50m = within_50m_ramen + within_50m_other
+
     ramen_count = len(within_50m_ramen) + len(beyond_50m_ramen)
     print(f"[Priority] 50m以内: {len(within_50m)}件, ラーメン店: {ramen_count}件")
     
@@ -290,15 +396,11 @@ def find_shop_without_gps(ocr_text: str = None) -> Dict:
     if not ocr_text:
         return result
     
-    ramen_keywords = ['ラーメン', 'らーめん', 'らぁめん', '麺屋', '麺処', '中華そば']
-    
     for line in ocr_text.split('\n'):
         line = line.strip()
-        if 2 <= len(line) <= 25:
-            for kw in ramen_keywords:
-                if kw in line:
-                    result['shop_name'] = line
-                    result['debug_info'] += f" | OCR: {line}"
-                    return result
+        if 2 <= len(line) <= 25 and _OCR_RAMEN_MATCHER.contains_any(line):
+            result['shop_name'] = line
+            result['debug_info'] += f" | OCR: {line}"
+            return result
     
     return result
@@ -0,0 +1,203 @@
+"""
+画像コンテキストモジュール - 1リクエスト1デコード
+アップロード画像を一度だけ読み込み、EXIF・GPS IFD・回転済みRGB画像・
+グレースケール/CLAHE済み配列を各ステージ（OCR・GPS・どんぶり検知・切り抜き）で共有する
+"""
+from PIL import Image
+from PIL.ExifTags import IFD
+from io import BytesIO
+import hashlib
+import os
+import threading
+
+try:
+    import cv2
+    import numpy as np
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+
+# EXIF Orientation タグ番号
+ORIENTATION_TAG = 0x0112
+
+
+def rotate_by_orientation(img, orientation):
+    """EXIF Orientation値に従って画像を物理回転"""
+    if orientation == 2:
+        img = img.transpose(Image.FLIP_LEFT_RIGHT)
+    elif orientation == 3:
+        img = img.rotate(180, expand=True)
+    elif orientation == 4:
+        img = img.transpose(Image.FLIP_TOP_BOTTOM)
+    elif orientation == 5:
+        img = img.transpose(Image.FLIP_LEFT_RIGHT).rotate(270, expand=True)
+    elif orientation == 6:
+        img = img.rotate(270, expand=True)
+    elif orientation == 7:
+        img = img.transpose(Image.FLIP_LEFT_RIGHT).rotate(90, expand=True)
+    elif orientation == 8:
+        img = img.rotate(90, expand=True)
+    return img
+
+
+class ImageContext:
+    """
+    1枚のアップロード画像に対するリクエスト単位のキャッシュ
+
+    全ての属性は初回アクセス時に一度だけ計算される:
+      data      : 元ファイルのバイト列
+      sha256    : バイト列のSHA-256（キャッシュキー用）
+      raw_image : Image.open した未デコードのPIL画像（EXIF読み取り用）
+      exif      : 解析済みEXIF
+      gps_ifd   : GPS IFD（dict、なければ空dict）
+      image     : EXIF回転適用済みRGB画像
+      rgb       : image の numpy 配列
+      gray      : グレースケール配列
+      blurred   : CLAHE + GaussianBlur 済み配列（どんぶり検知用）
+      pyramid() : 縮小版の blurred（粗→細検知用、サイズごとにキャッシュ）
+
+    OCR・GPS・どんぶり検知を並列実行しても各属性が1回だけ計算されるよう、
+    メタデータ（EXIF）と画素（デコード以降）を別々のロックで保護する。
+    画素側は raw_image とは別の PIL オブジェクトからデコードするので、
+    GPS 抽出中の EXIF 読み取りとデコードが同じファイルポインタを取り合わない。
+    """
+
+    def __init__(self, data, path=None, sha256=None):
+        self.data = data
+        self.path = path
+        self._sha256 = sha256
+        self._raw_image = None
+        self._exif = None
+        self._gps_ifd = None
+        self._image = None
+        self._rgb = None
+        self._gray = None
+        self._blurred = None
+        self._pyramids = {}
+        self._meta_lock = threading.RLock()
+        self._pixel_lock = threading.RLock()
+
+    @classmethod
+    def from_path(cls, image_path):
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        return cls(data, path=image_path)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data)
+
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    @property
+    def raw_image(self):
+        with self._meta_lock:
+            if self._raw_image is None:
+                self._raw_image = Image.open(BytesIO(self.data))
+            return self._raw_image
+
+    @property
+    def exif(self):
+        with self._meta_lock:
+            if self._exif is None:
+                self._exif = self.raw_image.getexif()
+            return self._exif
+
+    @property
+    def gps_ifd(self):
+        with self._meta_lock:
+            if self._gps_ifd is None:
+                try:
+                    self._gps_ifd = dict(self.exif.get_ifd(IFD.GPSInfo)) if self.exif else {}
+                except Exception as e:
+                    print(f"⚠️ GPS IFD読み込みエラー: {e}")
+                    self._gps_ifd = {}
+            return self._gps_ifd
+
+    @property
+    def orientation(self):
+        try:
+            return self.exif.get(ORIENTATION_TAG) if self.exif else None
+        except Exception:
+            return None
+
+    @property
+    def image(self):
+        with self._pixel_lock:
+            if self._image is None:
+                orientation = self.orientation
+                img = Image.open(BytesIO(self.data))
+                if orientation is not None:
+                    print(f"📐 EXIF Orientation: {orientation}")
+                    img = rotate_by_orientation(img, orientation)
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                else:
+                    # 回転なしの場合も遅延デコードをここで確定させる
+                    img.load()
+                self._image = img
+            return self._image
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def rgb(self):
+        with self._pixel_lock:
+            if self._rgb is None:
+                self._rgb = np.asarray(self.image)
+            return self._rgb
+
+    @property
+    def gray(self):
+        with self._pixel_lock:
+            if self._gray is None:
+                self._gray = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+            return self._gray
+
+    @property
+    def blurred(self):
+        with self._pixel_lock:
+            if self._blurred is None:
+                # CLAHE（コントラスト強調）→ ノイズ除去
+                clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+                self._blurred = cv2.GaussianBlur(clahe.apply(self.gray), (9, 9), 2)
+            return self._blurred
+
+    def pyramid(self, max_side):
+        """
+        長辺を max_side 以下に縮小した CLAHE + GaussianBlur 済み配列
+
+        Returns:
+            (配列, 縮小率) 縮小率 = 縮小後 / 元画像
+        """
+        with self._pixel_lock:
+            if max_side not in self._pyramids:
+                h, w = self.gray.shape
+                scale = min(1.0, float(max_side) / max(w, h))
+                if scale < 1.0:
+                    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+                    small = cv2.resize(self.gray, size, interpolation=cv2.INTER_AREA)
+                else:
+                    small = self.gray
+                clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+                small = cv2.GaussianBlur(clahe.apply(small), (5, 5), 1)
+                self._pyramids[max_side] = (small, scale)
+            return self._pyramids[max_side]
+
+
+def ensure_context(source):
+    """パス / bytes / ImageContext のいずれかを受け取り ImageContext を返す"""
+    if isinstance(source, ImageContext):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        return ImageContext.from_bytes(bytes(source))
+    if isinstance(source, (str, os.PathLike)):
+        return ImageContext.from_path(os.fspath(source))
+    raise TypeError(f"Unsupported image source: {type(source)}")
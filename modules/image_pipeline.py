@@ -0,0 +1,132 @@
+"""
+画像パイプラインモジュール - 切り抜き → 縮小 → ラベル付け をメモリ上で行い、最後に1回だけエンコード
+（crop_bowl で JPEG 保存 → add_label で開き直して再保存、の二重エンコードをしない）
+
+    result = image_pipeline.crop_and_label(ctx, output_path, "麺屋 一燈")
+
+出力の大きさ・画質は環境変数で設定:
+    OUTPUT_MAX_SIDE     長辺の最大px（0 = 縮小しない）
+    OUTPUT_JPEG_QUALITY JPEG 画質（既定 95 = 従来と同じ）
+    OUTPUT_PROGRESSIVE  1 ならプログレッシブ JPEG
+    OUTPUT_OPTIMIZE     1 ならハフマンテーブル最適化（少し小さく・少し遅く）
+"""
+import os
+import threading
+from typing import Dict
+
+from PIL import Image
+
+from modules import cropper, derived_cache, labeler
+from modules.image_context import ensure_context
+
+OUTPUT_MAX_SIDE = int(os.environ.get('OUTPUT_MAX_SIDE', '0'))
+OUTPUT_JPEG_QUALITY = int(os.environ.get('OUTPUT_JPEG_QUALITY', '95'))
+OUTPUT_PROGRESSIVE = os.environ.get('OUTPUT_PROGRESSIVE', '0') == '1'
+OUTPUT_OPTIMIZE = os.environ.get('OUTPUT_OPTIMIZE', '0') == '1'
+
+
+def encode_options(max_side=None, quality=None, progressive=None, optimize=None) -> Dict:
+    """指定のない項目を環境変数の既定値で埋めたエンコード設定"""
+    return {
+        'max_side': OUTPUT_MAX_SIDE if max_side is None else max_side,
+        'quality': OUTPUT_JPEG_QUALITY if quality is None else quality,
+        'progressive': OUTPUT_PROGRESSIVE if progressive is None else progressive,
+        'optimize': OUTPUT_OPTIMIZE if optimize is None else optimize,
+    }
+
+
+def resize_to_max_side(img, max_side):
+    """長辺が max_side を超えていれば縮小（0 / None なら何もしない）"""
+    if not max_side:
+        return img
+    w, h = img.size
+    scale = float(max_side) / max(w, h)
+    if scale >= 1.0:
+        return img
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return img.resize(size, Image.LANCZOS)
+
+
+def encode_jpeg(img, output_path, options=None) -> int:
+    """
+    JPEG で1回だけ保存（一時ファイルに書いてから置き換えるので、途中の壊れたファイルは見えない）
+
+    Returns:
+        書き込んだバイト数
+    """
+    options = options or encode_options()
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        img.save(tmp_path, format='JPEG', quality=options['quality'],
+                 progressive=options['progressive'], optimize=options['optimize'])
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return os.path.getsize(output_path)
+
+
+def crop_and_label(source, output_path, shop_name, bowl=None, options=None, sha256=None,
+                   use_cache=True) -> Dict:
+    """
+    どんぶり切り抜き → 縮小 → ラベル → 1回のエンコード
+
+    切り抜きに失敗した場合は EXIF 回転済みの元画像全体にラベルを入れる
+
+    Args:
+        source: 画像パス / bytes / ImageContext
+        bowl: 検知済みの { cx, cy, r, method }（None なら detect_bowl、キャッシュがあれば再検知しない）
+        options: encode_options() の戻り値（None なら環境変数の既定値）
+        sha256: 元画像のハッシュ（分かっていれば切り抜きキャッシュをファイルを読まずに引ける）
+        use_cache: ラベルなし切り抜きを derived_cache に置く（同じ写真の店名修正はラベル合成だけになる）
+
+    Returns:
+        {'crop_success', 'size', 'bytes'}
+    """
+    if use_cache:
+        cropped, ctx = derived_cache.cropped_image(source, bowl=bowl, sha256=sha256)
+    else:
+        ctx = ensure_context(source)
+        cropped = cropper.crop_bowl_image(ctx, bowl=bowl)
+    if cropped is None:
+        print("⚠️ Crop failed, labeling the original image")
+        img = (ctx or ensure_context(source)).image
+    else:
+        img = cropped
+    # キャッシュしない切り抜き画像は新しい画像なので直接描いてよい（元画像・キャッシュは共有）
+    return label_and_encode(img, output_path, shop_name, options,
+                            crop_success=cropped is not None, owned=cropped is not None and not use_cache)
+
+
+def label_and_encode(img, output_path, shop_name, options=None, crop_success=None, owned=False) -> Dict:
+    """
+    切り抜き済みの PIL 画像に 縮小 → ラベル → 1回のエンコード
+
+    Args:
+        owned: img に直接描いてよいか（False なら ImageContext の共有画像などを汚さないようコピー）
+    """
+    options = options or encode_options()
+    resized = resize_to_max_side(img, options['max_side'])
+    if resized is img and not owned and img.mode == 'RGB':
+        resized = img.copy()
+    img = labeler.render_label(resized, shop_name)
+    size = encode_jpeg(img, output_path, options)
+    print(f"✅ 出力: {output_path} {img.size[0]}x{img.size[1]} {size // 1024}KB "
+          f"(q={options['quality']}{' progressive' if options['progressive'] else ''})")
+    return {'crop_success': crop_success, 'size': list(img.size), 'bytes': size}
+
+
+def label_file(input_path, output_path, shop_name, options=None) -> Dict:
+    """
+    切り抜き済みの JPEG（/analyze の cropped_*）にラベルを入れる
+    コピーせずに1回デコード → ラベル → 1回エンコード
+    """
+    with Image.open(input_path) as img:
+        img.load()
+        return label_and_encode(img, output_path, shop_name, options, crop_success=True, owned=True)
@@ -1,75 +1,249 @@
-from PIL import Image, ImageDraw, ImageFont
+"""
+店名ラベルモジュール
+画像の下部に 白文字 + 極太黒縁取り の店名を入れる（goal.jpg完全再現版）
+
+LabelRenderer がフォント（パス・サイズごと）・文字サイズ・縁取り済みの文字画像（RGBAスプライト）を
+キャッシュするので、同じサイズの写真に同じ店名を入れ直すときは貼り付けるだけになる
+スプライトは大きい写真だと1枚で十数MBになるので、件数ではなく画素のバイト数（LABEL_SPRITE_CACHE_MB）で上限を決める
+"""
+from collections import OrderedDict
+import math
 import os
+import threading
 
+from PIL import Image, ImageDraw, ImageFont
 
-def add_label(image_path, text):
+# フォント探索（macOS + Linux/Vercel）: 最初に読み込めたものを使う
+FONT_PATHS = [
+    "/System/Library/Fonts/ヒラギノ角ゴシック W8.ttc",
+    "/System/Library/Fonts/Hiragino Sans GB.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/truetype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+]
+# FONT_PATHS がどれも無いときに名前で探すフォント
+FALLBACK_FONT = "DejaVuSans-Bold.ttf"
+
+# フォントサイズ: 画像高さの15%（最小48px）
+FONT_SIZE_RATIO = 0.15
+MIN_FONT_SIZE = 48
+# 下からのマージン: 画像高さの2%
+BOTTOM_MARGIN_RATIO = 0.02
+
+# スプライトキャッシュの上限（MB、RGBA の画素数 × 4 で数える）
+LABEL_SPRITE_CACHE_MB = float(os.environ.get('LABEL_SPRITE_CACHE_MB', '64'))
+
+
+class LabelRenderer:
     """
-    画像の下部に店名ラベルを追加する（goal.jpg完全再現版）
-    - フォントサイズ: 画像高さの15%
-    - 太い白文字 + 極太黒縁取り（5px以上）
-    - 半透明バーなし（テキスト直接配置）
+    ラベル描画（フォント・文字サイズ・スプライトのキャッシュ付き）
+
+    スプライトは「縁取り込みの文字の形（A）」と「白文字部分（RGB）」の RGBA 画像で、
+    貼り付け結果は ImageDraw.text(stroke_width=...) で直接描いた場合と画素単位で同じになる。
+    文字の形は描画位置の小数部分で変わるので、キーに含める
     """
-    try:
-        img = Image.open(image_path)
-        width, height = img.size
 
-        # EXIF データを先に取得
-        exif_data = img.info.get('exif')
+    def __init__(self, font_paths=None, max_fonts=8, max_bboxes=256,
+                 max_sprite_bytes=int(LABEL_SPRITE_CACHE_MB * 1024 * 1024)):
+        self.font_paths = FONT_PATHS if font_paths is None else font_paths
+        self.max_fonts = max_fonts
+        self.max_bboxes = max_bboxes
+        self.max_sprite_bytes = max_sprite_bytes
+        self._font_source = None
+        self._font_source_resolved = False
+        self._fonts = OrderedDict()
+        self._bboxes = OrderedDict()
+        self._sprites = OrderedDict()
+        self._sprite_bytes = 0
+        self._lock = threading.RLock()
+        self.counters = {'font_loads': 0, 'sprite_hits': 0, 'sprite_renders': 0, 'sprite_evictions': 0}
 
-        # フォントサイズ: 画像高さの15%（goal.jpg完全再現）
-        font_size = int(height * 0.15)
-        if font_size < 48:
-            font_size = 48
-
-        # フォント探索（macOS + Linux/Vercel）
-        font_paths = [
-            "/System/Library/Fonts/ヒラギノ角ゴシック W8.ttc",
-            "/System/Library/Fonts/Hiragino Sans GB.ttc",
-            "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
-            "/usr/share/fonts/truetype/noto/NotoSansCJK-Bold.ttc",
-            "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-        ]
-
-        font = None
-        for fp in font_paths:
+    def _resolve_font_source(self):
+        """読み込めるフォントファイルを1回だけ探す（None なら PIL の既定フォント）"""
+        if self._font_source_resolved:
+            return self._font_source
+        for fp in self.font_paths:
             if os.path.exists(fp):
                 try:
-                    font = ImageFont.truetype(fp, font_size)
+                    ImageFont.truetype(fp, MIN_FONT_SIZE)
+                    self._font_source = fp
                     break
                 except OSError:
                     continue
-        if font is None:
+        else:
             try:
-                font = ImageFont.truetype("DejaVuSans-Bold.ttf", font_size)
+                ImageFont.truetype(FALLBACK_FONT, MIN_FONT_SIZE)
+                self._font_source = FALLBACK_FONT
             except OSError:
-                font = ImageFont.load_default()
                 print("Warning: No suitable font found, using default.")
+        self._font_source_resolved = True
+        return self._font_source
 
-        # テキストサイズ計算
-        temp_draw = ImageDraw.Draw(img)
-        bbox = temp_draw.textbbox((0, 0), text, font=font)
-        text_w = bbox[2] - bbox[0]
-        text_h = bbox[3] - bbox[1]
+    def font(self, size):
+        with self._lock:
+            source = self._resolve_font_source()
+            key = (source, size)
+            font = _lru_get(self._fonts, key)
+            if font is None:
+                font = ImageFont.truetype(source, size) if source else ImageFont.load_default()
+                self.counters['font_loads'] += 1
+                _lru_put(self._fonts, key, font, self.max_fonts)
+            return font
+
+    def text_bbox(self, text, size):
+        """縁取りなしの文字の外接矩形（配置計算用）"""
+        with self._lock:
+            key = (text, size)
+            bbox = _lru_get(self._bboxes, key)
+            if bbox is None:
+                bbox = _measure_draw().textbbox((0, 0), text, font=self.font(size))
+                _lru_put(self._bboxes, key, bbox, self.max_bboxes)
+            return bbox
+
+    def sprite(self, text, size, stroke_width, start):
+        """
+        縁取り済みの文字の RGBA スプライト
+
+        Args:
+            start: 描画位置 (x, y) の小数部分
+
+        Returns:
+            (sprite, (ox, oy)) 描画位置の整数部分から (ox, oy) 引いた位置に貼り付ける
+        """
+        with self._lock:
+            key = (text, size, stroke_width, start)
+            cached = _lru_get(self._sprites, key)
+            if cached is not None:
+                self.counters['sprite_hits'] += 1
+                return cached
+
+            font = self.font(size)
+            left, top, right, bottom = _measure_draw().textbbox(
+                start, text, font=font, stroke_width=stroke_width)
+            ox, oy = 1 - math.floor(left), 1 - math.floor(top)
+            canvas = (math.ceil(right) + ox + 1, math.ceil(bottom) + oy + 1)
+            xy = (start[0] + ox, start[1] + oy)
+
+            # A: 縁取り込みの文字の形 / RGB: 白文字の部分（縁取りは黒）
+            alpha = Image.new('L', canvas, 0)
+            ImageDraw.Draw(alpha).text(xy, text, font=font, fill=255,
+                                       stroke_width=stroke_width, stroke_fill=255)
+            white = Image.new('L', canvas, 0)
+            ImageDraw.Draw(white).text(xy, text, font=font, fill=255)
+            result = (Image.merge('RGBA', (white, white, white, alpha)), (ox, oy))
+
+            self.counters['sprite_renders'] += 1
+            self._put_sprite(key, result)
+            return result
+
+    def _put_sprite(self, key, result):
+        """バイト数の上限まで古い順に消してから入れる（上限より大きいものは入れない）"""
+        size = _sprite_bytes(result)
+        if size > self.max_sprite_bytes:
+            return
+        old = self._sprites.pop(key, None)
+        if old is not None:
+            self._sprite_bytes -= _sprite_bytes(old)
+        self._sprites[key] = result
+        self._sprite_bytes += size
+        while self._sprite_bytes > self.max_sprite_bytes:
+            _, evicted = self._sprites.popitem(last=False)
+            self._sprite_bytes -= _sprite_bytes(evicted)
+            self.counters['sprite_evictions'] += 1
+
+    def render(self, img, text):
+        """
+        img の下部中央に店名を入れた RGB 画像を返す（img が RGB ならそのまま書き込む）
+        """
+        width, height = img.size
+        font_size = max(MIN_FONT_SIZE, int(height * FONT_SIZE_RATIO))
 
         # テキスト位置: 画像下部中央（goal.jpgと同じ配置）
+        bbox = self.text_bbox(text, font_size)
+        text_w = bbox[2] - bbox[0]
+        text_h = bbox[3] - bbox[1]
         x = (width - text_w) / 2
-        y = height - text_h - int(height * 0.02)  # 下から2%のマージン
+        y = height - text_h - int(height * BOTTOM_MARGIN_RATIO)
 
         # RGBモードで描画（半透明バーなし）
         if img.mode != 'RGB':
             img = img.convert('RGB')
 
-        draw = ImageDraw.Draw(img)
-
         # 極太の黒縁取り + 白文字（5px以上の太縁）
         stroke_w = max(5, int(font_size / 3))
-        draw.text(
-            (x, y), text, font=font,
-            fill=(255, 255, 255),
-            stroke_width=stroke_w,
-            stroke_fill=(0, 0, 0)
-        )
+        start = (math.modf(x)[0], math.modf(y)[0])
+        sprite, (ox, oy) = self.sprite(text, font_size, stroke_w, start)
+        img.paste(sprite, (int(x) - ox, int(y) - oy), sprite)
+        print(f"✅ ラベル描画: {text} (font={font_size}px, stroke={stroke_w}px)")
+        return img
+
+    def params(self):
+        """描画結果を左右する設定（派生画像のキャッシュキー用）"""
+        with self._lock:
+            return {
+                'font': self._resolve_font_source(),
+                'font_ratio': FONT_SIZE_RATIO,
+                'min_font': MIN_FONT_SIZE,
+                'margin': BOTTOM_MARGIN_RATIO,
+            }
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['font'] = self._font_source
+            stats['fonts'] = len(self._fonts)
+            stats['sprites'] = len(self._sprites)
+            stats['sprite_bytes'] = self._sprite_bytes
+            stats['max_sprite_bytes'] = self.max_sprite_bytes
+            return stats
+
+
+def _lru_get(cache, key):
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _lru_put(cache, key, value, max_entries):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+
+def _sprite_bytes(result):
+    w, h = result[0].size
+    return w * h * 4
+
+
+def _measure_draw():
+    return ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+label_renderer = LabelRenderer()
+
+
+def render_label(img, text):
+    """PIL画像に店名ラベルを入れて返す（ファイルを介さない版）"""
+    return label_renderer.render(img, text)
+
+
+def add_label(image_path, text):
+    """
+    画像の下部に店名ラベルを追加する（goal.jpg完全再現版）
+    - フォントサイズ: 画像高さの15%
+    - 太い白文字 + 極太黒縁取り（5px以上）
+    - 半透明バーなし（テキスト直接配置）
+    """
+    try:
+        img = Image.open(image_path)
+
+        # EXIF データを先に取得
+        exif_data = img.info.get('exif')
+
+        img = render_label(img, text)
 
         # JPEG 保存
         save_kwargs = {'format': 'JPEG', 'quality': 95}
@@ -77,7 +251,7 @@ def add_label(image_path, text):
             save_kwargs['exif'] = exif_data
         img.save(image_path, **save_kwargs)
 
-        print(f"✅ ラベル追加完了: {text} (font={font_size}px, stroke={stroke_w}px)")
+        print(f"✅ ラベル追加完了: {image_path}")
         return True
 
     except Exception as e:
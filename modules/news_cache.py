@@ -0,0 +1,161 @@
+"""
+新店ニュースキャッシュ
+/api/news のたびに4県をスクレイピングしないよう、結果を TTL 付きで保持する
+
+  - TTL 以内          : キャッシュをそのまま返す
+  - TTL 超〜MAX_STALE : 古い結果を返しつつ、裏のスレッドで更新（stale-while-revalidate）
+  - MAX_STALE 超/初回 : その場で更新してから返す
+更新時は news_scraper が URL ごとに ETag / Last-Modified で条件付きリクエストを送る。
+Vercel ではレスポンス後にスレッドが止まることがあるが、その場合も次のリクエストで続きが走る
+"""
+import json
+import os
+import threading
+import time
+
+from modules import news_scraper
+from modules.news_store import NEWS_STORE_ENABLED, news_store
+
+NEWS_TTL_SEC = int(os.environ.get('NEWS_TTL_SEC', '600'))
+NEWS_MAX_STALE_SEC = int(os.environ.get('NEWS_MAX_STALE_SEC', str(24 * 3600)))
+# 更新に失敗したとき、古い結果を使い続けて再試行するまでの秒数
+NEWS_RETRY_SEC = 60
+NEWS_CACHE_PATH = os.environ.get('NEWS_CACHE_PATH', os.path.join('/tmp', 'ramen_cache', 'news.json'))
+
+
+class NewsCache:
+    """get_new_reviews() の結果を保持するキャッシュ（プロセス内＋/tmp の JSON）"""
+
+    def __init__(self, loader=None, ttl_sec=NEWS_TTL_SEC, max_stale_sec=NEWS_MAX_STALE_SEC,
+                 path=NEWS_CACHE_PATH):
+        self.loader = loader or news_scraper.get_new_reviews
+        self.ttl_sec = ttl_sec
+        self.max_stale_sec = max_stale_sec
+        self.path = path
+        self._shops = None
+        self._log = ''
+        self._fetched_at = 0.0
+        # 結果を作る前のストアのカーソル（これより後の店は結果に入っていないかもしれない）
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._last_error = None
+        self.counters = {'fresh': 0, 'stale': 0, 'sync_refreshes': 0,
+                         'background_refreshes': 0, 'refresh_errors': 0}
+        self._load_disk()
+
+    def _load_disk(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            self._shops = data['shops']
+            self._log = data.get('log', '')
+            self._fetched_at = float(data['fetched_at'])
+            self._cursor = int(data.get('cursor', 0))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ ニュースキャッシュ読み込みエラー: {e}")
+
+    def _save_disk(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'shops': self._shops, 'log': self._log,
+                           'fetched_at': self._fetched_at, 'cursor': self._cursor}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ ニュースキャッシュ保存エラー: {e}")
+
+    def get(self):
+        """
+        Returns:
+            (shops, log, meta) meta = {'age_sec', 'stale', 'refreshing', 'cursor'}
+            cursor を /api/news?cursor= に渡すと、この結果のあとに追加された店が返る
+        """
+        with self._lock:
+            shops, age = self._shops, time.time() - self._fetched_at
+
+        if shops is None or age > self.max_stale_sec:
+            self._refresh(background=False)
+        elif age > self.ttl_sec:
+            self.counters['stale'] += 1
+            self._start_background_refresh()
+        else:
+            self.counters['fresh'] += 1
+
+        with self._lock:
+            shops, log, age = self._shops, self._log, time.time() - self._fetched_at
+            meta = {
+                'age_sec': round(age, 1),
+                'stale': age > self.ttl_sec,
+                'refreshing': self._refreshing,
+                'cursor': self._cursor,
+            }
+        return list(shops or []), log, meta
+
+    def _start_background_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        thread = threading.Thread(target=self._refresh, kwargs={'background': True},
+                                  name='news-refresh', daemon=True)
+        thread.start()
+
+    def _refresh(self, background):
+        # 同時に走る更新は1つだけ（初回アクセスが重なっても取得は1回）
+        with self._refresh_lock:
+            try:
+                with self._lock:
+                    fetched_at = self._fetched_at
+                    has_data = self._shops is not None
+                if not background and has_data and time.time() - fetched_at <= self.max_stale_sec:
+                    return  # 待っている間に他のリクエストが更新済み
+
+                counter = 'background_refreshes' if background else 'sync_refreshes'
+                self.counters[counter] += 1
+                start = time.perf_counter()
+                cursor = news_store.cursor() if NEWS_STORE_ENABLED else 0
+                try:
+                    shops, log = self.loader()
+                except Exception as e:
+                    shops, log = [], ''
+                    self._last_error = str(e)
+                    print(f"⚠️ ニュース更新エラー: {e}")
+
+                print(f"📰 ニュース更新: {len(shops)}件 ({(time.perf_counter() - start) * 1000:.0f}ms)")
+                with self._lock:
+                    if not shops:
+                        # 全県取得失敗: 空の結果はキャッシュしない
+                        # 前回の結果があれば残し、NEWS_RETRY_SEC 後に再取得
+                        self.counters['refresh_errors'] += 1
+                        if self._shops:
+                            self._fetched_at = time.time() - self.ttl_sec + min(NEWS_RETRY_SEC, self.ttl_sec)
+                        return
+                    self._shops = shops
+                    self._log = log
+                    self._cursor = cursor
+                    self._fetched_at = time.time()
+                    self._last_error = None
+                    self._save_disk()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['cached_shops'] = len(self._shops) if self._shops is not None else None
+            stats['age_sec'] = round(time.time() - self._fetched_at, 1) if self._shops is not None else None
+            stats['ttl_sec'] = self.ttl_sec
+            stats['refreshing'] = self._refreshing
+            stats['last_error'] = self._last_error
+        return stats
+
+
+news_cache = NewsCache()
@@ -4,9 +4,18 @@
 """
 import requests
 from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import os
 import re
-from typing import List, Dict, Tuple
+import threading
+from typing import Collection, List, Dict, Tuple
 import time
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+from modules.news_store import NEWS_STORE_ENABLED, news_store, shop_href
+from modules.text_normalizer import GuardedSub, KeywordMatcher
 
 
 # 表示順: 群馬 → 栃木 → 埼玉 → 茨城
@@ -19,6 +28,29 @@ URLS = [
 
 SHOPS_PER_PREFECTURE = 10
 
+# stream: 必要な件数で解析を打ち切る HTMLParser 版 / soup: BeautifulSoup 版
+NEWS_PARSER = os.environ.get('NEWS_PARSER', 'stream')
+
+# 店舗ページへのリンク（<a href="/s/数字.html">）
+SHOP_HREF_RE = re.compile(r'^/s/\d+\.html$')
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+
+# concurrent: 県ごとに並列取得 / sequential: 1県ずつ1秒間隔（旧方式）
+NEWS_FETCH_MODE = os.environ.get('NEWS_FETCH_MODE', 'concurrent')
+NEWS_WORKERS = int(os.environ.get('NEWS_WORKERS', '4'))
+# 1県あたりの締め切り（秒）: アクセス間隔の待ちが終わってから数える。超えた県は空で返し、他の県の結果は使う
+NEWS_PREFECTURE_TIMEOUT_SEC = float(os.environ.get('NEWS_PREFECTURE_TIMEOUT_SEC', '20'))
+# ホストごとのアクセス間隔（トークンバケット）: 平均 RATE 回/秒、最大 BURST 回まで連続
+# BURST=1 なら同じホストへのリクエストは常に 1/RATE 秒以上あける
+NEWS_HOST_RATE = float(os.environ.get('NEWS_HOST_RATE', '1'))
+NEWS_HOST_BURST = int(os.environ.get('NEWS_HOST_BURST', '1'))
+
+# 条件付きリクエスト用: URL → {'etag', 'last_modified', 'shops'}
+# 304 Not Modified のときは前回の解析結果をそのまま使う
+_conditional = {}
+_conditional_lock = threading.Lock()
+
 # 削除対象キーワード（完全一致で削除）
 GARBAGE_KEYWORDS = [
     # 数字系（正規表現で処理）
@@ -37,6 +69,45 @@ GARBAGE_KEYWORDS = [
 ]
 
 
+# 都道府県名（これ以降は住所なのでカット）
+PREFECTURES = ['埼玉県', '群馬県', '栃木県', '茨城県', '茨城县', '千葉県', '東京都', '神奈川県']
+
+_GARBAGE_MATCHER = KeywordMatcher(GARBAGE_KEYWORDS)
+_PREFECTURE_MATCHER = KeywordMatcher(PREFECTURES)
+
+# clean_shop_name の各ステップ（プリコンパイル済み、必須文字を含むときだけ実行）
+_COUNT_SUBS = [
+    GuardedSub(r'\d+\.?\d*\s*ポイント', '', required='ポイント'),
+    GuardedSub(r'\d+\s*レビュー', '', required='レビュー'),
+    GuardedSub(r'\d+\s*スキ', '', required='スキ'),
+    GuardedSub(r'\d+\s*フォト', '', required='フォト'),
+    GuardedSub(r'\d+\s*件', '', required='件'),
+]
+_GUN_SUB = GuardedSub(r'[^\s]{1,5}郡[^\s]{1,8}[町村]', '', required='郡')
+_CITY_SUBS = [
+    GuardedSub(r'\s+[^\s]{1,6}[市区町村]\s*', ' ', any_of='市区町村'),
+    GuardedSub(r'\s+[^\s]{1,6}[市区町村]$', '', any_of='市区町村'),
+]
+_BRACKET_SUBS = [
+    GuardedSub(r'【[^】]*】', '', required='【'),
+    GuardedSub(r'（[^）]*）', '', required='（'),
+    GuardedSub(r'\([^)]*\)', '', required='('),
+]
+_DATE_SUBS = [
+    GuardedSub(r'\d{1,2}月\d{1,2}日', '', required='月'),
+    GuardedSub(r'\d{4}/\d{1,2}/\d{1,2}', '', required='/'),
+]
+_TRAILING_NUMBER_RE = re.compile(r'\s+\d+\.?\d*\s*$')
+_SPACES_RE = re.compile(r'\s+')
+_EDGE_PUNCT_RE = re.compile(r'^[\s\-・、。/\|:：\.]+|[\s\-・、。/\|:：\.]+$')
+
+_GUN_RE = re.compile(r'([^\s]{1,5}郡)')
+_SHI_RE = re.compile(r'([^\s]{1,10}市)')
+_KU_RE = re.compile(r'([^\s]{1,10}区)')
+_SLASH_DATE_RE = re.compile(r'(\d{4}/\d{1,2}/\d{1,2})')
+_KANJI_DATE_RE = re.compile(r'(\d{1,2}月\d{1,2}日)')
+
+
 def clean_shop_name(raw_text: str) -> str:
     """
     店名の精密清掃
@@ -52,64 +123,54 @@ def clean_shop_name(raw_text: str) -> str:
     # ========================================
     # Step 1: 数字+単位パターンを削除
     # ========================================
-    text = re.sub(r'\d+\.?\d*\s*ポイント', '', text)
-    text = re.sub(r'\d+\s*レビュー', '', text)
-    text = re.sub(r'\d+\s*スキ', '', text)
-    text = re.sub(r'\d+\s*フォト', '', text)
-    text = re.sub(r'\d+\s*件', '', text)
+    for sub in _COUNT_SUBS:
+        text = sub(text)
     
     # ========================================
-    # Step 2: ゴミキーワードを削除
+    # Step 2: ゴミキーワードを削除（含まれるときだけ従来の順番で置換）
     # ========================================
-    for keyword in GARBAGE_KEYWORDS:
-        text = text.replace(keyword, ' ')
+    text = _GARBAGE_MATCHER.replace_sequential(text, ' ')
     
     # ========================================
     # Step 3: 都道府県名以降をカット（住所全体を削除）
     # ========================================
-    prefectures = ['埼玉県', '群馬県', '栃木県', '茨城県', '茨城县', '千葉県', '東京都', '神奈川県']
-    for pref in prefectures:
-        if pref in text:
-            idx = text.find(pref)
-            text = text[:idx]
+    text = _PREFECTURE_MATCHER.cut_before_first(text)
     
     # ========================================
     # Step 3.5: 郡+町/村パターンを削除
     #           例: 比企郡武蔵嵐山町、邑楽郡大泉町
     # ========================================
-    text = re.sub(r'[^\s]{1,5}郡[^\s]{1,8}[町村]', '', text)
+    text = _GUN_SUB(text)
     
     # ========================================
     # Step 3.6: 市区町村パターンを削除
     #           例: 新座市、草加市（スペースで区切られている場合）
     # ========================================
-    text = re.sub(r'\s+[^\s]{1,6}[市区町村]\s*', ' ', text)
-    text = re.sub(r'\s+[^\s]{1,6}[市区町村]$', '', text)
+    for sub in _CITY_SUBS:
+        text = sub(text)
     
     # ========================================
     # Step 4: 括弧を削除
     # ========================================
-    text = re.sub(r'【[^】]*】', '', text)
-    text = re.sub(r'（[^）]*）', '', text)
-    text = re.sub(r'\([^)]*\)', '', text)
+    for sub in _BRACKET_SUBS:
+        text = sub(text)
     
     # ========================================
     # Step 5: 日付を削除
     # ========================================
-    text = re.sub(r'\d{1,2}月\d{1,2}日', '', text)
-    text = re.sub(r'\d{4}/\d{1,2}/\d{1,2}', '', text)
+    for sub in _DATE_SUBS:
+        text = sub(text)
     
     # ========================================
     # Step 6: 末尾の孤立したゴミを削除
     # ========================================
-    text = re.sub(r'\s+\d+\.?\d*\s*$', '', text)
+    text = _TRAILING_NUMBER_RE.sub('', text)
     
     # ========================================
     # Step 7: 最終クリーンアップ
     # ========================================
-    text = re.sub(r'\s+', ' ', text).strip()
-    text = re.sub(r'^[\s\-・、。/\|:：\.]+', '', text)
-    text = re.sub(r'[\s\-・、。/\|:：\.]+$', '', text)
+    text = _SPACES_RE.sub(' ', text).strip()
+    text = _EDGE_PUNCT_RE.sub('', text)
     
     return text
 
@@ -129,20 +190,23 @@ def extract_city_name(info_text: str) -> str:
     
     # 優先1: ◯◯郡 パターン（郡があれば郡までで止める）
     # 例: 比企郡武蔵嵐山町 → 比企郡
-    match = re.search(r'([^\s]{1,5}郡)', info_text)
-    if match:
-        return match.group(1)
+    if '郡' in info_text:
+        match = _GUN_RE.search(info_text)
+        if match:
+            return match.group(1)
     
     # 優先2: ◯◯市 パターン
     # 例: 新座市、さいたま市、ひたちなか市
-    match = re.search(r'([^\s]{1,10}市)', info_text)
-    if match:
-        return match.group(1)
+    if '市' in info_text:
+        match = _SHI_RE.search(info_text)
+        if match:
+            return match.group(1)
     
     # 優先3: ◯◯区 パターン（東京23区など）
-    match = re.search(r'([^\s]{1,10}区)', info_text)
-    if match:
-        return match.group(1)
+    if '区' in info_text:
+        match = _KU_RE.search(info_text)
+        if match:
+            return match.group(1)
     
     return ""
 
@@ -152,17 +216,285 @@ def extract_open_date(info_text: str) -> str:
     if not info_text:
         return ""
     
-    match = re.search(r'(\d{4}/\d{1,2}/\d{1,2})', info_text)
+    match = _SLASH_DATE_RE.search(info_text)
     if match:
         return match.group(1)
     
-    match = re.search(r'(\d{1,2}月\d{1,2}日)', info_text)
+    match = _KANJI_DATE_RE.search(info_text) if '月' in info_text else None
     if match:
         return match.group(1)
     
     return ""
 
 
+# ストリーミング抽出で BeautifulSoup(html.parser) と同じ木構造を再現するための定義
+# 閉じタグなしで閉じる要素（bs4 の HTMLTreeBuilder.empty_element_tags と同じ）
+_EMPTY_ELEMENT_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+}
+# 中の文字列が get_text() に含まれない要素（bs4 の DEFAULT_STRING_CONTAINERS）
+_STRING_CONTAINER_TAGS = {'rt', 'rp', 'style', 'script', 'template'}
+
+
+class _EnoughShops(Exception):
+    """必要な件数が揃ったので解析を打ち切る"""
+
+
+class _Node:
+    """開いている要素（タグ名・class と、抽出に必要な情報だけ）"""
+    __slots__ = ('tag', 'classes', 'first_info', 'link', 'info', 'waiting', 'closed')
+
+    def __init__(self, tag, classes):
+        self.tag = tag
+        self.classes = classes
+        self.first_info = None  # 子孫で最初の class="info" のテキスト
+        self.link = None        # この要素が店舗リンクなら _Link
+        self.info = None        # この要素が class="info" ならテキスト
+        self.waiting = None     # この要素が閉じるのを待っている店舗
+        self.closed = False
+
+
+class _Text:
+    """要素内の文字列（get_text(strip=True) 用に strip 済みの断片を集める）"""
+    __slots__ = ('parts',)
+
+    def __init__(self):
+        self.parts = []
+
+
+class _Link:
+    __slots__ = ('href', 'is_pr', 'parent', 'text', 'closed')
+
+    def __init__(self, href, is_pr, parent):
+        self.href = href
+        self.is_pr = is_pr
+        self.parent = parent
+        self.text = _Text()
+        self.closed = False
+
+
+class _ShopListParser(HTMLParser):
+    """
+    scrape_one_prefecture 用のストリーミング抽出
+    extract_shops_soup と同じ判定（PR除外・href重複除外・親の li/div 内の最初の .info）を
+    木を作らずに行う
+    """
+
+    def __init__(self, pref_name, limit, stop_hrefs=()):
+        super().__init__(convert_charrefs=False)
+        self.pref_name = pref_name
+        self.limit = limit
+        self.stop_hrefs = stop_hrefs
+        self._reached_known = False
+        self.shops = []
+        self._stack = []
+        self._pending_text = []
+        self._collectors = []
+        self._container_depth = 0
+        self._already_closed_empty = []
+        self._links = []
+        self._seen = set()
+        self._count = 0
+        self._waiting_total = 0
+
+    # ---- 文字列 ----
+    def handle_data(self, data):
+        self._pending_text.append(data)
+
+    def handle_charref(self, name):
+        if name.startswith(('x', 'X')):
+            code = int(name[1:], 16)
+        else:
+            code = int(name)
+        data = None
+        if code < 256:
+            try:
+                data = bytearray([code]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self._pending_text.append(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self._pending_text.append(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def handle_decl(self, data):
+        self._flush_text()
+
+    def handle_pi(self, data):
+        self._flush_text()
+
+    def unknown_decl(self, data):
+        self._flush_text()
+        if data.upper().startswith('CDATA['):
+            self._add_string(data[len('CDATA['):])
+
+    def _flush_text(self):
+        if not self._pending_text:
+            return
+        text = ''.join(self._pending_text)
+        self._pending_text = []
+        self._add_string(text)
+
+    def _add_string(self, text):
+        if self._container_depth:
+            return
+        text = text.strip()
+        if text:
+            for collector in self._collectors:
+                collector.parts.append(text)
+
+    # ---- タグ ----
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, handle_empty_element=True)
+
+    def _start(self, tag, attrs, handle_empty_element):
+        self._flush_text()
+        attr_dict = {}
+        for key, value in attrs:
+            attr_dict[key] = '' if value is None else value
+        classes = attr_dict.get('class', '').split()
+        node = _Node(tag, classes)
+
+        if tag == 'a' and SHOP_HREF_RE.search(attr_dict.get('href', '')):
+            self._start_link(node, attr_dict['href'])
+
+        if 'info' in classes:
+            node.info = _Text()
+            self._collectors.append(node.info)
+            for ancestor in self._stack:
+                if ancestor.first_info is None and ancestor.tag in ('li', 'div'):
+                    ancestor.first_info = node.info
+
+        self._stack.append(node)
+        if tag in _STRING_CONTAINER_TAGS:
+            self._container_depth += 1
+
+        if handle_empty_element and tag in _EMPTY_ELEMENT_TAGS:
+            self._pop_to(tag)
+            self._already_closed_empty.append(tag)
+
+    def _start_link(self, node, href):
+        nearest = None   # find_parent(['li', 'div'])
+        parent_li = None
+        parent_div = None
+        for ancestor in reversed(self._stack):
+            if ancestor.tag == 'li':
+                nearest = nearest or ancestor
+                parent_li = parent_li or ancestor
+            elif ancestor.tag == 'div':
+                nearest = nearest or ancestor
+                parent_div = parent_div or ancestor
+            if parent_li is not None:
+                break
+
+        is_pr = any('pr' in c.lower() for c in node.classes)
+        if not is_pr and nearest is not None:
+            is_pr = any('pr' in c.lower() for c in nearest.classes)
+
+        link = _Link(href, is_pr, parent_li or parent_div)
+        node.link = link
+        self._collectors.append(link.text)
+        self._links.append(link)
+
+    def handle_endtag(self, tag):
+        if tag in self._already_closed_empty:
+            self._already_closed_empty.remove(tag)
+            return
+        self._flush_text()
+        self._pop_to(tag)
+
+    def _pop_to(self, tag):
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i].tag == tag:
+                break
+        else:
+            return
+        while len(self._stack) > i:
+            self._close(self._stack.pop())
+        self._process_links()
+        if (self._count >= self.limit or self._reached_known) and self._waiting_total == 0:
+            raise _EnoughShops()
+
+    def _close(self, node):
+        node.closed = True
+        if node.tag in _STRING_CONTAINER_TAGS:
+            self._container_depth -= 1
+        if node.link is not None:
+            node.link.closed = True
+            self._collectors.remove(node.link.text)
+        if node.info is not None:
+            self._collectors.remove(node.info)
+        if node.waiting:
+            for shop in node.waiting:
+                self._fill_info(shop, node)
+            self._waiting_total -= len(node.waiting)
+            node.waiting = None
+
+    @staticmethod
+    def _fill_info(shop, parent):
+        if parent.first_info is not None:
+            info_text = ' '.join(parent.first_info.parts)
+            shop['city'] = extract_city_name(info_text)
+            shop['open_date'] = extract_open_date(info_text)
+
+    def _process_links(self):
+        """文書順に、テキストが確定したリンクから店舗を判定"""
+        while (self._links and self._links[0].closed and self._count < self.limit
+               and not self._reached_known):
+            link = self._links.pop(0)
+            if link.is_pr or link.href in self._seen:
+                continue
+            self._seen.add(link.href)
+            if link.href in self.stop_hrefs:
+                self._reached_known = True
+                break
+
+            shop_name = clean_shop_name(''.join(link.text.parts))
+            if not shop_name or len(shop_name) < 2:
+                continue
+
+            self._count += 1
+            shop = {
+                'name': shop_name,
+                'area': self.pref_name,
+                'url': f"https://ramendb.supleks.jp{link.href}",
+                'city': "",
+                'open_date': "",
+            }
+            self.shops.append(shop)
+            if link.parent is None:
+                continue
+            if link.parent.closed:
+                self._fill_info(shop, link.parent)
+            else:
+                if link.parent.waiting is None:
+                    link.parent.waiting = []
+                link.parent.waiting.append(shop)
+                self._waiting_total += 1
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        while self._stack:
+            self._close(self._stack.pop())
+        self._process_links()
+
+
 def is_pr_item(element) -> bool:
     """PR判定"""
     classes = element.get('class', [])
@@ -174,63 +506,95 @@ def is_pr_item(element) -> bool:
     return False
 
 
-def scrape_one_prefecture(url: str, pref_name: str, session) -> List[Dict]:
-    """1県分をスクレイピング"""
-    shops = []
-    
+class HostRateLimiter:
+    """ホストごとのトークンバケット（並列取得でもサイトへの負荷を抑える）"""
+
+    def __init__(self, rate=NEWS_HOST_RATE, burst=NEWS_HOST_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # host → (tokens, 最終更新時刻)
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, updated = self._buckets.get(host, (float(self.burst), now))
+                tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+                if tokens >= 1.0:
+                    self._buckets[host] = (tokens - 1.0, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1.0 - tokens) / self.rate
+            time.sleep(wait)
+
+
+rate_limiter = HostRateLimiter()
+
+_executor = ThreadPoolExecutor(max_workers=NEWS_WORKERS, thread_name_prefix='news')
+_thread_local = threading.local()
+
+
+def _new_session():
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    return session
+
+
+def _thread_session():
+    """スレッドごとの Session（requests.Session はスレッド間で共有しない）"""
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = _new_session()
+        _thread_local.session = session
+    return session
+
+
+def scrape_one_prefecture(url: str, pref_name: str, session,
+                          stop_hrefs: Collection[str] = (), on_token=None) -> List[Dict]:
+    """
+    1県分をスクレイピング
+
+    Args:
+        stop_hrefs: 既知の店舗リンク（/s/<id>.html）。ページ上で最初に当たった時点で打ち切る
+        on_token: アクセス間隔の待ちが終わり、リクエストを送る直前に呼ぶ（締め切りの起点）
+    """
     try:
-        response = session.get(url, timeout=15)
+        with _conditional_lock:
+            previous = _conditional.get(url)
+        headers = {}
+        if previous:
+            if previous.get('etag'):
+                headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'):
+                headers['If-Modified-Since'] = previous['last_modified']
+
+        rate_limiter.acquire(url)
+        if on_token is not None:
+            on_token()
+        response = session.get(url, timeout=15, headers=headers)
+        if response.status_code == 304 and previous:
+            print(f"[News] {pref_name}: 304 Not Modified")
+            return [dict(shop) for shop in previous['shops']]
         response.raise_for_status()
         response.encoding = 'utf-8'
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 店舗リンクを取得（<a href="/s/数字.html">）
-        links = soup.find_all('a', href=re.compile(r'^/s/\d+\.html$'))
-        
-        seen = set()
-        count = 0
-        
-        for link in links:
-            if is_pr_item(link):
-                continue
-            
-            href = link.get('href', '')
-            if href in seen:
-                continue
-            seen.add(href)
-            
-            # <a>タグの中身だけを取得
-            raw_name = link.get_text(strip=True)
-            shop_name = clean_shop_name(raw_name)
-            
-            if not shop_name or len(shop_name) < 2:
-                continue
-            
-            count += 1
-            
-            city_name = ""
-            open_date = ""
-            
-            parent = link.find_parent('li') or link.find_parent('div')
-            if parent:
-                info_el = parent.find(class_='info')
-                if info_el:
-                    info_text = info_el.get_text(' ', strip=True)
-                    city_name = extract_city_name(info_text)
-                    open_date = extract_open_date(info_text)
-            
-            shops.append({
-                'name': shop_name,
-                'area': pref_name,
-                'url': f"https://ramendb.supleks.jp{href}",
-                'city': city_name,
-                'open_date': open_date,
-            })
-            
-            if count >= SHOPS_PER_PREFECTURE:
-                break
-        
+        if NEWS_PARSER == 'soup':
+            shops = extract_shops_soup(response.text, pref_name, stop_hrefs)
+        else:
+            shops = extract_shops_stream(response.text, pref_name, stop_hrefs)
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            with _conditional_lock:
+                _conditional[url] = {
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'shops': [dict(shop) for shop in shops],
+                }
+
         return shops
         
     except Exception as e:
@@ -238,18 +602,169 @@ def scrape_one_prefecture(url: str, pref_name: str, session) -> List[Dict]:
         return []
 
 
+def extract_shops_soup(html: str, pref_name: str, stop_hrefs: Collection[str] = ()) -> List[Dict]:
+    """検索結果ページから店舗を抽出（BeautifulSoup 版）"""
+    shops = []
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # 店舗リンクを取得（<a href="/s/数字.html">）
+    links = soup.find_all('a', href=SHOP_HREF_RE)
+
+    seen = set()
+    count = 0
+
+    for link in links:
+        if is_pr_item(link):
+            continue
+
+        href = link.get('href', '')
+        if href in seen:
+            continue
+        seen.add(href)
+        if href in stop_hrefs:
+            break
+
+        # <a>タグの中身だけを取得
+        raw_name = link.get_text(strip=True)
+        shop_name = clean_shop_name(raw_name)
+
+        if not shop_name or len(shop_name) < 2:
+            continue
+
+        count += 1
+
+        city_name = ""
+        open_date = ""
+
+        parent = link.find_parent('li') or link.find_parent('div')
+        if parent:
+            info_el = parent.find(class_='info')
+            if info_el:
+                info_text = info_el.get_text(' ', strip=True)
+                city_name = extract_city_name(info_text)
+                open_date = extract_open_date(info_text)
+
+        shops.append({
+            'name': shop_name,
+            'area': pref_name,
+            'url': f"https://ramendb.supleks.jp{href}",
+            'city': city_name,
+            'open_date': open_date,
+        })
+
+        if count >= SHOPS_PER_PREFECTURE:
+            break
+
+    return shops
+
+
+def extract_shops_stream(html: str, pref_name: str, stop_hrefs: Collection[str] = ()) -> List[Dict]:
+    """
+    検索結果ページから店舗を抽出（ストリーミング版）
+    SHOPS_PER_PREFECTURE 件が揃うか既知の店（stop_hrefs）に当たり、
+    それぞれの親要素（info の探索範囲）が閉じた時点で解析を打ち切る
+    """
+    parser = _ShopListParser(pref_name, SHOPS_PER_PREFECTURE, stop_hrefs)
+    try:
+        parser.feed(html)
+        parser.close()
+    except _EnoughShops:
+        pass
+    return parser.shops
+
+
+def refresh_prefecture(url: str, pref_name: str, session, on_token=None) -> List[Dict]:
+    """
+    1県分を更新して表示用の店舗リストを返す
+
+    ストアが有効なら既知の店に当たるまでだけ取得して新着を保存し、
+    表示はストアの新しい順 SHOPS_PER_PREFECTURE 件（取得失敗時も前回までの店を返す）
+    """
+    if not NEWS_STORE_ENABLED:
+        return scrape_one_prefecture(url, pref_name, session, on_token=on_token)
+
+    stop_hrefs = {shop_href(shop_id) for shop_id in news_store.known_ids(pref_name)}
+    shops = scrape_one_prefecture(url, pref_name, session, stop_hrefs, on_token=on_token)
+    news_store.add_shops(pref_name, shops)
+    return news_store.latest(pref_name, SHOPS_PER_PREFECTURE)
+
+
+def get_shops_since(timestamp: float) -> List[Dict]:
+    """timestamp（UNIX時刻）より後に見つかった店（URLS の県順）"""
+    return news_store.since(timestamp, [pref_name for _, pref_name in URLS])
+
+
+def get_shops_after(cursor: int) -> Tuple[List[Dict], int]:
+    """カーソル（seq）より後に追加された店（URLS の県順）と次回のカーソル"""
+    return news_store.after(cursor, [pref_name for _, pref_name in URLS])
+
+
+class _TokenClock:
+    """県ごとの締め切りの起点（アクセス間隔の待ちが終わった時刻）"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.at = None
+
+    def mark(self):
+        if self.at is None:
+            self.at = time.monotonic()
+            self.event.set()
+
+    def deadline(self, timeout):
+        """起点から timeout 秒後（起点まで timeout 秒待っても来なければ今）"""
+        if not self.event.wait(timeout):
+            return time.monotonic()
+        return self.at + timeout
+
+
+def _scrape_in_worker(url: str, pref_name: str, clock: _TokenClock) -> List[Dict]:
+    try:
+        return refresh_prefecture(url, pref_name, _thread_session(), on_token=clock.mark)
+    finally:
+        # 取得前に失敗しても締め切りの待ちが終わるように
+        clock.mark()
+
+
 def get_new_reviews() -> Tuple[List[Dict], str]:
     """メインエントリーポイント"""
-    session = requests.Session()
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-    })
-    
+    if NEWS_FETCH_MODE == 'sequential':
+        return _get_new_reviews_sequential()
+
+    # 全県を同時に取得（アクセス間隔は rate_limiter で調整）
+    start = time.monotonic()
+    futures = []
+    for url, pref_name in URLS:
+        clock = _TokenClock()
+        futures.append((pref_name, clock, _executor.submit(_scrape_in_worker, url, pref_name, clock)))
+
+    all_shops = []
+    logs = []
+    # 表示順は URLS の順のまま
+    for pref_name, clock, future in futures:
+        deadline = clock.deadline(NEWS_PREFECTURE_TIMEOUT_SEC)
+        try:
+            shops = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            future.cancel()
+            print(f"Error: {pref_name}: timeout")
+            logs.append(f"{pref_name}: timeout")
+            continue
+        all_shops.extend(shops)
+        logs.append(f"{pref_name}: {len(shops)}件")
+
+    print(f"[News] {len(URLS)}県 {(time.monotonic() - start) * 1000:.0f}ms")
+    return all_shops, " | ".join(logs)
+
+
+def _get_new_reviews_sequential() -> Tuple[List[Dict], str]:
+    session = _new_session()
+
     all_shops = []
     logs = []
     
     for url, pref_name in URLS:
-        shops = scrape_one_prefecture(url, pref_name, session)
+        shops = refresh_prefecture(url, pref_name, session)
         all_shops.extend(shops)
         logs.append(f"{pref_name}: {len(shops)}件")
         time.sleep(1)
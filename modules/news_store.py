@@ -0,0 +1,217 @@
+"""
+新店ニュースストア - ramendb の店舗ID（/s/<id>.html）をキーにした SQLite 永続ストア
+店ごとに初めて見つけた時刻（first_seen）と開店日を記録し、
+  - 更新時は既知の店に当たったところでスクレイピングを打ち切る（新着だけ取得）
+  - /api/news?cursor=<seq> でそのカーソルより後に追加された店だけを返す
+    （seq は追加順の通し番号。時刻と違い、書き込み中の更新と読み出しが前後しても取りこぼさない）
+Vercel ではコールドスタートで /tmp が消えるため、その直後の1回は全件が新着扱いになる
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+NEWS_STORE_PATH = os.environ.get('NEWS_STORE_PATH', os.path.join('/tmp', 'ramen_cache', 'news.sqlite3'))
+NEWS_STORE_ENABLED = os.environ.get('NEWS_STORE', '1') != '0'
+
+_SHOP_ID_RE = re.compile(r'/s/(\d+)\.html')
+
+
+def shop_id_from_url(url: str) -> Optional[int]:
+    """店舗URL（https://ramendb.supleks.jp/s/123.html または /s/123.html）から店舗ID"""
+    match = _SHOP_ID_RE.search(url or '')
+    return int(match.group(1)) if match else None
+
+
+def shop_href(shop_id: int) -> str:
+    return f"/s/{shop_id}.html"
+
+
+class NewsStore:
+    """
+    県ごとの新店リスト
+
+    seq は追加順の通し番号。1回の更新で見つかった新着はページの上（開店日が新しい方）ほど
+    大きい seq になるので、seq の降順がページの並び順になる
+    """
+
+    def __init__(self, path=NEWS_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.counters = {'added': 0, 'updates': 0, 'since_queries': 0, 'cursor_queries': 0}
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS news_shops (
+                    shop_id INTEGER PRIMARY KEY,
+                    seq INTEGER NOT NULL,
+                    area TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    city TEXT NOT NULL,
+                    open_date TEXT NOT NULL,
+                    first_seen REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS news_shops_area_seq ON news_shops (area, seq);
+                CREATE INDEX IF NOT EXISTS news_shops_first_seen ON news_shops (first_seen);
+            """)
+            self._initialized = True
+        return conn
+
+    def known_ids(self, area: str) -> Set[int]:
+        with self._lock:
+            conn = self._connect()
+            try:
+                return {row[0] for row in conn.execute(
+                    "SELECT shop_id FROM news_shops WHERE area = ?", (area,))}
+            finally:
+                conn.close()
+
+    def add_shops(self, area: str, shops: List[Dict], now: Optional[float] = None) -> List[Dict]:
+        """
+        スクレイピング結果（ページ順）を保存
+
+        既知の店は名前・市区町村・開店日だけ更新し、first_seen と並び順は変えない
+
+        Returns:
+            新しく追加した店（ページ順）
+        """
+        with self._lock:
+            # first_seen はロック内で付ける（since() の読み出しと順序がずれないように）
+            now = time.time() if now is None else now
+            conn = self._connect()
+            try:
+                (max_seq,) = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM news_shops").fetchone()
+                new_rows = []
+                for shop in shops:
+                    shop_id = shop_id_from_url(shop.get('url', ''))
+                    if shop_id is None:
+                        continue
+                    updated = conn.execute(
+                        "UPDATE news_shops SET name = ?, city = ?, open_date = ? WHERE shop_id = ?",
+                        (shop['name'], shop.get('city', ''), shop.get('open_date', ''), shop_id)).rowcount
+                    if updated:
+                        self.counters['updates'] += 1
+                    elif shop_id not in {row[0] for row in new_rows}:
+                        new_rows.append((shop_id, shop))
+
+                # ページの上にある店ほど大きい seq
+                count = len(new_rows)
+                conn.executemany(
+                    "INSERT INTO news_shops (shop_id, seq, area, name, url, city, open_date, first_seen) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(shop_id, max_seq + count - i, area, shop['name'], shop['url'],
+                      shop.get('city', ''), shop.get('open_date', ''), now)
+                     for i, (shop_id, shop) in enumerate(new_rows)])
+                conn.commit()
+            finally:
+                conn.close()
+
+        self.counters['added'] += len(new_rows)
+        if new_rows:
+            print(f"[NewsStore] {area}: 新着 {len(new_rows)}件")
+        return [self._with_meta(shop, shop_id, now) for shop_id, shop in new_rows]
+
+    def latest(self, area: str, limit: int) -> List[Dict]:
+        """県の新店（新しい順に limit 件）"""
+        return self._query(
+            "SELECT * FROM news_shops WHERE area = ? ORDER BY seq DESC LIMIT ?", (area, limit))
+
+    def cursor(self) -> int:
+        """現在のカーソル（最大の seq、空なら 0）"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM news_shops").fetchone()[0]
+            finally:
+                conn.close()
+
+    def after(self, cursor: int, areas: Optional[List[str]] = None) -> Tuple[List[Dict], int]:
+        """
+        seq が cursor より後の店（県は areas の順、県内は新しい順）
+
+        Returns:
+            (店のリスト, 次回のカーソル)  同じロック内で読むので、次回のカーソルまでの店は必ず含まれる
+        """
+        self.counters['cursor_queries'] += 1
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT * FROM news_shops WHERE seq > ? ORDER BY seq DESC", (cursor,)).fetchall()
+                (next_cursor,) = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM news_shops").fetchone()
+            finally:
+                conn.close()
+        return self._in_area_order([self._row_to_shop(row) for row in rows], areas), next_cursor
+
+    def since(self, timestamp: float, areas: Optional[List[str]] = None) -> List[Dict]:
+        """first_seen が timestamp より後の店（県は areas の順、県内は新しい順）"""
+        self.counters['since_queries'] += 1
+        shops = self._query(
+            "SELECT * FROM news_shops WHERE first_seen > ? ORDER BY seq DESC", (timestamp,))
+        return self._in_area_order(shops, areas)
+
+    @staticmethod
+    def _in_area_order(shops, areas):
+        if areas is None:
+            return shops
+        order = {area: i for i, area in enumerate(areas)}
+        shops = [shop for shop in shops if shop['area'] in order]
+        shops.sort(key=lambda shop: order[shop['area']])
+        return shops
+
+    def _query(self, sql, params):
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+        return [self._row_to_shop(row) for row in rows]
+
+    @staticmethod
+    def _row_to_shop(row) -> Dict:
+        return {
+            'id': row['shop_id'],
+            'name': row['name'],
+            'area': row['area'],
+            'url': row['url'],
+            'city': row['city'],
+            'open_date': row['open_date'],
+            'first_seen': row['first_seen'],
+            'seq': row['seq'],
+        }
+
+    @staticmethod
+    def _with_meta(shop, shop_id, first_seen):
+        shop = dict(shop)
+        shop['id'] = shop_id
+        shop['first_seen'] = first_seen
+        return shop
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['enabled'] = NEWS_STORE_ENABLED
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    stats['shops'] = conn.execute("SELECT COUNT(*) FROM news_shops").fetchone()[0]
+                    stats['per_area'] = dict(conn.execute(
+                        "SELECT area, COUNT(*) FROM news_shops GROUP BY area").fetchall())
+                finally:
+                    conn.close()
+            stats['db_bytes'] = os.path.getsize(self.path)
+        except (sqlite3.Error, OSError):
+            pass
+        return stats
+
+
+news_store = NewsStore()
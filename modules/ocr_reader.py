@@ -2,10 +2,27 @@
 OCR（光学文字認識）モジュール - Mac mini M4対応
 看板・メニューから店名を抽出
 """
+import os
+import queue
 import re
-from typing import Optional
+import threading
+import time
+from typing import List, Optional, Tuple
+
 from PIL import Image
 
+from modules import cropper
+from modules.content_cache import ContentCache, make_key
+from modules.image_context import ensure_context
+from modules.text_normalizer import KeywordMatcher, delete_chars_table
+
+try:
+    import cv2
+    import numpy as np
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
 # Mac mini M4 の Homebrew Tesseract パス
 TESSERACT_PATH = '/opt/homebrew/bin/tesseract'
 
@@ -13,39 +30,320 @@ TESSERACT_PATH = '/opt/homebrew/bin/tesseract'
 try:
     import pytesseract
     pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
-    OCR_AVAILABLE = True
+    HAS_PYTESSERACT = True
     print(f"Tesseract configured: {TESSERACT_PATH}")
 except ImportError:
-    OCR_AVAILABLE = False
-    print("Warning: pytesseract not installed. OCR features disabled.")
+    HAS_PYTESSERACT = False
+
+# tesserocr（libtesseract を直接呼ぶ。言語モデルをハンドルごとに1回だけ読み込む）
+try:
+    import tesserocr
+    HAS_TESSEROCR = True
+except ImportError:
+    HAS_TESSEROCR = False
+
+OCR_AVAILABLE = HAS_PYTESSERACT or HAS_TESSEROCR
+if not OCR_AVAILABLE:
+    print("Warning: pytesseract/tesserocr not installed. OCR features disabled.")
+
+# OCRエンジン（環境変数 OCR_ENGINE で切替）
+#   auto       : tesserocr があればハンドルプール、なければ subprocess
+#   tesserocr  : tesserocr のハンドルプール（使えなければ subprocess）
+#   subprocess : pytesseract（呼び出しごとに tesseract プロセスを起動、従来方式）
+OCR_ENGINE = os.environ.get('OCR_ENGINE', 'auto')
+# 同時に実行する OCR の上限（tesserocr ではハンドル数 = 常駐する言語モデルの数）
+OCR_POOL_SIZE = int(os.environ.get('OCR_POOL_SIZE', '2'))
+# 空きを待つ最大秒数
+OCR_POOL_TIMEOUT_SEC = float(os.environ.get('OCR_POOL_TIMEOUT_SEC', '30'))
+# tessdata の場所（None なら tesserocr の既定）
+TESSDATA_PATH = os.environ.get('TESSDATA_PREFIX')
+
+# ラーメン関連キーワード（リストの順番 = ログに出すキーワードの優先順位）
+RAMEN_KEYWORDS = [
+    'らーめん', 'ラーメン', 'らぁめん', 'ラァメン',
+    '拉麺', '中華そば', '中華麺', 'つけ麺', 'つけめん',
+    '麺屋', '麺処', '麺家', '麺道', '麺や',
+    'らー麺', '担々麺', '味噌', '醤油', '塩', '豚骨',
+]
+_RAMEN_KEYWORD_MATCHER = KeywordMatcher(RAMEN_KEYWORDS)
+
+# OCRモード（環境変数 OCR_MODE で切替）
+#   full : フル解像度の写真全体を1回 OCR（従来方式）
+#   roi  : どんぶりを塗りつぶし → 縮小 → 文字領域を検出 → 二値化した領域だけを OCR
+OCR_MODE = os.environ.get('OCR_MODE', 'full')
+OCR_MODES = ('full', 'roi')
+OCR_LANG = 'jpn+eng'
+
+# roi モードの縮小サイズ（長辺px）: スマホ写真の看板文字が Tesseract の読みやすい
+# 文字高さ（20〜40px 程度）になる大きさ
+OCR_ROI_MAX_SIDE = int(os.environ.get('OCR_ROI_MAX_SIDE', '1600'))
+# OCR する文字領域の最大数（面積の大きい順）
+OCR_ROI_MAX_REGIONS = int(os.environ.get('OCR_ROI_MAX_REGIONS', '8'))
+# どんぶりの円をこの倍率で広げて除外（縁・箸・れんげの写り込み分）
+OCR_ROI_BOWL_MARGIN = 1.1
+# 文字領域の周りに足す余白（px、縮小後）
+OCR_ROI_PADDING = 8
+
+
+
+class _EngineStats:
+    """OCRエンジン共通の統計（呼び出し数・待ち行列・待ち時間・処理時間）"""
+
+    def __init__(self, name, pool_size):
+        self.name = name
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.wait_ms = 0.0
+        self.ocr_ms = 0.0
+
+    def start_wait(self):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def end_wait(self, wait_ms, acquired):
+        with self._lock:
+            self.waiting -= 1
+            self.wait_ms += wait_ms
+            if acquired:
+                self.in_use += 1
+
+    def finish(self, ocr_ms, ok):
+        with self._lock:
+            self.in_use -= 1
+            self.calls += 1
+            self.ocr_ms += ocr_ms
+            if not ok:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'engine': self.name,
+                'pool_size': self.pool_size,
+                'in_use': self.in_use,
+                'queue_depth': self.waiting,
+                'max_queue_depth': self.max_waiting,
+                'calls': self.calls,
+                'errors': self.errors,
+                'mean_wait_ms': round(self.wait_ms / self.calls, 1) if self.calls else None,
+                'mean_ocr_ms': round(self.ocr_ms / self.calls, 1) if self.calls else None,
+            }
+
+
+class SubprocessEngine:
+    """pytesseract（1回ごとに tesseract プロセスを起動）。同時実行数だけ制限する"""
+    name = 'subprocess'
+
+    def __init__(self, pool_size=OCR_POOL_SIZE, lang=OCR_LANG):
+        self.lang = lang
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self.metrics = _EngineStats(self.name, pool_size)
+
+    def image_to_string(self, image, psm=None) -> str:
+        self.metrics.start_wait()
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=OCR_POOL_TIMEOUT_SEC)
+        self.metrics.end_wait((time.perf_counter() - start) * 1000, acquired)
+        if not acquired:
+            raise TimeoutError("OCR待ち行列がタイムアウト")
+
+        start = time.perf_counter()
+        ok = False
+        try:
+            config = f'--psm {psm}' if psm is not None else ''
+            text = pytesseract.image_to_string(image, lang=self.lang, config=config)
+            ok = True
+            return text
+        finally:
+            self._slots.release()
+            self.metrics.finish((time.perf_counter() - start) * 1000, ok)
+
+    def stats(self):
+        return self.metrics.snapshot()
+
+
+class TesserocrPool:
+    """
+    tesserocr の PyTessBaseAPI ハンドルのプール
+    ハンドルは初回使用時に作成（jpn+eng の読み込みはハンドルごとに1回）し、以降は使い回す。
+    ハンドルはスレッドセーフではないので、1回の OCR の間は1スレッドが占有する
+    """
+    name = 'tesserocr'
+
+    def __init__(self, pool_size=OCR_POOL_SIZE, lang=OCR_LANG, path=TESSDATA_PATH):
+        self.pool_size = pool_size
+        self.lang = lang
+        self.path = path
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._create_lock = threading.Lock()
+        self.metrics = _EngineStats(self.name, pool_size)
+
+    def _new_handle(self):
+        kwargs = {'lang': self.lang}
+        if self.path:
+            kwargs['path'] = self.path
+        start = time.perf_counter()
+        handle = tesserocr.PyTessBaseAPI(**kwargs)
+        print(f"🔤 Tesseractハンドル作成 ({self.lang}): {(time.perf_counter() - start) * 1000:.0f}ms")
+        return handle
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._create_lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                try:
+                    return self._new_handle()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=OCR_POOL_TIMEOUT_SEC)
+        except queue.Empty:
+            raise TimeoutError("OCR待ち行列がタイムアウト")
+
+    def warm_up(self):
+        """ハンドルを1つ作っておく（言語モデルが読めるかの確認も兼ねる）"""
+        self._idle.put(self._acquire())
+
+    def image_to_string(self, image, psm=None) -> str:
+        self.metrics.start_wait()
+        start = time.perf_counter()
+        try:
+            handle = self._acquire()
+        except Exception:
+            self.metrics.end_wait((time.perf_counter() - start) * 1000, False)
+            raise
+        self.metrics.end_wait((time.perf_counter() - start) * 1000, True)
+
+        start = time.perf_counter()
+        ok = False
+        try:
+            if not isinstance(image, Image.Image):
+                image = Image.fromarray(image)
+            handle.SetPageSegMode(tesserocr.PSM.AUTO if psm is None else psm)
+            handle.SetImage(image)
+            text = handle.GetUTF8Text()
+            ok = True
+            return text
+        finally:
+            handle.Clear()
+            self._idle.put(handle)
+            self.metrics.finish((time.perf_counter() - start) * 1000, ok)
+
+    def stats(self):
+        stats = self.metrics.snapshot()
+        stats['handles'] = self._created
+        return stats
+
+
+def _create_engine():
+    """OCR_ENGINE と import できたライブラリからエンジンを選ぶ"""
+    if OCR_ENGINE in ('auto', 'tesserocr') and HAS_TESSEROCR:
+        pool = TesserocrPool()
+        try:
+            pool.warm_up()
+            return pool
+        except Exception as e:
+            # tessdata が見つからない等 → 従来の subprocess に戻す
+            print(f"⚠️ tesserocr 初期化失敗 → subprocess: {e}")
+    if HAS_PYTESSERACT:
+        return SubprocessEngine()
+    return None
 
 
-def extract_text_from_image(image_path: str) -> Optional[str]:
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """OCRエンジン（初回呼び出し時に作成。OCRが使えなければ None）"""
+    global _engine
+    with _engine_lock:
+        if _engine is None and OCR_AVAILABLE:
+            _engine = _create_engine()
+        return _engine
+
+
+def ocr_engine_stats():
+    """/api/stats 用（まだ OCR していなければ None）"""
+    return _engine.stats() if _engine is not None else None
+
+
+# OCRテキストキャッシュ（画像のSHA-256 + OCR条件がキー）
+# 同じ写真の再アップロードや /analyze → /auto-process で OCR をやり直さない
+# OCR_CACHE_DISK=0 ならメモリのみ
+OCR_CACHE_DIR = os.path.join('/tmp', 'ramen_cache', 'ocr')
+OCR_CACHE_DISK = os.environ.get('OCR_CACHE_DISK', '1') != '0'
+ocr_cache = ContentCache('ocr_text', max_entries=512, disk_dir=OCR_CACHE_DIR if OCR_CACHE_DISK else None)
+
+# 数字だけの行
+_NUMBER_LINE_RE = re.compile(r'^[\d\.\-\s]+$')
+# clean_ocr_name: 削除する文字（括弧・感嘆符・疑問符）と、空白にまとめる文字
+_OCR_DELETE_TABLE = delete_chars_table('【】「」『』[]()（）〈〉《》!！?？')
+_OCR_SPACES_RE = re.compile(r'[\d\.\,\:\;\s]+')
+
+
+def extract_text_from_image(source, mode=None, use_cache=True) -> Optional[str]:
     """
     画像からテキストを抽出（日本語OCR）
     Vercel環境（Tesseractなし）でも安全に動作
+    結果は画像の SHA-256 + OCR条件で ocr_cache に保存し、同じ画像では OCR しない
+
+    Args:
+        source: 画像パス または ImageContext（EXIF回転済み画像を共有）
+        mode: 'full' / 'roi'（None なら OCR_MODE）
+        use_cache: False ならキャッシュを読まずに OCR する（ベンチマーク用）
     """
-    if not OCR_AVAILABLE:
-        print("OCR not available (pytesseract not imported)")
+    engine = get_ocr_engine()
+    if engine is None:
+        print("OCR not available (pytesseract/tesserocr not imported)")
         return None
 
-    try:
-        print(f"Running OCR on: {image_path}")
+    mode = mode or OCR_MODE
+    if mode not in OCR_MODES:
+        print(f"⚠️ 不明なOCRモード '{mode}' → full")
+        mode = 'full'
+    if mode == 'roi' and not HAS_CV2:
+        mode = 'full'
 
-        image = Image.open(image_path)
+    try:
+        ctx = ensure_context(source)
+        cache_key = _ocr_cache_key(ctx, mode, engine)
+        cached = ocr_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            print(f"♻️ OCRキャッシュ使用: {ctx.sha256[:12]} (mode={mode})")
+            return cached['text'] or None
 
-        # 画像を前処理（コントラスト向上）
-        # image = image.convert('L')  # グレースケール
+        print(f"Running OCR on: {ctx.path or ctx.sha256[:12]} (mode={mode})")
 
-        # 日本語+英語でOCR
-        text = pytesseract.image_to_string(image, lang='jpn+eng')
+        start = time.perf_counter()
+        if mode == 'roi':
+            text = _ocr_regions(ctx, engine)
+        else:
+            # 日本語+英語でOCR
+            text = engine.image_to_string(ctx.image)
+        print(f"⏱ OCR: {(time.perf_counter() - start) * 1000:.0f}ms (mode={mode})")
 
         if text:
             print(f"OCR result (first 100 chars): {text[:100]}")
         else:
             print("OCR returned empty result")
 
-        return text.strip() if text else None
+        text = text.strip() if text else ''
+        # 文字なしの結果もキャッシュ（例外で失敗したときはキャッシュしない）
+        ocr_cache.put(cache_key, {'text': text})
+        return text or None
 
     except FileNotFoundError as e:
         # Tesseract実行ファイルが見つからない（Vercel環境）
@@ -56,6 +354,124 @@ def extract_text_from_image(image_path: str) -> Optional[str]:
         return None
 
 
+def _ocr_cache_key(ctx, mode, engine):
+    """OCR結果が変わる条件（モード・言語・エンジン・前処理パラメータ）をキーに含める"""
+    params = {'mode': mode, 'lang': OCR_LANG, 'engine': engine.name}
+    if mode == 'roi':
+        params.update(
+            side=OCR_ROI_MAX_SIDE, regions=OCR_ROI_MAX_REGIONS,
+            margin=OCR_ROI_BOWL_MARGIN, pad=OCR_ROI_PADDING, detector=cropper.BOWL_DETECTOR)
+    return make_key(ctx.sha256, **params)
+
+
+def _ocr_regions(ctx, engine) -> str:
+    """roi モード: 文字領域ごとに OCR し、上から順に改行で連結"""
+    gray, bowl_mask = _prepare_roi_image(ctx)
+    regions = detect_text_regions(gray, bowl_mask)
+    print(f"   OCR ROI: {gray.shape[1]}x{gray.shape[0]} 文字領域={len(regions)}")
+
+    lines = []
+    for x, y, w, h in regions:
+        crop = binarize_for_ocr(gray[y:y + h, x:x + w])
+        # 縦長の領域は縦書きの看板として読む
+        psm = 5 if h > w * 1.5 else 6
+        text = engine.image_to_string(crop, psm=psm)
+        if text and text.strip():
+            lines.append(text.strip())
+
+    if lines:
+        return '\n'.join(lines)
+
+    # 文字領域が見つからない / 読めない: どんぶりを除いた縮小画像全体を1回だけ OCR
+    whole = binarize_for_ocr(np.where(bowl_mask, 255, gray).astype(np.uint8))
+    return engine.image_to_string(whole)
+
+
+def _prepare_roi_image(ctx) -> Tuple['np.ndarray', 'np.ndarray']:
+    """
+    長辺 OCR_ROI_MAX_SIDE に縮小したグレースケール画像と、どんぶり領域のマスク（True = 除外）
+    どんぶり検知は cropper.detect_bowl の結果を使う（キャッシュ済み・切り抜きステージが検知中なら再検知しない）
+    """
+    gray = ctx.gray
+    h, w = gray.shape
+    scale = min(1.0, float(OCR_ROI_MAX_SIDE) / max(w, h))
+    if scale < 1.0:
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    small_h, small_w = gray.shape
+    mask = np.zeros((small_h, small_w), dtype=bool)
+    bowl = cropper.detect_bowl(ctx)
+    # 中央ヒューリスティック（検知失敗時の推定）は除外しない
+    if bowl and bowl.get('method') != 'heuristic':
+        cx = bowl['cx'] * small_w
+        cy = bowl['cy'] * small_h
+        r = bowl['r'] * min(small_w, small_h) * OCR_ROI_BOWL_MARGIN
+        yy, xx = np.ogrid[:small_h, :small_w]
+        mask = (xx - cx) ** 2 + (yy - cy) ** 2 <= r * r
+    return gray, mask
+
+
+def detect_text_regions(gray, exclude_mask=None) -> List[Tuple[int, int, int, int]]:
+    """
+    モルフォロジーで文字の塊を検出（EAST などの学習モデルは使わない）
+
+    勾配（文字の輪郭）→ 二値化 → 横・縦に膨張して文字をつなげる → 外接矩形
+    exclude_mask（True = 除外）に中心が入る矩形は捨てる
+
+    Returns:
+        [(x, y, w, h), ...] 面積の大きい順に最大 OCR_ROI_MAX_REGIONS 件を、上から順に並べたもの
+    """
+    h, w = gray.shape
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    if exclude_mask is not None:
+        binary[exclude_mask] = 0
+
+    # 横書き・縦書きの両方をつなげる
+    unit = max(3, min(w, h) // 100)
+    horizontal = cv2.morphologyEx(
+        binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (unit * 6, unit)))
+    vertical = cv2.morphologyEx(
+        binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (unit, unit * 6)))
+    connected = cv2.bitwise_or(horizontal, vertical)
+
+    contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_side = max(8, min(w, h) // 80)
+    max_area = w * h * 0.5
+    boxes = []
+    for contour in contours:
+        x, y, bw, bh = cv2.boundingRect(contour)
+        area = bw * bh
+        if bw < min_side or bh < min_side or area > max_area:
+            continue
+        # 文字の塊は塗りつぶし率がそこそこ高い（細い線・ノイズを除外）
+        fill = cv2.countNonZero(binary[y:y + bh, x:x + bw]) / float(area)
+        if fill < 0.15:
+            continue
+        if exclude_mask is not None and exclude_mask[y + bh // 2, x + bw // 2]:
+            continue
+        pad = OCR_ROI_PADDING
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(w, x + bw + pad), min(h, y + bh + pad)
+        boxes.append((x0, y0, x1 - x0, y1 - y0))
+
+    boxes.sort(key=lambda b: b[2] * b[3], reverse=True)
+    boxes = boxes[:OCR_ROI_MAX_REGIONS]
+    boxes.sort(key=lambda b: (b[1], b[0]))
+    return boxes
+
+
+def binarize_for_ocr(gray):
+    """大津の二値化で白地に黒文字へ揃え、周りに白い余白を付ける（Tesseract は白地黒文字が前提）"""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # 黒い画素の方が多ければ暗い地に明るい文字とみなして反転
+    if cv2.countNonZero(binary) < binary.size / 2:
+        binary = cv2.bitwise_not(binary)
+    return cv2.copyMakeBorder(binary, 10, 10, 10, 10, cv2.BORDER_CONSTANT, value=255)
+
+
 def find_shop_name_in_text(text: str) -> Optional[str]:
     """
     OCR結果から店名候補を抽出
@@ -66,30 +482,21 @@ def find_shop_name_in_text(text: str) -> Optional[str]:
     lines = text.split('\n')
     candidates = []
     
-    # ラーメン関連キーワード
-    ramen_keywords = [
-        'らーめん', 'ラーメン', 'らぁめん', 'ラァメン',
-        '拉麺', '中華そば', '中華麺', 'つけ麺', 'つけめん',
-        '麺屋', '麺処', '麺家', '麺道', '麺や',
-        'らー麺', '担々麺', '味噌', '醤油', '塩', '豚骨',
-    ]
-    
     for line in lines:
         line = line.strip()
         if not line or len(line) < 2:
             continue
         
         # ラーメン関連キーワードを含む行を優先
-        for keyword in ramen_keywords:
-            if keyword in line:
-                print(f"Ramen keyword '{keyword}' found in: {line}")
-                candidates.insert(0, line)
-                break
+        keyword = _RAMEN_KEYWORD_MATCHER.first_keyword(line)
+        if keyword:
+            print(f"Ramen keyword '{keyword}' found in: {line}")
+            candidates.insert(0, line)
         else:
             # 店名っぽい長さ（短すぎず長すぎない）
             if 3 <= len(line) <= 25:
                 # 数字だけの行は除外
-                if not re.match(r'^[\d\.\-\s]+$', line):
+                if not _NUMBER_LINE_RE.match(line):
                     candidates.append(line)
     
     if candidates:
@@ -105,24 +512,25 @@ def clean_ocr_name(text: str) -> str:
     if not text:
         return ""
     
-    # 不要な文字を削除
-    text = re.sub(r'[【】「」『』\[\]\(\)（）〈〉《》]', '', text)
-    text = re.sub(r'[\d\.\,\:\;]+', ' ', text)
-    text = re.sub(r'[!！?？]+', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
+    # 不要な文字（括弧・感嘆符・疑問符）を削除し、数字・句読点・空白の連続を1つの空白に
+    text = text.translate(_OCR_DELETE_TABLE)
+    text = _OCR_SPACES_RE.sub(' ', text).strip()
     
     return text
 
 
-def find_shop_name_from_image(image_path: str) -> Optional[str]:
+def find_shop_name_from_image(source) -> Optional[str]:
     """
     画像から店名を抽出するメイン関数
     Vercel環境でもクラッシュせずNoneを返す
+
+    Args:
+        source: 画像パス または ImageContext
     """
-    print(f"=== OCR Shop Finder: {image_path} ===")
+    print("=== OCR Shop Finder ===")
 
     try:
-        text = extract_text_from_image(image_path)
+        text = extract_text_from_image(source)
         if text:
             result = find_shop_name_in_text(text)
             if result:
@@ -0,0 +1,244 @@
+"""
+ラーメン店キャッシュモジュール - geohashタイル単位のSQLite永続キャッシュ
+同じ店・同じ通りで撮った写真のたびに Overpass API を叩かないよう、
+検索円を覆うタイルのうち未取得・期限切れのタイルだけを Overpass から取得する
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List
+
+from modules.geo_utils import geohash_bbox, geohash_encode, tiles_covering_circle, union_bbox
+
+SHOP_CACHE_PATH = os.environ.get('SHOP_CACHE_PATH', os.path.join('/tmp', 'ramen_cache', 'shops.sqlite3'))
+SHOP_CACHE_ENABLED = os.environ.get('SHOP_CACHE', '1') != '0'
+
+# geohash 精度5 = 約4.9km × 4.9km（北関東では経度方向 約3.9km）
+TILE_PRECISION = 5
+# タイルの有効期限（秒）
+TILE_TTL_SEC = int(os.environ.get('SHOP_CACHE_TTL_SEC', str(7 * 24 * 3600)))
+# 保持するタイル数の上限（超えたら最終アクセスが古い順に削除）
+MAX_TILES = int(os.environ.get('SHOP_CACHE_MAX_TILES', '2000'))
+# 同じタイルを取得中の別リクエストを待つ上限（秒）: Overpass のタイムアウト（20秒）より長め
+FETCH_WAIT_SEC = 30
+
+
+class ShopTileCache:
+    """
+    Overpass の要素（node/way）を geohash タイル単位で保存するキャッシュ
+
+    get_elements() は円を覆うタイルの要素を返す（距離での絞り込みは呼び出し側）
+    Overpass への問い合わせ中はロックを持たない。取得中のタイルは _inflight に Event を置き、
+    同じタイルが必要な別リクエストはその Event を待つ（同じタイルを二重に取得しない）
+    """
+
+    def __init__(self, path=SHOP_CACHE_PATH, precision=TILE_PRECISION,
+                 ttl_sec=TILE_TTL_SEC, max_tiles=MAX_TILES):
+        self.path = path
+        self.precision = precision
+        self.ttl_sec = ttl_sec
+        self.max_tiles = max_tiles
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._initialized = False
+        self.counters = {
+            'tile_hits': 0,
+            'tile_misses': 0,
+            'tile_stale': 0,
+            'fetches': 0,
+            'fetch_errors': 0,
+            'evictions': 0,
+        }
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tiles (
+                    geohash TEXT PRIMARY KEY,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS shops (
+                    geohash TEXT NOT NULL,
+                    osm_key TEXT NOT NULL,
+                    element TEXT NOT NULL,
+                    PRIMARY KEY (geohash, osm_key)
+                );
+            """)
+            self._initialized = True
+        return conn
+
+    def get_elements(self, lat: float, lon: float, radius: float,
+                     fetch_bbox: Callable[[float, float, float, float], List[Dict]]) -> List[Dict]:
+        """
+        円を覆うタイルの Overpass 要素を返す
+
+        Args:
+            fetch_bbox: (south, west, north, east) → Overpass 要素リスト（失敗時は例外）
+        """
+        tiles = tiles_covering_circle(lat, lon, radius, self.precision)
+
+        # ロック内ではタイルの行を読んで、取得するタイルに印を付けるだけ
+        with self._lock:
+            conn = self._connect()
+            try:
+                now = time.time()
+                rows = self._select_tiles(conn, tiles)
+            finally:
+                conn.close()
+            missing = [t for t in tiles if t not in rows]
+            stale = [t for t in tiles if t in rows and now - rows[t] > self.ttl_sec]
+            self.counters['tile_hits'] += len(tiles) - len(missing) - len(stale)
+            self.counters['tile_misses'] += len(missing)
+            self.counters['tile_stale'] += len(stale)
+
+            to_fetch = missing + stale
+            waiting = {self._inflight[t] for t in to_fetch if t in self._inflight}
+            mine = [t for t in to_fetch if t not in self._inflight]
+            done = threading.Event()
+            for t in mine:
+                self._inflight[t] = done
+        print(f"[ShopCache] {len(tiles)} tiles: hit={len(tiles) - len(to_fetch)} "
+              f"miss={len(missing)} stale={len(stale)} in_flight={len(to_fetch) - len(mine)}")
+
+        if mine:
+            try:
+                self._refresh_tiles(mine, fetch_bbox)
+            finally:
+                with self._lock:
+                    for t in mine:
+                        self._inflight.pop(t, None)
+                done.set()
+        for event in waiting:
+            # 取得に失敗していたら、期限切れタイルの古いデータ（なければ空）を使う
+            event.wait(FETCH_WAIT_SEC)
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                now = time.time()
+                conn.executemany("UPDATE tiles SET last_access = ? WHERE geohash = ?",
+                                 [(now, t) for t in tiles])
+                elements = self._select_elements(conn, tiles)
+                self._evict(conn)
+                conn.commit()
+                return elements
+            finally:
+                conn.close()
+
+    def _select_tiles(self, conn, tiles):
+        rows = {}
+        for chunk in _chunks(tiles, 500):
+            marks = ','.join('?' * len(chunk))
+            for geohash, fetched_at in conn.execute(
+                    f"SELECT geohash, fetched_at FROM tiles WHERE geohash IN ({marks})", chunk):
+                rows[geohash] = fetched_at
+        return rows
+
+    def _select_elements(self, conn, tiles):
+        elements = []
+        for chunk in _chunks(tiles, 500):
+            marks = ','.join('?' * len(chunk))
+            for (element,) in conn.execute(
+                    f"SELECT element FROM shops WHERE geohash IN ({marks})", chunk):
+                elements.append(json.loads(element))
+        return elements
+
+    def _refresh_tiles(self, to_fetch, fetch_bbox):
+        """
+        未取得・期限切れタイルを1回の Overpass クエリでまとめて取得
+        問い合わせはロックの外、書き込みだけロック内
+        """
+        south, west, north, east = union_bbox(geohash_bbox(t) for t in to_fetch)
+        try:
+            elements = fetch_bbox(south, west, north, east)
+        except Exception as e:
+            # 失敗時（remark 付きの不完全な応答を含む）は何も書かず、期限切れタイルの古いデータをそのまま使う
+            with self._lock:
+                self.counters['fetches'] += 1
+                self.counters['fetch_errors'] += 1
+            print(f"[ShopCache] Overpass fetch failed, serving cached tiles: {e}")
+            return
+
+        targets = set(to_fetch)
+        per_tile = {t: [] for t in to_fetch}
+        for elem in elements:
+            elem_lat, elem_lon = element_coords(elem)
+            if elem_lat is None:
+                continue
+            tile = geohash_encode(elem_lat, elem_lon, self.precision)
+            if tile in targets:
+                per_tile[tile].append(elem)
+
+        with self._lock:
+            self.counters['fetches'] += 1
+            conn = self._connect()
+            try:
+                now = time.time()
+                for tile, tile_elements in per_tile.items():
+                    conn.execute("DELETE FROM shops WHERE geohash = ?", (tile,))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO shops (geohash, osm_key, element) VALUES (?, ?, ?)",
+                        [(tile, f"{e.get('type')}/{e.get('id')}", json.dumps(e, ensure_ascii=False))
+                         for e in tile_elements])
+                    conn.execute(
+                        "INSERT OR REPLACE INTO tiles (geohash, fetched_at, last_access) VALUES (?, ?, ?)",
+                        (tile, now, now))
+                conn.commit()
+            finally:
+                conn.close()
+        print(f"[ShopCache] Stored {len(elements)} elements into {len(to_fetch)} tiles")
+
+    def _evict(self, conn):
+        (count,) = conn.execute("SELECT COUNT(*) FROM tiles").fetchone()
+        excess = count - self.max_tiles
+        if excess <= 0:
+            return
+        old = [row[0] for row in conn.execute(
+            "SELECT geohash FROM tiles ORDER BY last_access ASC LIMIT ?", (excess,))]
+        for chunk in _chunks(old, 500):
+            marks = ','.join('?' * len(chunk))
+            conn.execute(f"DELETE FROM shops WHERE geohash IN ({marks})", chunk)
+            conn.execute(f"DELETE FROM tiles WHERE geohash IN ({marks})", chunk)
+        self.counters['evictions'] += len(old)
+        print(f"[ShopCache] Evicted {len(old)} tiles (LRU)")
+
+    def stats(self):
+        stats = dict(self.counters)
+        lookups = stats['tile_hits'] + stats['tile_misses'] + stats['tile_stale']
+        stats['hit_rate'] = round(stats['tile_hits'] / lookups, 3) if lookups else None
+        stats['max_tiles'] = self.max_tiles
+        stats['ttl_sec'] = self.ttl_sec
+        stats['in_flight'] = len(self._inflight)
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    stats['tiles'] = conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+                    stats['shops'] = conn.execute("SELECT COUNT(*) FROM shops").fetchone()[0]
+                finally:
+                    conn.close()
+            stats['db_bytes'] = os.path.getsize(self.path)
+        except (sqlite3.Error, OSError):
+            pass
+        return stats
+
+
+def element_coords(elem):
+    """Overpass 要素の座標（way の場合は center）"""
+    if elem.get('type') == 'way':
+        center = elem.get('center', {})
+        return center.get('lat'), center.get('lon')
+    return elem.get('lat'), elem.get('lon')
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+shop_cache = ShopTileCache()
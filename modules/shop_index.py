@@ -0,0 +1,513 @@
+"""
+オフライン ラーメン店インデックス
+OSM抽出（.osm）または Overpass のダンプ（JSON）から cuisine~ramen の店舗を取り込み、
+緯度経度の配列＋グリッド（CSR形式）で近傍検索する。インデックスの範囲内なら
+ネットワークなしで半径検索・k近傍検索ができる
+
+「範囲内」はグリッドのセルごとに記録する（covered）。県境ポリゴン（ダンプに含める）・
+--bbox・.osm の <bounds> の内側に完全に収まるセルだけが範囲内で、隣県にかかるセルは
+Overpass にフォールバックする
+
+使い方:
+    # 群馬・栃木・埼玉・茨城の店舗を Overpass からダンプ
+    python -m modules.shop_index dump data/ramen_shops.json
+    # インデックスを作成
+    python -m modules.shop_index build data/ramen_shops.json [--out data/ramen_shops.npz]
+    # 動作確認
+    python -m modules.shop_index query 36.39 139.06 [--radius 2000] [--k 5]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from modules.geo_utils import circle_bbox, haversine_array
+from modules.shop_cache import element_coords
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHOP_INDEX_PATH = os.environ.get('SHOP_INDEX_PATH', os.path.join(BASE_DIR, 'data', 'ramen_shops.npz'))
+
+# グリッド1マスの大きさ（度）: 約1.1km × 0.9km
+GRID_CELL_DEG = 0.01
+# グリッドの余白（度）: 店舗・県境の範囲をこれだけ広げてグリッドを作る
+REGION_MARGIN_DEG = 0.02
+# 保存する OSM タグ（search_nearby_ramen が参照するものだけ）
+KEEP_TAGS = ('name', 'name:ja', 'cuisine')
+
+
+class ShopIndex:
+    """
+    ラーメン店の配列インデックス
+
+    lats / lons : 店舗の座標（グリッドのセル順に並べ替え済み）
+    offsets     : セル id → lats の開始位置（CSR、セル id = 行 × 列数 + 列）
+    elements    : Overpass 形式の要素（lats と同じ順）
+    region      : グリッドの範囲 (south, west, north, east)
+    covered     : セル id → そのセルの店舗をすべて取り込み済みか（bool、None なら全セル範囲外）
+    """
+
+    def __init__(self, lats, lons, elements, offsets, origin, n_rows, n_cols,
+                 cell_deg, region, covered=None, built_at=None):
+        self.lats = lats
+        self.lons = lons
+        self.elements = elements
+        self.offsets = offsets
+        self.origin = origin
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.cell_deg = cell_deg
+        self.region = region
+        if covered is None:
+            covered = np.zeros(n_rows * n_cols, dtype=bool)
+        self.covered = covered
+        self.built_at = built_at
+
+    def __len__(self):
+        return len(self.lats)
+
+    @classmethod
+    def build(cls, elements, region=None, boundaries=None, cell_deg=GRID_CELL_DEG):
+        """
+        Overpass 形式の要素リストからインデックスを作成
+
+        Args:
+            region: 取り込み済みの範囲 (south, west, north, east)（OSM の bbox 抽出など）
+            boundaries: 取り込み済みの範囲のポリゴン（県境）。load_boundaries の戻り値
+                        どちらもなければ全セル範囲外（インデックスは使われない）
+        """
+        points = []
+        for elem in elements:
+            lat, lon = element_coords(elem)
+            if lat is None or lon is None:
+                continue
+            points.append((lat, lon, elem))
+        if not points:
+            raise ValueError("ラーメン店の要素がありません")
+
+        lats = np.array([p[0] for p in points], dtype=np.float64)
+        lons = np.array([p[1] for p in points], dtype=np.float64)
+        covered_region = region
+        if region is None:
+            all_lats, all_lons = [lats], [lons]
+            for segments in boundaries or []:
+                all_lats.append(segments[:, [0, 2]].ravel())
+                all_lons.append(segments[:, [1, 3]].ravel())
+            all_lats = np.concatenate(all_lats)
+            all_lons = np.concatenate(all_lons)
+            region = (float(all_lats.min()) - REGION_MARGIN_DEG, float(all_lons.min()) - REGION_MARGIN_DEG,
+                      float(all_lats.max()) + REGION_MARGIN_DEG, float(all_lons.max()) + REGION_MARGIN_DEG)
+        south, west, north, east = region
+        n_rows = int(np.ceil((north - south) / cell_deg)) + 1
+        n_cols = int(np.ceil((east - west) / cell_deg)) + 1
+
+        covered = np.zeros(n_rows * n_cols, dtype=bool)
+        if covered_region is not None:
+            covered |= _rect_mask((south, west), n_rows, n_cols, cell_deg, covered_region)
+        if boundaries:
+            covered |= _polygon_mask((south, west), n_rows, n_cols, cell_deg, boundaries)
+        if not covered.any():
+            print("⚠️ [ShopIndex] 取り込み範囲（県境 / --bbox）がないため、インデックスは使われません")
+
+        rows = np.clip(((lats - south) / cell_deg).astype(np.int64), 0, n_rows - 1)
+        cols = np.clip(((lons - west) / cell_deg).astype(np.int64), 0, n_cols - 1)
+        cell_ids = rows * n_cols + cols
+        order = np.argsort(cell_ids, kind='stable')
+        counts = np.bincount(cell_ids, minlength=n_rows * n_cols)
+        offsets = np.zeros(n_rows * n_cols + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return cls(lats[order], lons[order], [points[i][2] for i in order], offsets,
+                   (south, west), n_rows, n_cols, cell_deg, tuple(region), covered=covered,
+                   built_at=time.time())
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        meta = {
+            'origin': list(self.origin),
+            'n_rows': self.n_rows,
+            'n_cols': self.n_cols,
+            'cell_deg': self.cell_deg,
+            'region': list(self.region),
+            'built_at': self.built_at,
+        }
+        np.savez_compressed(
+            path,
+            lats=self.lats,
+            lons=self.lons,
+            offsets=self.offsets,
+            covered=self.covered,
+            elements=np.array(json.dumps(self.elements, ensure_ascii=False)),
+            meta=np.array(json.dumps(meta)),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            # covered のない古いインデックスは範囲が分からないので使わない（作り直す）
+            covered = data['covered'] if 'covered' in data.files else None
+            if covered is None:
+                print("⚠️ [ShopIndex] 取り込み範囲の記録がありません。build し直してください")
+            return cls(
+                data['lats'], data['lons'], json.loads(str(data['elements'])), data['offsets'],
+                tuple(meta['origin']), meta['n_rows'], meta['n_cols'], meta['cell_deg'],
+                tuple(meta['region']), covered=covered, built_at=meta.get('built_at'),
+            )
+
+    def _cell_range(self, lat, lon, radius):
+        """検索円の外接矩形がかかるセルの (行の範囲, 列の範囲)（グリッド外にはみ出す分も含む）"""
+        south, west, north, east = circle_bbox(lat, lon, radius)
+        o_lat, o_lon = self.origin
+        return (int((south - o_lat) // self.cell_deg), int((north - o_lat) // self.cell_deg),
+                int((west - o_lon) // self.cell_deg), int((east - o_lon) // self.cell_deg))
+
+    def covers(self, lat, lon, radius):
+        """検索円がかかるセルがすべて取り込み済みか（1つでも範囲外なら Overpass を使う）"""
+        r_lo, r_hi, c_lo, c_hi = self._cell_range(lat, lon, radius)
+        if r_lo < 0 or c_lo < 0 or r_hi >= self.n_rows or c_hi >= self.n_cols:
+            return False
+        mask = self.covered.reshape(self.n_rows, self.n_cols)
+        return bool(mask[r_lo:r_hi + 1, c_lo:c_hi + 1].all())
+
+    def query_radius(self, lat, lon, radius):
+        """
+        半径検索
+
+        Returns:
+            (要素の位置の配列, 距離の配列) 距離の近い順
+        """
+        r_lo, r_hi, c_lo, c_hi = self._cell_range(lat, lon, radius)
+        r_lo, r_hi = max(0, r_lo), min(self.n_rows - 1, r_hi)
+        c_lo, c_hi = max(0, c_lo), min(self.n_cols - 1, c_hi)
+        if r_lo > r_hi or c_lo > c_hi:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # 1行分のセルは CSR 上で連続しているので行ごとにスライスするだけ
+        base = np.arange(r_lo, r_hi + 1) * self.n_cols
+        starts = self.offsets[base + c_lo]
+        ends = self.offsets[base + c_hi + 1]
+        idx = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        if len(idx) == 0:
+            return idx, np.empty(0)
+
+        dist = haversine_array(lat, lon, self.lats[idx], self.lons[idx])
+        keep = dist <= radius
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind='stable')
+        return idx[order], dist[order]
+
+    def elements_within(self, lat, lon, radius):
+        """半径内の Overpass 形式の要素（距離の近い順）"""
+        idx, _ = self.query_radius(lat, lon, radius)
+        return [self.elements[i] for i in idx]
+
+    def nearest(self, lat, lon, k=5, max_radius=20000):
+        """
+        k近傍検索（max_radius まで検索範囲を倍々に広げる）
+
+        Returns:
+            [(要素, 距離), ...] 距離の近い順
+        """
+        radius = 1000.0
+        while True:
+            idx, dist = self.query_radius(lat, lon, radius)
+            if len(idx) >= k or radius >= max_radius:
+                return [(self.elements[i], float(d)) for i, d in zip(idx[:k], dist[:k])]
+            radius = min(radius * 2, max_radius)
+
+    def stats(self):
+        return {
+            'shops': len(self),
+            'region': list(self.region),
+            'cells': self.n_rows * self.n_cols,
+            'covered_cells': int(self.covered.sum()),
+            'built_at': self.built_at,
+        }
+
+
+def _corner_coords(origin, n_rows, n_cols, cell_deg):
+    south, west = origin
+    return south + np.arange(n_rows + 1) * cell_deg, west + np.arange(n_cols + 1) * cell_deg
+
+
+def _rect_mask(origin, n_rows, n_cols, cell_deg, rect):
+    """矩形 rect の内側に完全に収まるセル"""
+    south, west, north, east = rect
+    eps = cell_deg * 1e-6
+    corner_lats, corner_lons = _corner_coords(origin, n_rows, n_cols, cell_deg)
+    rows_in = (corner_lats[:-1] >= south - eps) & (corner_lats[1:] <= north + eps)
+    cols_in = (corner_lons[:-1] >= west - eps) & (corner_lons[1:] <= east + eps)
+    return np.outer(rows_in, cols_in).ravel()
+
+
+def _points_inside(corner_lats, corner_lons, segments):
+    """
+    格子点が多角形の内側か（偶奇判定、リングに組み立てなくても辺の集合だけで判定できる）
+
+    Args:
+        segments: 辺の配列 (n, 4) = (lat1, lon1, lat2, lon2)
+    """
+    lat1, lon1, lat2, lon2 = segments.T
+    inside = np.zeros((len(corner_lats), len(corner_lons)), dtype=bool)
+    for i, y in enumerate(corner_lats):
+        # 緯度 y の東西線と交わる辺の交点の経度
+        crossing = (lat1 > y) != (lat2 > y)
+        if not crossing.any():
+            continue
+        a1, o1, a2, o2 = lat1[crossing], lon1[crossing], lat2[crossing], lon2[crossing]
+        xs = np.sort(o1 + (y - a1) * (o2 - o1) / (a2 - a1))
+        # 西側にある交点の数が奇数なら内側
+        inside[i] = np.searchsorted(xs, corner_lons) % 2 == 1
+    return inside
+
+
+def _polygon_mask(origin, n_rows, n_cols, cell_deg, boundaries):
+    """
+    いずれかのポリゴンの内側に完全に収まるセル
+    （4隅が同じポリゴンの内側で、セル内に境界の頂点がない）
+    """
+    corner_lats, corner_lons = _corner_coords(origin, n_rows, n_cols, cell_deg)
+    south, west = origin
+    covered = np.zeros((n_rows, n_cols), dtype=bool)
+    has_vertex = np.zeros((n_rows, n_cols), dtype=bool)
+    for segments in boundaries:
+        inside = _points_inside(corner_lats, corner_lons, segments)
+        covered |= inside[:-1, :-1] & inside[1:, :-1] & inside[:-1, 1:] & inside[1:, 1:]
+        rows = ((segments[:, 0] - south) // cell_deg).astype(np.int64)
+        cols = ((segments[:, 1] - west) // cell_deg).astype(np.int64)
+        ok = (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+        has_vertex[rows[ok], cols[ok]] = True
+    return (covered & ~has_vertex).ravel()
+
+
+def _slim(elem_type, elem_id, lat, lon, tags):
+    """インデックスに保存する要素（search_nearby_ramen が使う項目だけ）"""
+    elem = {'type': elem_type, 'id': elem_id,
+            'tags': {k: tags[k] for k in KEEP_TAGS if k in tags}}
+    if elem_type == 'way':
+        elem['center'] = {'lat': lat, 'lon': lon}
+    else:
+        elem['lat'], elem['lon'] = lat, lon
+    return elem
+
+
+def _is_ramen(tags):
+    return 'ramen' in tags.get('cuisine', '').lower()
+
+
+def load_overpass_json(path):
+    """Overpass の JSON 出力（out body center）を読み込む"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    elements = []
+    for elem in data.get('elements', []):
+        tags = elem.get('tags', {})
+        if elem.get('type') not in ('node', 'way') or not _is_ramen(tags):
+            continue
+        lat, lon = element_coords(elem)
+        if lat is None or lon is None:
+            continue
+        elements.append(_slim(elem['type'], elem['id'], lat, lon, tags))
+    return elements
+
+
+def load_boundaries(path):
+    """
+    Overpass の JSON 出力に含まれる県境（relation の out geom）を辺の配列にする
+
+    Returns:
+        [辺の配列 (n, 4) = (lat1, lon1, lat2, lon2), ...] relation ごと
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    boundaries = []
+    for elem in data.get('elements', []):
+        if elem.get('type') != 'relation':
+            continue
+        segments = []
+        for member in elem.get('members', []):
+            if member.get('type') != 'way' or member.get('role') not in ('outer', 'inner'):
+                continue
+            geometry = member.get('geometry') or []
+            for a, b in zip(geometry, geometry[1:]):
+                # 取得できなかったノードは null になる
+                if a and b:
+                    segments.append((a['lat'], a['lon'], b['lat'], b['lon']))
+        if segments:
+            boundaries.append(np.array(segments, dtype=np.float64))
+    return boundaries
+
+
+def load_osm_bounds(path):
+    """OSM XML の <bounds>（抽出範囲）を (south, west, north, east) で返す（なければ None）"""
+    for _, el in ET.iterparse(path, events=('start',)):
+        if el.tag == 'bounds':
+            return (float(el.get('minlat')), float(el.get('minlon')),
+                    float(el.get('maxlat')), float(el.get('maxlon')))
+        if el.tag in ('node', 'way', 'relation'):
+            return None
+    return None
+
+
+def load_osm_xml(path):
+    """
+    OSM XML（.osm）を読み込む
+    way の座標は構成ノードの範囲の中心（Overpass の out center と同じ）
+    """
+    node_coords = {}
+    ramen_ways = []
+    elements = []
+    for _, el in ET.iterparse(path, events=('end',)):
+        if el.tag == 'node':
+            lat, lon = float(el.get('lat')), float(el.get('lon'))
+            node_id = int(el.get('id'))
+            node_coords[node_id] = (lat, lon)
+            tags = {t.get('k'): t.get('v') for t in el.findall('tag')}
+            if _is_ramen(tags):
+                elements.append(_slim('node', node_id, lat, lon, tags))
+            el.clear()
+        elif el.tag == 'way':
+            tags = {t.get('k'): t.get('v') for t in el.findall('tag')}
+            if _is_ramen(tags):
+                refs = [int(nd.get('ref')) for nd in el.findall('nd')]
+                ramen_ways.append((int(el.get('id')), refs, tags))
+            el.clear()
+
+    for way_id, refs, tags in ramen_ways:
+        coords = [node_coords[r] for r in refs if r in node_coords]
+        if not coords:
+            continue
+        lats = [c[0] for c in coords]
+        lons = [c[1] for c in coords]
+        lat = (min(lats) + max(lats)) / 2
+        lon = (min(lons) + max(lons)) / 2
+        elements.append(_slim('way', way_id, lat, lon, tags))
+    return elements
+
+
+def load_elements(path):
+    if path.endswith('.osm') or path.endswith('.xml'):
+        return load_osm_xml(path)
+    return load_overpass_json(path)
+
+
+def dump_prefectures(out_path, prefectures=None):
+    """
+    対象県（news_scraper.URLS と同じ4県）のラーメン店を Overpass から JSON で保存
+    インデックスの範囲にするため、県境（relation）も形状付きで含める
+    """
+    import requests
+    from modules.gps_shop_finder import OVERPASS_URL, overpass_elements
+
+    if prefectures is None:
+        from modules.news_scraper import URLS
+        prefectures = [f"{name}県" for _, name in URLS]
+
+    areas = ''.join(f'area["name"="{p}"]["admin_level"="4"];' for p in prefectures)
+    query = f"""
+    [out:json][timeout:180];
+    ({areas})->.pref;
+    (
+      node["cuisine"~"ramen"](area.pref);
+      way["cuisine"~"ramen"](area.pref);
+    );
+    out body center;
+    rel(pivot.pref);
+    out geom;
+    """
+    print(f"[ShopIndex] Dumping {', '.join(prefectures)} from Overpass...")
+    response = requests.post(OVERPASS_URL, data={'data': query}, timeout=240)
+    response.raise_for_status()
+    # remark 付き（タイムアウトなど）は一部の県が欠けているので保存しない
+    elements = overpass_elements(response.json())
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, 'wb') as f:
+        f.write(response.content)
+    print(f"[ShopIndex] Saved {len(elements)} elements → {out_path}")
+
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_shop_index():
+    """SHOP_INDEX_PATH のインデックス（なければ None、初回のみ読み込み）"""
+    global _index, _index_loaded
+    if _index_loaded:
+        return _index
+    with _index_lock:
+        if not _index_loaded:
+            if os.path.exists(SHOP_INDEX_PATH):
+                try:
+                    _index = ShopIndex.load(SHOP_INDEX_PATH)
+                    print(f"[ShopIndex] Loaded {len(_index)} shops from {SHOP_INDEX_PATH}")
+                except Exception as e:
+                    print(f"[ShopIndex] Load error: {e}")
+            _index_loaded = True
+    return _index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='オフライン ラーメン店インデックス')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_dump = sub.add_parser('dump', help='対象県のラーメン店を Overpass からダンプ')
+    p_dump.add_argument('out')
+
+    p_build = sub.add_parser('build', help='Overpass JSON / OSM XML からインデックスを作成')
+    p_build.add_argument('source')
+    p_build.add_argument('--out', default=SHOP_INDEX_PATH)
+    p_build.add_argument('--bbox', nargs=4, type=float, metavar=('S', 'W', 'N', 'E'),
+                         help='取り込み済みの範囲（省略時はダンプの県境 / .osm の <bounds>）')
+
+    p_query = sub.add_parser('query', help='インデックスを検索')
+    p_query.add_argument('lat', type=float)
+    p_query.add_argument('lon', type=float)
+    p_query.add_argument('--radius', type=float, default=500)
+    p_query.add_argument('--k', type=int, default=5)
+    p_query.add_argument('--index', default=SHOP_INDEX_PATH)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'dump':
+        dump_prefectures(args.out)
+    elif args.command == 'build':
+        elements = load_elements(args.source)
+        region = tuple(args.bbox) if args.bbox else None
+        boundaries = None
+        if region is None:
+            if args.source.endswith('.osm') or args.source.endswith('.xml'):
+                region = load_osm_bounds(args.source)
+            else:
+                boundaries = load_boundaries(args.source)
+        index = ShopIndex.build(elements, region=region, boundaries=boundaries)
+        index.save(args.out)
+        print(f"[ShopIndex] {len(index)} shops, region={index.region}, "
+              f"covered={int(index.covered.sum())}/{len(index.covered)} cells → {args.out}")
+    elif args.command == 'query':
+        index = ShopIndex.load(args.index)
+        if not index.covers(args.lat, args.lon, args.radius):
+            print("⚠️ インデックスの範囲外です")
+        start = time.perf_counter()
+        idx, dist = index.query_radius(args.lat, args.lon, args.radius)
+        radius_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        near = index.nearest(args.lat, args.lon, args.k)
+        knn_ms = (time.perf_counter() - start) * 1000
+        print(f"半径{args.radius:.0f}m: {len(idx)}件 ({radius_ms:.3f}ms)")
+        for i, d in zip(idx[:10], dist[:10]):
+            print(f"  {index.elements[i]['tags'].get('name', '?')} ({d:.0f}m)")
+        print(f"近傍{args.k}件 ({knn_ms:.3f}ms)")
+        for elem, d in near:
+            print(f"  {elem['tags'].get('name', '?')} ({d:.0f}m)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
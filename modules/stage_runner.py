@@ -0,0 +1,74 @@
+"""
+ステージ並列実行モジュール
+/analyze の OCR・GPS店舗検索・どんぶり切り抜きは互いに独立しているので、
+共有スレッドプールで同時に実行し、リクエストごとの締め切りまでに終わった結果だけを使う
+（Tesseract・OpenCV は GIL を解放し、Overpass はネットワーク待ちなのでスレッドで十分）
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+import os
+import time
+
+# 同時に動かすステージ数の上限（全リクエストで共有）
+STAGE_WORKERS = int(os.environ.get('STAGE_WORKERS', '4'))
+
+_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix='stage')
+
+
+class StageResult:
+    """1ステージの実行結果"""
+
+    def __init__(self, name, value=None, error=None, elapsed_ms=None, timed_out=False):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.elapsed_ms = elapsed_ms
+        self.timed_out = timed_out
+
+    @property
+    def ok(self):
+        return self.error is None and not self.timed_out
+
+    def summary(self):
+        if self.timed_out:
+            return 'timeout'
+        if self.error is not None:
+            return f"error: {str(self.error)[:30]}"
+        return f"{self.elapsed_ms:.0f}ms"
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - start) * 1000
+
+
+def run_stages(stages, deadline):
+    """
+    ステージを並列実行し、全て終わるか締め切りに達するまで待つ
+
+    Args:
+        stages: {名前: 引数なしの関数}
+        deadline: time.monotonic() 基準の締め切り時刻
+
+    Returns:
+        {名前: StageResult} 締め切りまでに終わらなかったステージは timed_out=True
+        （実行中のスレッドは止められないので、結果は捨てられる）
+    """
+    futures = {name: _executor.submit(_timed, fn) for name, fn in stages.items()}
+    wait(list(futures.values()), timeout=max(0.0, deadline - time.monotonic()))
+
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            print(f"⏱ ステージ '{name}' が締め切りまでに終わりませんでした")
+            results[name] = StageResult(name, timed_out=True)
+            continue
+        try:
+            value, elapsed_ms = future.result()
+            results[name] = StageResult(name, value=value, elapsed_ms=elapsed_ms)
+            print(f"⏱ ステージ '{name}': {elapsed_ms:.0f}ms")
+        except Exception as e:
+            print(f"⚠️ ステージ '{name}' エラー: {e}")
+            results[name] = StageResult(name, error=e)
+    return results
@@ -0,0 +1,331 @@
+"""
+/tmp ストレージ管理モジュール - ramen_in（元画像）と ramen_out（切り抜き・ラベル付きの派生画像）の容量管理
+
+ファイルごとにバイト数・最終アクセス時刻・作り方（レシピ）・内容のハッシュ（ETag）を SQLite に記録し、
+合計が STORAGE_BUDGET_MB を超えたら最終アクセスの古い順に削除する（LRU）
+
+  - 派生画像は行（レシピ）を残してファイルだけ消す → ensure() で元画像から作り直す
+  - 元画像を消すときは、作り直せなくなる派生画像も一緒に消す
+  - 派生画像へのアクセスは元画像の最終アクセスも更新する（元画像が先に消えない）
+
+レシピは {'kind': ..., その他パラメータ} の dict。kind ごとの作り方は register_recipe で登録する
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+STORAGE_DB_PATH = os.environ.get('STORAGE_DB_PATH', os.path.join('/tmp', 'ramen_cache', 'storage.sqlite3'))
+# Vercel の /tmp は 512MB（キャッシュ類の分を残す。ContentCache の JSON は件数で上限あり）
+STORAGE_BUDGET_MB = float(os.environ.get('STORAGE_BUDGET_MB', '300'))
+
+
+class StorageManager:
+    """
+    元画像・派生画像の LRU 管理
+
+    Args:
+        path: SQLite のパス
+        budget_bytes: 合計サイズの上限
+    """
+
+    def __init__(self, path=STORAGE_DB_PATH, budget_bytes=int(STORAGE_BUDGET_MB * 1024 * 1024)):
+        self.path = path
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._recipes: Dict[str, Callable] = {}
+        self._regen_locks: Dict[str, threading.Lock] = {}
+        self.counters = {'added': 0, 'evicted': 0, 'evicted_bytes': 0, 'regenerated': 0,
+                         'regenerate_failed': 0, 'missing': 0}
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    path TEXT PRIMARY KEY,
+                    source TEXT,
+                    recipe TEXT,
+                    size INTEGER NOT NULL,
+                    present INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    etag TEXT
+                );
+                CREATE INDEX IF NOT EXISTS blobs_lru ON blobs (present, last_access);
+                CREATE INDEX IF NOT EXISTS blobs_source ON blobs (source);
+            """)
+            # etag 列のない古い DB
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(blobs)")}
+            if 'etag' not in columns:
+                conn.execute("ALTER TABLE blobs ADD COLUMN etag TEXT")
+            self._initialized = True
+        return conn
+
+    def register_recipe(self, kind, func):
+        """
+        派生画像の作り方を登録
+
+        Args:
+            func: func(recipe, source_path, output_path) → 成功なら True
+        """
+        self._recipes[kind] = func
+
+    # ----------------------------------------
+    # 記録・アクセス
+    # ----------------------------------------
+
+    def add(self, path, source=None, recipe=None, now=None):
+        """
+        書き込んだファイルを記録して、予算を超えていれば古いものを消す
+
+        Args:
+            source: 派生画像の元画像のパス（元画像自身なら None）
+            recipe: 派生画像の作り方（None なら作り直せない）
+        """
+        now = time.time() if now is None else now
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        size = st.st_size
+        if source and st.st_nlink > 1 and os.path.exists(source) and os.path.samefile(path, source):
+            # 元画像へのハードリンクは容量を使わない
+            size = 0
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO blobs (path, source, recipe, size, present, last_access) "
+                    "VALUES (?, ?, ?, ?, 1, ?)",
+                    (path, source, json.dumps(recipe, ensure_ascii=False) if recipe else None, size, now))
+                if source:
+                    conn.execute("UPDATE blobs SET last_access = ? WHERE path = ?", (now, source))
+                conn.commit()
+            finally:
+                conn.close()
+            self.counters['added'] += 1
+        self.enforce_budget(keep=(path, source))
+
+    def touch(self, path, now=None):
+        """アクセスを記録（派生画像なら元画像も）"""
+        now = time.time() if now is None else now
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT source FROM blobs WHERE path = ?", (path,)).fetchone()
+                if row is None:
+                    return
+                conn.executemany("UPDATE blobs SET last_access = ? WHERE path = ?",
+                                 [(now, p) for p in (path, row['source']) if p])
+                conn.commit()
+            finally:
+                conn.close()
+
+    def ensure(self, path) -> bool:
+        """
+        ファイルがあればアクセスを記録して True、
+        消えていればレシピから作り直す（作り直せなければ False）
+        """
+        if os.path.exists(path):
+            self.touch(path)
+            return True
+
+        row = self._get(path)
+        if row is None or not row['recipe']:
+            self.counters['missing'] += 1
+            return False
+
+        with self._lock:
+            regen_lock = self._regen_locks.setdefault(path, threading.Lock())
+        try:
+            with regen_lock:
+                if os.path.exists(path):
+                    # 同時リクエストが先に作り直した
+                    self.touch(path)
+                    return True
+                return self._regenerate(row)
+        finally:
+            with self._lock:
+                self._regen_locks.pop(path, None)
+
+    def _regenerate(self, row) -> bool:
+        path, source = row['path'], row['source']
+        recipe = json.loads(row['recipe'])
+        func = self._recipes.get(recipe.get('kind'))
+        if func is None or not source or not os.path.exists(source):
+            self.counters['regenerate_failed'] += 1
+            return False
+        start = time.perf_counter()
+        try:
+            ok = func(recipe, source, path)
+        except Exception as e:
+            print(f"❌ 再生成エラー: {path}: {e}")
+            ok = False
+        if not ok or not os.path.exists(path):
+            self.counters['regenerate_failed'] += 1
+            return False
+        self.counters['regenerated'] += 1
+        print(f"♻️ 再生成: {os.path.basename(path)} ({recipe['kind']}, "
+              f"{(time.perf_counter() - start) * 1000:.0f}ms)")
+        self.add(path, source=source, recipe=recipe)
+        return True
+
+    def etag(self, path) -> Optional[str]:
+        """
+        ファイル内容の SHA-256（初回だけファイルを読んで記録、書き直すと add() で消える）
+        記録のないファイルは毎回計算する
+        """
+        row = self._get(path)
+        if row is not None and row['etag']:
+            return row['etag']
+        try:
+            before = os.stat(path)
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            after = os.stat(path)
+        except OSError:
+            return None
+        etag = digest.hexdigest()
+        if row is not None and (before.st_mtime_ns, before.st_size) == (after.st_mtime_ns, after.st_size):
+            with self._lock:
+                conn = self._connect()
+                try:
+                    conn.execute("UPDATE blobs SET etag = ? WHERE path = ? AND present = 1", (etag, path))
+                    conn.commit()
+                finally:
+                    conn.close()
+        return etag
+
+    def _get(self, path):
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute("SELECT * FROM blobs WHERE path = ?", (path,)).fetchone()
+            finally:
+                conn.close()
+
+    # ----------------------------------------
+    # 削除（LRU）
+    # ----------------------------------------
+
+    def enforce_budget(self, keep=()):
+        """
+        合計が budget_bytes 以下になるまで最終アクセスの古い順に消す
+
+        Args:
+            keep: 消さないパス（いま書いた・返そうとしているファイル）
+        """
+        keep = {p for p in keep if p}
+        with self._lock:
+            conn = self._connect()
+            try:
+                (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs WHERE present = 1").fetchone()
+                if total <= self.budget_bytes:
+                    return
+                rows = conn.execute(
+                    "SELECT path, source, recipe, size FROM blobs WHERE present = 1 "
+                    "ORDER BY last_access").fetchall()
+                gone = set()
+                for row in rows:
+                    if total <= self.budget_bytes:
+                        break
+                    if row['path'] in keep or row['path'] in gone:
+                        continue
+                    total -= self._evict(conn, row, gone)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _evict(self, conn, row, gone) -> int:
+        """1件消して（消したパスは gone に追加）、減ったバイト数を返す"""
+        freed = row['size']
+        _remove(row['path'])
+        gone.add(row['path'])
+        if row['source'] and row['recipe']:
+            # 派生画像: 行は残して作り直せるようにする
+            conn.execute("UPDATE blobs SET present = 0, size = 0, etag = NULL WHERE path = ?", (row['path'],))
+        else:
+            # 元画像（作り直せない）: 派生画像も一緒に消す
+            conn.execute("DELETE FROM blobs WHERE path = ?", (row['path'],))
+            for child in conn.execute(
+                    "SELECT path, size, present FROM blobs WHERE source = ?", (row['path'],)).fetchall():
+                gone.add(child['path'])
+                if child['present']:
+                    _remove(child['path'])
+                    freed += child['size']
+                    self.counters['evicted'] += 1
+            conn.execute("DELETE FROM blobs WHERE source = ?", (row['path'],))
+        self.counters['evicted'] += 1
+        self.counters['evicted_bytes'] += freed
+        print(f"🧹 削除: {os.path.basename(row['path'])} ({freed // 1024}KB)")
+        return freed
+
+    def scan(self, directories, now=None):
+        """
+        記録のないファイル（再起動前の残りなど）を元画像として記録する
+        最終アクセスは mtime
+        """
+        now = time.time() if now is None else now
+        found = []
+        for directory in directories:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    st = entry.stat()
+                    found.append((entry.path, st.st_size, min(st.st_mtime, now)))
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO blobs (path, source, recipe, size, present, last_access) "
+                    "VALUES (?, NULL, NULL, ?, 1, ?)", found)
+                # ファイルが外から消されていたら記録も合わせる
+                for row in conn.execute("SELECT path, source, recipe FROM blobs WHERE present = 1").fetchall():
+                    if not os.path.exists(row['path']):
+                        if row['source'] and row['recipe']:
+                            conn.execute("UPDATE blobs SET present = 0, size = 0, etag = NULL WHERE path = ?", (row['path'],))
+                        else:
+                            conn.execute("DELETE FROM blobs WHERE path = ?", (row['path'],))
+                conn.commit()
+            finally:
+                conn.close()
+        self.enforce_budget()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['budget_bytes'] = self.budget_bytes
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    row = conn.execute(
+                        "SELECT COALESCE(SUM(size), 0), SUM(present = 1), SUM(present = 0) FROM blobs").fetchone()
+                finally:
+                    conn.close()
+            stats['bytes'], stats['files'], stats['evicted_recipes'] = row[0], row[1] or 0, row[2] or 0
+        except sqlite3.Error:
+            pass
+        return stats
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"⚠️ 削除失敗: {path}: {e}")
+
+
+storage_manager = StorageManager()
@@ -0,0 +1,113 @@
+"""
+テキスト正規化エンジン
+店名・地名のクリーニング（news_scraper・ocr_reader・gps_shop_finder）で共有する
+プリコンパイル済みのキーワード照合と正規表現
+
+どの処理も、キーワードを1つずつ str.replace / re.sub していた従来の実装と
+同じ結果になる（scripts/check_text_normalizer.py で確認）
+"""
+import re
+from typing import Dict, Iterable, Optional
+
+
+class KeywordMatcher:
+    """
+    複数キーワードの同時照合
+
+    全キーワードを1つの正規表現（最長一致優先の選択）にプリコンパイルし、
+    「どれか含まれるか」を C 実装の1回の走査で判定する。
+    どれも含まれない入力（大半の店名）はそれ以上調べずに返し、
+    含まれる場合だけキーワードごとの処理を従来と同じ順番で行う
+
+    Args:
+        keywords: キーワードのリスト（順番 = 優先順位）
+        ignore_case: True なら小文字化して照合（kw.lower() in text.lower() と同じ）
+    """
+
+    def __init__(self, keywords: Iterable[str], ignore_case: bool = False):
+        self.keywords = list(keywords)
+        self.ignore_case = ignore_case
+        self._targets = [kw.lower() for kw in self.keywords] if ignore_case else list(self.keywords)
+        alternatives = sorted({kw for kw in self._targets if kw}, key=len, reverse=True)
+        self._regex = re.compile('|'.join(map(re.escape, alternatives))) if alternatives else None
+        # 空文字のキーワードはどの文字列にも含まれる
+        self._has_empty = '' in self._targets
+
+    def _prepare(self, text: str) -> str:
+        return text.lower() if self.ignore_case else text
+
+    def _any(self, text: str) -> bool:
+        if self._has_empty:
+            return True
+        return self._regex is not None and self._regex.search(text) is not None
+
+    def contains_any(self, text: str) -> bool:
+        """いずれかのキーワードを含むか"""
+        return self._any(self._prepare(text))
+
+    def first_keyword(self, text: str) -> Optional[str]:
+        """text に含まれるキーワードのうちリストで最も前のもの"""
+        text = self._prepare(text)
+        if not self._any(text):
+            return None
+        for kw, target in zip(self.keywords, self._targets):
+            if target in text:
+                return kw
+        return None
+
+    def replace_sequential(self, text: str, repl: str) -> str:
+        """for kw in keywords: text = text.replace(kw, repl) と同じ結果"""
+        if self.ignore_case:
+            raise ValueError("replace_sequential は ignore_case=False のみ対応")
+        if not self._any(text):
+            return text
+        for kw in self.keywords:
+            if kw in text:
+                text = text.replace(kw, repl)
+        return text
+
+    def cut_before_first(self, text: str) -> str:
+        """
+        for kw in keywords:
+            if kw in text: text = text[:text.find(kw)]
+        と同じ結果
+        """
+        if self.ignore_case:
+            raise ValueError("cut_before_first は ignore_case=False のみ対応")
+        if not self._any(text):
+            return text
+        for kw in self.keywords:
+            idx = text.find(kw)
+            if idx >= 0:
+                text = text[:idx]
+        return text
+
+
+def has_any_char(text: str, chars: str) -> bool:
+    """text に chars のいずれかの文字が含まれるか"""
+    return any(ch in text for ch in chars)
+
+
+class GuardedSub:
+    """
+    必須の文字列を含むときだけ実行する re.sub（プリコンパイル済み）
+    必須文字列を含まない入力では正規表現エンジンを起動しない
+    """
+
+    def __init__(self, pattern: str, repl: str, required: str = '', any_of: str = ''):
+        self.regex = re.compile(pattern)
+        self.repl = repl
+        self.required = required
+        self.any_of = any_of
+
+    def __call__(self, text: str) -> str:
+        if self.required and self.required not in text:
+            return text
+        if self.any_of and not has_any_char(text, self.any_of):
+            return text
+        return self.regex.sub(self.repl, text)
+
+
+def delete_chars_table(chars: str) -> Dict[int, None]:
+    """str.translate 用の削除テーブル"""
+    return {ord(ch): None for ch in chars}
@@ -0,0 +1,192 @@
+"""
+アップロード取り込みモジュール
+アップロードをチャンクごとに /tmp へ書きながら SHA-256 を計算し、内容のハッシュを名前にして保存する
+
+  - ファイル名は <SHA-256>.<拡張子>（同じ秒・同じ名前のアップロードが上書きし合わない）
+  - 同じ写真が既にあれば書き込まずに一時ファイルを捨てる
+  - 同じ内容を別の場所にも置くときはハードリンク（コピーしない）
+  - /analyze・/auto-process のレスポンスを写真ごとに覚えておき、再アップロードでは即返す
+    （店名・候補は店舗データから決まるので、タイルキャッシュと同じ期限で捨てる。
+      オフラインインデックスを作り直したときもキーが変わって使われなくなる）
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+from modules.content_cache import ContentCache, make_key
+from modules.image_context import ImageContext
+from modules.shop_cache import TILE_TTL_SEC
+from modules.shop_index import get_shop_index
+
+CHUNK_SIZE = 1 << 20
+
+# 処理結果のキャッシュ（UPLOAD_RESULT_CACHE=0 で無効）
+UPLOAD_RESULT_CACHE = os.environ.get('UPLOAD_RESULT_CACHE', '1') != '0'
+RESULT_CACHE_DIR = os.path.join('/tmp', 'ramen_cache', 'upload_results')
+# 処理結果の有効期限（秒）: 既定は店舗タイルキャッシュの有効期限と同じ
+UPLOAD_RESULT_TTL_SEC = int(os.environ.get('UPLOAD_RESULT_TTL_SEC', str(TILE_TTL_SEC)))
+
+
+class StoredUpload:
+    """保存済みのアップロード（filename は UPLOAD_FOLDER 内のファイル名）"""
+
+    def __init__(self, sha256, filename, path, size, created):
+        self.sha256 = sha256
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.created = created
+
+    def context(self):
+        """解析用の ImageContext（ハッシュは計算済みのものを使う）"""
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        return ImageContext(data, path=self.path, sha256=self.sha256)
+
+
+class UploadStore:
+    """
+    内容のハッシュで名前を付けるアップロード保存先
+
+    Args:
+        upload_dir: 保存先（UPLOAD_FOLDER）
+        result_cache: 処理結果のキャッシュ（None なら結果を覚えない）
+        storage: StorageManager（保存した元画像を記録し、消えた出力ファイルは作り直す）
+        result_ttl_sec: 処理結果の有効期限
+    """
+
+    def __init__(self, upload_dir, result_cache=None, chunk_size=CHUNK_SIZE, storage=None,
+                 result_ttl_sec=UPLOAD_RESULT_TTL_SEC):
+        self.upload_dir = upload_dir
+        self.result_cache = result_cache
+        self.result_ttl_sec = result_ttl_sec
+        self.storage = storage
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self.counters = {
+            'uploads': 0,
+            'duplicates': 0,
+            'bytes_written': 0,
+            'bytes_deduplicated': 0,
+            'links': 0,
+            'copies': 0,
+            'results_expired': 0,
+        }
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+    def ingest(self, stream, ext) -> StoredUpload:
+        """
+        ストリームを読みながら一時ファイルに書き、SHA-256 の名前で保存する
+
+        Args:
+            stream: read(n) できるもの（FileStorage.stream など）
+            ext: 拡張子（ドットなし）
+        """
+        os.makedirs(self.upload_dir, exist_ok=True)
+        tmp_path = os.path.join(self.upload_dir, f".upload.{os.getpid()}.{threading.get_ident()}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            filename = f"{sha256}.{ext.lower()}"
+            path = os.path.join(self.upload_dir, filename)
+            created = not os.path.exists(path)
+            if created:
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if created:
+            self._count(uploads=1, bytes_written=size)
+        else:
+            self._count(uploads=1, duplicates=1, bytes_deduplicated=size)
+        if self.storage is not None:
+            self.storage.add(path)
+        return StoredUpload(sha256, filename, path, size, created)
+
+    def link(self, source_path, dest_path):
+        """
+        保存済みのファイルを dest_path にも置く（ハードリンク、できなければコピー）
+        既存の dest_path は置き換える
+        """
+        dest_dir = os.path.dirname(dest_path)
+        if dest_dir:
+            os.makedirs(dest_dir, exist_ok=True)
+        tmp_path = f"{dest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                os.link(source_path, tmp_path)
+                self._count(links=1)
+            except OSError:
+                # 別ファイルシステム・ハードリンク非対応
+                shutil.copyfile(source_path, tmp_path)
+                self._count(copies=1)
+            os.replace(tmp_path, dest_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return dest_path
+
+    # ----------------------------------------
+    # 処理結果（再アップロード時に即返す）
+    # ----------------------------------------
+
+    @staticmethod
+    def _result_key(upload, endpoint):
+        # オフラインインデックスの作成時刻（作り直したら前の結果は使わない）
+        index = get_shop_index()
+        shops = index.built_at if index is not None else None
+        return make_key(upload.sha256, endpoint=endpoint, shops=shops)
+
+    def get_result(self, upload, endpoint):
+        """
+        同じ写真の前回のレスポンス
+        （期限切れ・出力ファイルが消えていて作り直せなければ None）
+        """
+        if self.result_cache is None:
+            return None
+        entry = self.result_cache.get(self._result_key(upload, endpoint))
+        if not entry:
+            return None
+        if time.time() - entry.get('stored_at', 0) > self.result_ttl_sec:
+            self._count(results_expired=1)
+            return None
+        exists = self.storage.ensure if self.storage is not None else os.path.exists
+        if not all(exists(p) for p in entry.get('files', [])):
+            return None
+        return entry['response']
+
+    def put_result(self, upload, endpoint, response, files=()):
+        """
+        レスポンスを覚える（files はレスポンスが参照する出力ファイル）
+        """
+        if self.result_cache is None:
+            return
+        self.result_cache.put(self._result_key(upload, endpoint),
+                              {'response': response, 'files': list(files), 'stored_at': time.time()})
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['results'] = self.result_cache.stats() if self.result_cache is not None else None
+        return stats
+
+
+def create_upload_store(upload_dir, storage=None):
+    result_cache = None
+    if UPLOAD_RESULT_CACHE:
+        result_cache = ContentCache('upload_results', max_entries=256, disk_dir=RESULT_CACHE_DIR)
+    return UploadStore(upload_dir, result_cache, storage=storage)
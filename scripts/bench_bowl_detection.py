@@ -0,0 +1,120 @@
+"""
+どんぶり検知ベンチマーク
+検知モードごとのレイテンシと、基準モード（full）との結果一致度を比較する
+
+使い方:
+    python scripts/bench_bowl_detection.py <画像フォルダ or 画像ファイル...> [--modes full pyramid]
+
+一致判定: 中心のずれ・半径の差がどちらも基準半径の TOLERANCE 以内
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from modules import cropper, input_handler
+from modules.image_context import ImageContext
+
+TOLERANCE = 0.05
+
+
+def collect_images(paths):
+    images = []
+    for p in paths:
+        if os.path.isdir(p):
+            images.extend(str(x) for x in input_handler.get_input_photos(p))
+        else:
+            images.append(p)
+    return sorted(images)
+
+
+def run_detector(path, mode):
+    """デコード済みのコンテキストで検知だけを計測（キャッシュは使わない）"""
+    ctx = ImageContext.from_path(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ctx.image  # デコード・回転は全モード共通なので計測対象外
+        start = time.perf_counter()
+        result = cropper._detect_bowl_uncached(ctx, mode)
+        elapsed = (time.perf_counter() - start) * 1000
+    return result, elapsed, ctx.size
+
+
+def circle_px(result, size):
+    w, h = size
+    return result['cx'] * w, result['cy'] * h, result['r'] * min(w, h)
+
+
+def agreement(ref, other, size):
+    """基準半径に対する中心のずれ・半径差の比率"""
+    rx, ry, rr = circle_px(ref, size)
+    ox, oy, orr = circle_px(other, size)
+    center_err = ((rx - ox) ** 2 + (ry - oy) ** 2) ** 0.5 / rr
+    radius_err = abs(rr - orr) / rr
+    return center_err, radius_err
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='どんぶり検知ベンチマーク')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--modes', nargs='+', default=['full', 'pyramid'],
+                        choices=cropper.DETECTOR_MODES)
+    args = parser.parse_args()
+
+    images = collect_images(args.paths)
+    if not images:
+        print("画像が見つかりません")
+        return 1
+
+    ref_mode = args.modes[0]
+    timings = {m: [] for m in args.modes}
+    agree = {m: 0 for m in args.modes[1:]}
+    method_match = {m: 0 for m in args.modes[1:]}
+
+    print(f"{len(images)}枚 / 基準モード: {ref_mode}\n")
+    for path in images:
+        results = {}
+        for mode in args.modes:
+            result, elapsed, size = run_detector(path, mode)
+            results[mode] = result
+            timings[mode].append(elapsed)
+
+        ref = results[ref_mode]
+        line = [f"{os.path.basename(path)[:32]:32s} {size[0]}x{size[1]}"]
+        line.append(f"{ref_mode}={timings[ref_mode][-1]:7.1f}ms({ref['method']})")
+        for mode in args.modes[1:]:
+            other = results[mode]
+            center_err, radius_err = agreement(ref, other, size)
+            ok = center_err <= TOLERANCE and radius_err <= TOLERANCE
+            agree[mode] += ok
+            method_match[mode] += other['method'] == ref['method']
+            line.append(f"{mode}={timings[mode][-1]:7.1f}ms({other['method']}) "
+                        f"Δc={center_err:.3f} Δr={radius_err:.3f} {'✅' if ok else '❌'}")
+        print("  ".join(line))
+
+    print("\n=== Summary ===")
+    for mode in args.modes:
+        t = timings[mode]
+        summary = (f"{mode:8s} mean={sum(t) / len(t):7.1f}ms p50={percentile(t, 0.5):7.1f}ms "
+                   f"p95={percentile(t, 0.95):7.1f}ms")
+        if mode in agree:
+            summary += (f"  agreement={agree[mode]}/{len(images)}"
+                        f"  method一致={method_match[mode]}/{len(images)}")
+        print(summary)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+GPS抽出ベンチマーク
+EXIF セグメントだけを読む高速パーサと、従来の Pillow 方式の速度・結果を比較する
+
+使い方:
+    python scripts/bench_gps.py <画像フォルダ or 画像ファイル...> [--repeat 3] [--macos-tools]
+
+--macos-tools を付けると、従来方式で GPS が取れなかった写真に sips / mdls も試す
+（変更前は Linux でも毎回起動を試していたので、その時間も含めて比べたいとき用）
+結果が食い違った写真は一覧に出す
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from modules import gps_locator, input_handler
+
+HEIF_PATTERNS = ('*.heic', '*.HEIC', '*.heif', '*.HEIF')
+
+
+def collect_images(paths):
+    images = []
+    for p in paths:
+        if os.path.isdir(p):
+            images.extend(str(x) for x in input_handler.get_input_photos(p))
+            for pattern in HEIF_PATTERNS:
+                images.extend(glob.glob(os.path.join(p, pattern)))
+        else:
+            images.append(p)
+    return sorted(set(images))
+
+
+def run(path, fast, macos_tools):
+    """ファイルパスから GPS を取るまでの時間（ファイル読み込み込み）"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = gps_locator.get_gps_coordinates(path, fast=fast, macos_tools=macos_tools)
+        elapsed = (time.perf_counter() - start) * 1000
+    return result, elapsed
+
+
+def same(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return all(abs(x - y) < 1e-7 for x, y in zip(a, b))
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GPS抽出ベンチマーク')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--repeat', type=int, default=1, help='1枚あたりの計測回数（最速値を使う）')
+    parser.add_argument('--macos-tools', action='store_true', help='従来方式で sips / mdls も試す')
+    args = parser.parse_args()
+
+    images = collect_images(args.paths)
+    if not images:
+        print("画像が見つかりません")
+        return 1
+
+    timings = {'legacy': [], 'fast': []}
+    found = {'legacy': 0, 'fast': 0}
+    mismatches = []
+    for path in images:
+        results = {}
+        for name, fast in (('legacy', False), ('fast', True)):
+            best = None
+            for _ in range(max(1, args.repeat)):
+                result, elapsed = run(path, fast, args.macos_tools and not fast)
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name].append(best)
+            found[name] += result is not None
+            results[name] = result
+        if not same(results['legacy'], results['fast']):
+            mismatches.append((path, results['legacy'], results['fast']))
+
+    print(f"{len(images)}枚\n")
+    print("=== Summary ===")
+    for name in ('legacy', 'fast'):
+        t = timings[name]
+        print(f"{name:6s} total={sum(t):9.1f}ms mean={sum(t) / len(t):7.3f}ms "
+              f"p50={percentile(t, 0.5):7.3f}ms p95={percentile(t, 0.95):7.3f}ms  "
+              f"GPSあり={found[name]}/{len(images)}")
+    if sum(timings['fast']):
+        print(f"速度比: {sum(timings['legacy']) / sum(timings['fast']):.1f}x")
+    print(f"結果の不一致: {len(mismatches)}件")
+    for path, legacy, fast in mismatches[:20]:
+        print(f"  {os.path.basename(path)}: legacy={legacy} fast={fast}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+新店ニュース抽出ベンチマーク
+保存した検索結果ページで BeautifulSoup 版とストリーミング版の速度を比較し、
+抽出結果（name, area, url, city, open_date）が完全に一致するか確認する
+
+使い方:
+    # news_scraper.URLS のページを保存
+    python scripts/bench_news_extract.py --save pages/
+    # ベンチマーク（ファイル名の先頭が県名として area に入る）
+    python scripts/bench_news_extract.py pages/ [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from modules import news_scraper
+
+PARSERS = (
+    ('soup', news_scraper.extract_shops_soup),
+    ('stream', news_scraper.extract_shops_stream),
+)
+
+
+def save_pages(out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    session = news_scraper._new_session()
+    for url, pref_name in news_scraper.URLS:
+        response = session.get(url, timeout=15)
+        response.raise_for_status()
+        response.encoding = 'utf-8'
+        path = os.path.join(out_dir, f"{pref_name}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        print(f"保存: {path} ({len(response.text) // 1024}KB)")
+        time.sleep(1)
+
+
+def collect_pages(paths):
+    pages = []
+    for p in paths:
+        if os.path.isdir(p):
+            pages.extend(os.path.join(p, name) for name in sorted(os.listdir(p))
+                         if name.endswith(('.html', '.htm')))
+        else:
+            pages.append(p)
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='新店ニュース抽出ベンチマーク')
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--save', metavar='DIR', help='URLS のページを保存して終了')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.save:
+        save_pages(args.save)
+        return 0
+
+    pages = collect_pages(args.paths)
+    if not pages:
+        print("HTMLファイルが見つかりません")
+        return 1
+
+    totals = {name: 0.0 for name, _ in PARSERS}
+    mismatches = 0
+    for path in pages:
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        pref_name = os.path.splitext(os.path.basename(path))[0]
+
+        results = {}
+        line = [f"{os.path.basename(path)[:24]:24s} {len(html) // 1024:5d}KB"]
+        for name, extract in PARSERS:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                results[name] = extract(html, pref_name)
+            elapsed = (time.perf_counter() - start) * 1000 / args.repeat
+            totals[name] += elapsed
+            line.append(f"{name}={elapsed:7.2f}ms")
+
+        same = results['soup'] == results['stream']
+        mismatches += not same
+        line.append(f"{len(results['soup'])}件 {'✅' if same else '❌'}")
+        print("  ".join(line))
+        if not same:
+            for a, b in zip(results['soup'], results['stream']):
+                if a != b:
+                    print(f"    soup  : {a}\n    stream: {b}")
+                    break
+
+    print("\n=== Summary ===")
+    for name, _ in PARSERS:
+        print(f"{name:8s} mean={totals[name] / len(pages):7.2f}ms")
+    print(f"speedup={totals['soup'] / max(totals['stream'], 1e-9):.1f}x  一致={len(pages) - mismatches}/{len(pages)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
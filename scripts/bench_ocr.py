@@ -0,0 +1,130 @@
+"""
+OCRベンチマーク
+OCRモード（full / roi）ごとのレイテンシと店名のヒット率を比較する
+
+使い方:
+    python scripts/bench_ocr.py <画像フォルダ or 画像ファイル...> [--labels labels.csv] [--modes full roi]
+
+labels.csv は「ファイル名,正解の店名」の行（ヘッダなし）。
+ヒット判定: 正解の店名（空白を除く）が OCR テキスト（空白・改行を除く）に含まれる。
+ラベルのない画像は find_shop_name_in_text で店名候補が取れたかどうかだけを数える
+"""
+import argparse
+import contextlib
+import csv
+import io
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from modules import cropper, input_handler, ocr_reader
+from modules.image_context import ImageContext
+
+
+def collect_images(paths):
+    images = []
+    for p in paths:
+        if os.path.isdir(p):
+            images.extend(str(x) for x in input_handler.get_input_photos(p))
+        else:
+            images.append(p)
+    return sorted(images)
+
+
+def load_labels(path):
+    labels = {}
+    if not path:
+        return labels
+    with open(path, encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[0].strip():
+                labels[row[0].strip()] = row[1].strip()
+    return labels
+
+
+def squash(text):
+    return ''.join((text or '').split())
+
+
+def run_ocr(path, mode):
+    """
+    デコード・どんぶり検知済みのコンテキストで OCR だけを計測
+    （どんぶり検知は /analyze で並列に走っている処理なので計測対象外）
+    """
+    ctx = ImageContext.from_path(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ctx.gray
+        cropper.detect_bowl(ctx)
+        start = time.perf_counter()
+        text = ocr_reader.extract_text_from_image(ctx, mode=mode, use_cache=False)
+        elapsed = (time.perf_counter() - start) * 1000
+        candidate = ocr_reader.find_shop_name_in_text(text) if text else None
+    return text, candidate, elapsed
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCRベンチマーク')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--labels', help='ファイル名,正解の店名 の CSV')
+    parser.add_argument('--modes', nargs='+', default=['full', 'roi'], choices=ocr_reader.OCR_MODES)
+    args = parser.parse_args()
+
+    if not ocr_reader.OCR_AVAILABLE:
+        print("pytesseract / tesserocr がありません")
+        return 1
+
+    images = collect_images(args.paths)
+    if not images:
+        print("画像が見つかりません")
+        return 1
+    labels = load_labels(args.labels)
+
+    timings = {m: [] for m in args.modes}
+    hits = {m: 0 for m in args.modes}
+    candidates = {m: 0 for m in args.modes}
+    labeled = 0
+
+    print(f"{len(images)}枚 / ラベルあり: {sum(os.path.basename(p) in labels for p in images)}枚\n")
+    for path in images:
+        name = os.path.basename(path)
+        expected = labels.get(name)
+        labeled += expected is not None
+
+        line = [f"{name[:32]:32s}"]
+        for mode in args.modes:
+            text, candidate, elapsed = run_ocr(path, mode)
+            timings[mode].append(elapsed)
+            candidates[mode] += candidate is not None
+            mark = ''
+            if expected is not None:
+                hit = squash(expected) in squash(text)
+                hits[mode] += hit
+                mark = '✅' if hit else '❌'
+            line.append(f"{mode}={elapsed:7.0f}ms {mark}{(candidate or '-')[:16]}")
+        print("  ".join(line))
+
+    print("\n=== Summary ===")
+    for mode in args.modes:
+        t = timings[mode]
+        summary = (f"{mode:5s} mean={sum(t) / len(t):7.0f}ms p50={percentile(t, 0.5):7.0f}ms "
+                   f"p95={percentile(t, 0.95):7.0f}ms  店名候補あり={candidates[mode]}/{len(images)}")
+        if labeled:
+            summary += f"  ヒット率={hits[mode]}/{labeled} ({hits[mode] / labeled:.0%})"
+        print(summary)
+    print(f"OCRエンジン: {ocr_reader.ocr_engine_stats()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+テキスト正規化のゴールデンチェック
+text_normalizer を使った現行の実装と、1キーワードずつ処理していた従来の実装（このファイル内の
+reference_*）の出力が完全に一致するかを、店名コーパスで確認する。速度も比較する
+
+使い方:
+    python scripts/check_text_normalizer.py                  # 内蔵サンプル＋ランダム生成
+    python scripts/check_text_normalizer.py names.txt pages/ # 1行1店名のファイル / 保存した検索結果ページ
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from modules import gps_shop_finder, news_scraper, ocr_reader
+
+
+# ============================================================
+# 従来の実装（比較用にそのまま残す）
+# ============================================================
+
+REFERENCE_PREFECTURES = ['埼玉県', '群馬県', '栃木県', '茨城県', '茨城县', '千葉県', '東京都', '神奈川県']
+
+
+def reference_clean_shop_name(raw_text):
+    if not raw_text:
+        return ""
+    text = raw_text.strip()
+    text = re.sub(r'\d+\.?\d*\s*ポイント', '', text)
+    text = re.sub(r'\d+\s*レビュー', '', text)
+    text = re.sub(r'\d+\s*スキ', '', text)
+    text = re.sub(r'\d+\s*フォト', '', text)
+    text = re.sub(r'\d+\s*件', '', text)
+    for keyword in news_scraper.GARBAGE_KEYWORDS:
+        text = text.replace(keyword, ' ')
+    for pref in REFERENCE_PREFECTURES:
+        if pref in text:
+            idx = text.find(pref)
+            text = text[:idx]
+    text = re.sub(r'[^\s]{1,5}郡[^\s]{1,8}[町村]', '', text)
+    text = re.sub(r'\s+[^\s]{1,6}[市区町村]\s*', ' ', text)
+    text = re.sub(r'\s+[^\s]{1,6}[市区町村]$', '', text)
+    text = re.sub(r'【[^】]*】', '', text)
+    text = re.sub(r'（[^）]*）', '', text)
+    text = re.sub(r'\([^)]*\)', '', text)
+    text = re.sub(r'\d{1,2}月\d{1,2}日', '', text)
+    text = re.sub(r'\d{4}/\d{1,2}/\d{1,2}', '', text)
+    text = re.sub(r'\s+\d+\.?\d*\s*$', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r'^[\s\-・、。/\|:：\.]+', '', text)
+    text = re.sub(r'[\s\-・、。/\|:：\.]+$', '', text)
+    return text
+
+
+def reference_extract_city_name(info_text):
+    if not info_text:
+        return ""
+    match = re.search(r'([^\s]{1,5}郡)', info_text)
+    if match:
+        return match.group(1)
+    match = re.search(r'([^\s]{1,10}市)', info_text)
+    if match:
+        return match.group(1)
+    match = re.search(r'([^\s]{1,10}区)', info_text)
+    if match:
+        return match.group(1)
+    return ""
+
+
+def reference_extract_open_date(info_text):
+    if not info_text:
+        return ""
+    match = re.search(r'(\d{4}/\d{1,2}/\d{1,2})', info_text)
+    if match:
+        return match.group(1)
+    match = re.search(r'(\d{1,2}月\d{1,2}日)', info_text)
+    if match:
+        return match.group(1)
+    return ""
+
+
+def reference_clean_ocr_name(text):
+    if not text:
+        return ""
+    text = re.sub(r'[【】「」『』\[\]\(\)（）〈〉《》]', '', text)
+    text = re.sub(r'[\d\.\,\:\;]+', ' ', text)
+    text = re.sub(r'[!！?？]+', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def reference_ramen_keyword(line):
+    for keyword in ocr_reader.RAMEN_KEYWORDS:
+        if keyword in line:
+            return keyword
+    return None
+
+
+def reference_is_ramen_shop(name, cuisine=''):
+    if 'ramen' in cuisine.lower():
+        return True
+    for kw in gps_shop_finder.STRICT_RAMEN_KEYWORDS:
+        if kw in name or kw.lower() in name.lower():
+            return True
+    return False
+
+
+def reference_is_excluded_shop(name):
+    return any(ex in name for ex in gps_shop_finder.EXCLUDED_SHOP_KEYWORDS)
+
+
+CHECKS = [
+    ('clean_shop_name', reference_clean_shop_name, news_scraper.clean_shop_name),
+    ('extract_city_name', reference_extract_city_name, news_scraper.extract_city_name),
+    ('extract_open_date', reference_extract_open_date, news_scraper.extract_open_date),
+    ('clean_ocr_name', reference_clean_ocr_name, ocr_reader.clean_ocr_name),
+    ('ramen_keyword', reference_ramen_keyword, ocr_reader._RAMEN_KEYWORD_MATCHER.first_keyword),
+    ('is_ramen_shop', reference_is_ramen_shop, gps_shop_finder.is_ramen_shop),
+    ('is_excluded_shop', reference_is_excluded_shop, gps_shop_finder.is_excluded_shop),
+]
+
+
+# ============================================================
+# コーパス
+# ============================================================
+
+SAMPLES = [
+    '麺屋 一燈 12レビュー 3.5ポイント',
+    'らーめん 二郎 NEW OPEN 埼玉県新座市',
+    '中華そば 三 ニューオープン 比企郡武蔵嵐山町',
+    '【新店】つけ麺 四（本店） 草加市 2026/10/1',
+    '家系ラーメン 五 駐車場あり 完全禁煙 Pあり',
+    'PR 広告 ラーメン六 10月3日 オープン',
+    '  ・麺処 七 - 5件 12 ',
+    'らぁめん 八 (仮) 邑楽郡大泉町 1.5',
+    'RAMEN 九 Wi-Fi テイクアウト 茨城县つくば市',
+    '担々麺 十 群馬県前橋市 東京都 神奈川県',
+    '麺や 十一 ｜ 高崎市 ｜ 2025/12/24',
+    '拉麺 十二 3スキ 8フォト 無化調 自家製麺',
+    '看板!!「らーめん」123',
+    'マクドナルド 前橋店',
+    'ramen shop タンタン麺',
+]
+
+PIECES = news_scraper.GARBAGE_KEYWORDS + REFERENCE_PREFECTURES + [
+    'ラーメン', 'らーめん', '麺屋', '中華そば', 'つけ麺', '店', '本店', '一', '二',
+    '12', '3.5', '2026/10/1', '10月3日', 'ポイント', 'レビュー', 'スキ', 'フォト', '件',
+    '郡', '町', '村', '市', '区', '比企郡武蔵嵐山町', '新座市', '【', '】', '（', '）', '(', ')',
+    ' ', ' ', '  ', '・', '-', '/', '|', ':', '：', '.', '!', '？', '「', '」', 'ramen', 'RAMEN',
+    'マクドナルド', 'セブン', 'pizza', 'Pizza', '味噌', '塩', 'NEWOPEN', '完全禁煙', '駐車場あり',
+]
+
+
+def random_corpus(n, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        corpus.append(''.join(rng.choice(PIECES) for _ in range(rng.randint(1, 10))))
+    return corpus
+
+
+def load_corpus(paths):
+    corpus = []
+    for path in paths:
+        files = [os.path.join(path, f) for f in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for file in files:
+            with open(file, encoding='utf-8') as f:
+                content = f.read()
+            if file.endswith(('.html', '.htm')):
+                # 検索結果ページの店名リンク・info のテキスト
+                from bs4 import BeautifulSoup
+                soup = BeautifulSoup(content, 'html.parser')
+                for link in soup.find_all('a', href=news_scraper.SHOP_HREF_RE):
+                    corpus.append(link.get_text(strip=True))
+                for info in soup.find_all(class_='info'):
+                    corpus.append(info.get_text(' ', strip=True))
+            else:
+                corpus.extend(line.rstrip('\n') for line in content.splitlines())
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description='テキスト正規化のゴールデンチェック')
+    parser.add_argument('paths', nargs='*', help='1行1店名のテキスト / 保存した検索結果ページ')
+    parser.add_argument('--random', type=int, default=20000, help='ランダム生成する件数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = SAMPLES + load_corpus(args.paths) + random_corpus(args.random, args.seed)
+    print(f"コーパス: {len(corpus)}件\n")
+
+    failed = 0
+    for name, reference, current in CHECKS:
+        mismatches = [text for text in corpus if reference(text) != current(text)]
+
+        start = time.perf_counter()
+        for text in corpus:
+            reference(text)
+        ref_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for text in corpus:
+            current(text)
+        cur_ms = (time.perf_counter() - start) * 1000
+
+        status = '✅' if not mismatches else f'❌ {len(mismatches)}件不一致'
+        print(f"{name:18s} 従来={ref_ms:8.1f}ms 現行={cur_ms:8.1f}ms "
+              f"({ref_ms / max(cur_ms, 1e-9):4.1f}x) {status}")
+        for text in mismatches[:3]:
+            print(f"    入力: {text!r}\n    従来: {reference(text)!r}\n    現行: {current(text)!r}")
+        failed += bool(mismatches)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
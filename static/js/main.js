@@ -147,9 +147,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
             currentFilename = data.filename;
 
-            // サーバーで切り抜き済みの画像を表示
-            var imageUrl = data.image_url + '?t=' + Date.now();
-            previewImage.src = imageUrl;
+            // サーバーで切り抜き済みの画像を表示（ETag で再検証されるのでキャッシュ破りは不要）
+            previewImage.src = data.image_url;
 
             // 店名自動入力
             var shopName = data.shop_name;
@@ -214,7 +213,8 @@ document.addEventListener('DOMContentLoaded', () => {
             var data = await resp.json();
             if (data.error) throw new Error(data.error);
 
-            resultImage.src = data.result_url + '?t=' + Date.now();
+            // 結果のURLは内容ごとに変わる（同じURLなら同じ画像）ので、ブラウザのキャッシュをそのまま使う
+            resultImage.src = data.result_url;
             resultShopName.textContent = '店名: ' + shopName;
             downloadLink.href = data.result_url;
             downloadLink.download = 'ramen_' + Date.now() + '.jpg';